@@ -0,0 +1,32 @@
+"""
+Shape of the review agents' results
+
+Agents return per-file reviews only (`file_reviews`: [{'file', 'review'}]);
+the combined agent section is assembled where it is rendered, so each
+review travels through the Parallel/Map state once.
+"""
+
+from typing import Any, Dict, List
+
+AGENTS = ('security', 'performance', 'best_practices')
+AGENT_HEADERS = {
+    'security': "# 🔒 SECURITY ANALYSIS",
+    'performance': "# ⚡ PERFORMANCE ANALYSIS",
+    'best_practices': "# 📚 BEST PRACTICES ANALYSIS"
+}
+
+# Per-file reviews the agents write when a file could not be reviewed
+ERROR_PREFIXES = ("Error analyzing file:", "Error: Could not download file")
+
+
+def is_error_review(text: str) -> bool:
+    return bool(text) and text.startswith(ERROR_PREFIXES)
+
+
+def combine_file_reviews(file_reviews: List[Dict[str, Any]]) -> str:
+    return "\n\n".join(f"## File: {r['file']}\n\n{r['review']}" for r in file_reviews)
+
+
+def agent_review(agent: str, result: Dict[str, Any]) -> str:
+    """Markdown section of one agent: its header followed by every file review"""
+    return f"{AGENT_HEADERS[agent]}\n\n{combine_file_reviews(result.get('file_reviews', []))}"
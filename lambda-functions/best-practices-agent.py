@@ -1,16 +1,40 @@
 import json
 import os
-import boto3
-import google.generativeai as genai
 from secrets_helper import get_gemini_api_key
+from lambda_startup import get_client, get_genai, log_startup, pre_init
+from review_coalescing import check_superseded
+from context_cache import generate_from_cache, get_live_handle, is_cache_miss
+from work_items import load_work_item, store_item_result
+from findings import FINDINGS_GENERATION_CONFIG, FINDINGS_OUTPUT_FORMAT, parse_model_review
+from request_policy import REQUEST_TIMEOUT_SECONDS, call_with_policy, summarize_reports
+from model_router import route_file, static_review, summarize_routing
 
-s3_client = boto3.client('s3')
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
 
+BEST_PRACTICES_ROLE = "You are a code quality expert reviewing Python code for best practices."
+
+BEST_PRACTICES_TASK = """**Your task:**
+1. Check for PEP 8 compliance
+2. Evaluate naming conventions
+3. Check for missing docstrings and type hints
+4. Identify code smells and maintainability issues
+5. Suggest refactoring improvements
+
+""" + FINDINGS_OUTPUT_FORMAT
+
 def lambda_handler(event, context):
     """Best practices code review agent powered by Gemini"""
     
     lambda_name = "BestPracticesAgent"
+    log_startup(lambda_name)
+    
+    # Map mode sends a pointer to the work item stored in S3
+    event = load_work_item(event)
+    
+    # A newer push to the PR makes this execution stale
+    superseded = check_superseded(event, lambda_name)
+    if superseded:
+        return superseded
     
     try:
         print("=" * 60)
@@ -27,6 +51,8 @@ def lambda_handler(event, context):
         
         uploaded_files = event.get('uploaded_files', [])
         parsed_files = event.get('parsed_files', [])
+        context_caches = event.get('context_caches', {})
+        context_map = event.get('context_map', {})
         
         print(f"📁 Analyzing {len(uploaded_files)} files for code quality")
         
@@ -41,8 +67,9 @@ def lambda_handler(event, context):
                     "lambda": lambda_name
                 }
             
+            genai = get_genai()
             genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-2.5-flash')
+            models = {}
             
             print("✅ Gemini API key retrieved from Secrets Manager")
             
@@ -56,16 +83,22 @@ def lambda_handler(event, context):
             }
         
         all_reviews = []
+        routing = []
+        findings = []
         total_tokens = 0
         
         for file_info in uploaded_files:
             filename = file_info.get('filename', 'unknown')
             s3_key = file_info.get('s3_key')
             
+            if file_info.get('carried_forward'):
+                print(f"♻️  Unchanged since last review, skipping: {filename}")
+                continue
+            
             print(f"📄 Processing: {filename}")
             
             try:
-                response = s3_client.get_object(Bucket=BUCKET_NAME, Key=s3_key)
+                response = get_client('s3').get_object(Bucket=BUCKET_NAME, Key=s3_key)
                 code = response['Body'].read().decode('utf-8')
             except Exception as e:
                 print(f"❌ Error downloading {s3_key}: {str(e)}")
@@ -77,17 +110,64 @@ def lambda_handler(event, context):
                 continue
             
             parsed_meta = next((p for p in parsed_files if p.get('filename') == filename), {})
+            file_context = context_map.get(filename)
+            
+            # Route by risk: static-only checks, fast tier or full model
+            route = route_file('best_practices', filename, parsed_meta, file_context)
+            routing.append(route)
+            
+            if route['tier'] == 'static':
+                print(f"⏭️  Static-only review for {filename}: {route['reason']}")
+                all_reviews.append({
+                    "file": filename,
+                    "review": static_review('best_practices', route, file_context),
+                    "tokens": 0
+                })
+                continue
+            
+            if route['model'] not in models:
+                models[route['model']] = genai.GenerativeModel(
+                    route['model'], generation_config=FINDINGS_GENERATION_CONFIG
+                )
+            model = models[route['model']]
             
             try:
-                prompt = create_best_practices_prompt(code, filename, parsed_meta)
-                response = model.generate_content(prompt)
+                cache_handle = get_live_handle(context_caches, filename)
+                if cache_handle and cache_handle['model'] != route['model']:
+                    cache_handle = None  # caches are bound to the model they were created for
+                request_options = {'timeout': REQUEST_TIMEOUT_SECONDS}
+                if cache_handle:
+                    # File source already uploaded once as a shared prefix
+                    prompt = create_best_practices_instruction(filename)
+                    try:
+                        response, request_report = call_with_policy(
+                            lambda prompt=prompt: generate_from_cache(
+                                cache_handle, prompt, model, request_options, FINDINGS_GENERATION_CONFIG
+                            )
+                        )
+                    except Exception as e:
+                        # Expired or deleted cache: send the whole file instead (other errors were already retried)
+                        if not is_cache_miss(e):
+                            raise
+                        print(f"⚠️  Cached context failed for {filename}, using the full prompt: {str(e)}")
+                        cache_handle = None
+                if not cache_handle:
+                    prompt = create_best_practices_prompt(code, filename, parsed_meta)
+                    response, request_report = call_with_policy(
+                        lambda prompt=prompt: model.generate_content(prompt, request_options=request_options)
+                    )
                 review_text = response.text
                 tokens_used = len(prompt.split()) + len(review_text.split())
                 
+                # Issues go to the structured findings, the review keeps the summary
+                summary, model_findings = parse_model_review(review_text, filename, "best_practices")
+                findings.extend(model_findings)
+                
                 all_reviews.append({
                     "file": filename,
-                    "review": review_text,
-                    "tokens": tokens_used
+                    "review": summary,
+                    "tokens": tokens_used,
+                    "request": request_report
                 })
                 
                 total_tokens += tokens_used
@@ -97,24 +177,27 @@ def lambda_handler(event, context):
                 all_reviews.append({
                     "file": filename,
                     "review": f"Error analyzing file: {str(e)}",
-                    "tokens": 0
+                    "tokens": 0,
+                    "request": getattr(e, 'policy_report', None)
                 })
         
-        combined_review = "\n\n".join([f"## File: {r['file']}\n\n{r['review']}" for r in all_reviews])
-        
         print("=" * 60)
         print("✅ Best Practices Agent Complete")
         print(f"📊 Total tokens: {total_tokens}")
         print(f"💰 Total cost: $0.0000 (FREE with Gemini!)")
         print("=" * 60)
         
-        return {
+        return store_item_result(event, {
             "statusCode": 200,
             "agent": "best_practices",
-            "review": f"# 📚 BEST PRACTICES ANALYSIS\n\n{combined_review}",
             "tokens": total_tokens,
-            "cost": 0.0
-        }
+            "cost": 0.0,
+            "request_stats": summarize_reports([r.get('request') for r in all_reviews]),
+            "routing": routing,
+            "routing_summary": summarize_routing(routing),
+            "file_reviews": [{"file": r['file'], "review": r['review']} for r in all_reviews],
+            "findings": findings
+        })
         
     except Exception as e:
         print(f"❌ CRITICAL ERROR in {lambda_name}: {str(e)}")
@@ -140,7 +223,7 @@ def create_best_practices_prompt(code, filename, parsed_meta):
 - Documentation: {metrics.get('documentation_ratio', 0)*100:.0f}%
 """
     
-    prompt = f"""You are a code quality expert reviewing Python code for best practices.
+    prompt = f"""{BEST_PRACTICES_ROLE}
 
 {context}
 
@@ -149,24 +232,16 @@ def create_best_practices_prompt(code, filename, parsed_meta):
 {code}
 ```
 
-**Your task:**
-1. Check for PEP 8 compliance
-2. Evaluate naming conventions
-3. Check for missing docstrings and type hints
-4. Identify code smells and maintainability issues
-5. Suggest refactoring improvements
+{BEST_PRACTICES_TASK}"""
+    return prompt
 
-**Output format:**
-## 📚 Code Quality Issues
-[List issues with examples]
+def create_best_practices_instruction(filename):
+    """Create best practices instruction sent against the cached file context"""
+    return f"""{BEST_PRACTICES_ROLE}
 
-## 📝 Documentation Issues
-[Missing docstrings, type hints, etc.]
+Review the file `{filename}` provided in the cached context above.
 
-## ♻️ Refactoring Suggestions
-[Specific improvements with code examples]
+{BEST_PRACTICES_TASK}"""
 
-## ✅ Best Practices Summary
-[Overall assessment and prioritized recommendations]
-"""
-    return prompt
\ No newline at end of file
+
+pre_init(lambda: get_client('s3'), get_genai)
@@ -0,0 +1,104 @@
+"""
+Content-addressed store for per-blob analysis results
+
+Results are keyed by the content they were computed from, so they are valid
+for any PR, branch or path containing the same bytes:
+    cas/parse/<version>/<git blob sha>.json        CodeParser output (no filename)
+    cas/security/<version>/<git blob sha>.json     static security findings
+    cas/embedding/<model>/<sha256 of text>.json    embedding vector
+
+Git blob SHAs are the `sha` GitHub reports for PR files, so lookups need no
+download. PushPrewarmer fills the store from feature-branch pushes; CodeParser,
+SecurityAgent and EmbeddingGenerator read it first. Bump ANALYSIS_VERSION when
+parser or rule output changes.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+from lambda_startup import get_client
+
+BLOB_CACHE = os.environ.get('BLOB_CACHE', 'false').lower() == 'true'
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
+ANALYSIS_VERSION = os.environ.get('BLOB_CACHE_VERSION', '2')
+EMBEDDING_MODEL = "models/text-embedding-004"
+MEMORY_ITEMS = 512
+
+# Per-container LRU in front of S3
+_memory = OrderedDict()
+
+
+def git_blob_sha(content: str) -> str:
+    """SHA-1 git assigns to a blob with this content (matches GitHub's file `sha`)"""
+    data = content.encode('utf-8')
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def text_key(text: str, model: str = EMBEDDING_MODEL) -> str:
+    return hashlib.sha256(f"{model}\n{text}".encode('utf-8')).hexdigest()
+
+
+def cache_key(kind: str, key: str, namespace: str = None) -> str:
+    namespace = (namespace or ANALYSIS_VERSION).replace('/', '_')
+    return f"cas/{kind}/{namespace}/{key}.json"
+
+
+def _remember(s3_key: str, value: Any):
+    _memory[s3_key] = value
+    _memory.move_to_end(s3_key)
+    while len(_memory) > MEMORY_ITEMS:
+        _memory.popitem(last=False)
+
+
+def get(kind: str, key: str, namespace: str = None) -> Optional[Any]:
+    """Cached value, or None on a miss (or when the store is disabled)"""
+    if not BLOB_CACHE or not key:
+        return None
+
+    s3_key = cache_key(kind, key, namespace)
+    if s3_key in _memory:
+        _memory.move_to_end(s3_key)
+        return _memory[s3_key]
+
+    s3 = get_client('s3')
+    try:
+        response = s3.get_object(Bucket=BUCKET_NAME, Key=s3_key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        print(f"⚠️  Blob cache read failed for {s3_key}: {str(e)}")
+        return None
+
+    value = json.loads(response['Body'].read())
+    _remember(s3_key, value)
+    return value
+
+
+def put(kind: str, key: str, value: Any, namespace: str = None):
+    """Store a value; failures only cost a future cache miss"""
+    if not BLOB_CACHE or not key or value is None:
+        return
+
+    s3_key = cache_key(kind, key, namespace)
+    try:
+        get_client('s3').put_object(
+            Bucket=BUCKET_NAME,
+            Key=s3_key,
+            Body=json.dumps(value).encode('utf-8'),
+            ContentType='application/json'
+        )
+        _remember(s3_key, value)
+    except Exception as e:
+        print(f"⚠️  Blob cache write failed for {s3_key}: {str(e)}")
+
+
+def get_or_compute(kind: str, key: str, compute: Callable[[], Any], namespace: str = None) -> Tuple[Any, bool]:
+    """(value, hit) - computes and stores the value on a miss"""
+    value = get(kind, key, namespace)
+    if value is not None:
+        return value, True
+    value = compute()
+    put(kind, key, value, namespace)
+    return value, False
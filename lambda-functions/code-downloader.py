@@ -1,9 +1,11 @@
 import json
-import boto3
 import urllib3
 from datetime import datetime
+from lambda_startup import get_client, log_startup, pre_init
+from review_coalescing import check_superseded
+from incremental_review import INCREMENTAL_REVIEW, load_file_results, load_previous_review, plan_incremental
+from review_filter import content_skip_reason, file_skip_reason, get_review_config
 
-s3_client = boto3.client('s3')
 http = urllib3.PoolManager()
 
 BUCKET_NAME = 'code-review-storage-sanya-2025'
@@ -14,6 +16,12 @@ def lambda_handler(event, context):
     print("=" * 60)
     print("📥 CODE DOWNLOADER (GitHub Integration)")
     print("=" * 60)
+    log_startup("CodeDownloader")
+    
+    # A newer push to the PR makes this execution stale
+    superseded = check_superseded(event, "CodeDownloader")
+    if superseded:
+        return superseded
     
     try:
         # Extract PR information
@@ -59,17 +67,49 @@ def lambda_handler(event, context):
         
         print(f"📁 Found {len(files)} changed files")
         
+        # Per-repo include/exclude globs, size limits and generated-file markers
+        review_config = get_review_config(repo_name)
+        
+        # Incremental mode: only re-review files whose blob SHA changed since the last review
+        incremental = None
+        if INCREMENTAL_REVIEW and event.get('action') == 'synchronize':
+            try:
+                previous = load_previous_review(repo_name, pr_number)
+            except Exception as e:
+                # Without the previous review every file is reviewed again
+                print(f"⚠️  Could not look up the previous review, reviewing all files: {str(e)}")
+                previous = None
+            if previous and previous.get('file_results_key'):
+                previous_results = load_file_results(previous['file_results_key'])
+                reviewable_files = [f for f in files if not file_skip_reason(f, review_config)]
+                incremental = {
+                    "previous_review_id": previous['review_id'],
+                    "file_results_key": previous['file_results_key'],
+                    **plan_incremental(reviewable_files, previous_results)
+                }
+                print(f"🔁 Incremental review: {len(incremental['changed'])} changed, "
+                      f"{len(incremental['unchanged'])} unchanged, {len(incremental['removed'])} removed")
+        
         # Download and upload Python files
         uploaded_files = []
         
         for file_info in files:
             filename = file_info.get('filename', '')
             raw_url = file_info.get('raw_url')
-            status = file_info.get('status')  # added, modified, removed
             
-            # Skip non-Python files and removed files
-            if not filename.endswith('.py') or status == 'removed':
-                print(f"⏭️  Skipping: {filename} (status: {status})")
+            # Skip removed files and paths the review config leaves out
+            skip_reason = file_skip_reason(file_info, review_config)
+            if skip_reason:
+                print(f"⏭️  Skipping: {filename} ({skip_reason})")
+                continue
+            
+            if incremental and filename in incremental['unchanged']:
+                print(f"♻️  Unchanged since last review: {filename}")
+                uploaded_files.append({
+                    "filename": filename,
+                    "sha": file_info.get('sha'),
+                    "carried_forward": True
+                })
                 continue
             
             print(f"📄 Downloading: {filename}")
@@ -83,10 +123,15 @@ def lambda_handler(event, context):
             
             file_content = file_response.data.decode('utf-8')
             
+            skip_reason = content_skip_reason(file_content, review_config)
+            if skip_reason:
+                print(f"⏭️  Skipping: {filename} ({skip_reason})")
+                continue
+            
             # Upload to S3
             s3_key = f"repos/{repo_name}/pr-{pr_number}/{filename}"
             
-            s3_client.put_object(
+            get_client('s3').put_object(
                 Bucket=BUCKET_NAME,
                 Key=s3_key,
                 Body=file_content.encode('utf-8'),
@@ -96,6 +141,7 @@ def lambda_handler(event, context):
             uploaded_files.append({
                 "filename": filename,
                 "s3_key": s3_key,
+                "sha": file_info.get('sha'),
                 "size": len(file_content)
             })
             
@@ -109,7 +155,8 @@ def lambda_handler(event, context):
             "statusCode": 200,
             "uploaded_files": uploaded_files,
             "total_files": len(files),
-            "python_files": len(uploaded_files)
+            "python_files": len(uploaded_files),
+            "incremental": incremental
         }
         
     except Exception as e:
@@ -120,4 +167,7 @@ def lambda_handler(event, context):
         return {
             "statusCode": 500,
             "error": str(e)
-        }
\ No newline at end of file
+        }
+
+
+pre_init(lambda: get_client('s3'))
@@ -1,10 +1,10 @@
 import json
 import os
-import boto3
-import ast
-from typing import Dict, List, Any
+from lambda_startup import get_client, log_startup, pre_init
+from review_coalescing import check_superseded
+from code_analysis import parse_python_file
+import blob_cache
 
-s3_client = boto3.client('s3')
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
 
 def lambda_handler(event, context):
@@ -13,16 +13,41 @@ def lambda_handler(event, context):
     print("=" * 60)
     print("🔍 CODE PARSER Started (AST Analysis)")
     print("=" * 60)
+    log_startup("CodeParser")
+    
+    # A newer push to the PR makes this execution stale
+    superseded = check_superseded(event, "CodeParser")
+    if superseded:
+        return superseded
     
     try:
-        uploaded_files = event.get('uploaded_files', [])
-        
-        if not uploaded_files:
+        if not event.get('uploaded_files'):
             return {
                 "statusCode": 400,
                 "error": "No uploaded_files provided"
             }
         
+        # Files carried forward from the previous review are not re-parsed
+        uploaded_files = [f for f in event['uploaded_files'] if not f.get('carried_forward')]
+        
+        if not uploaded_files:
+            # Push changed nothing reviewable; later steps carry the previous review forward
+            print("✅ Every file carried forward, nothing to parse")
+            return {
+                "statusCode": 200,
+                "parsed_files": [],
+                "skipped_files": [],
+                "statistics": {
+                    "total_files": 0,
+                    "parsed_files": 0,
+                    "skipped_files": 0,
+                    "total_functions": 0,
+                    "total_classes": 0,
+                    "total_lines": 0,
+                    "cache_hits": 0
+                }
+            }
+        
         print(f"📁 Parsing {len(uploaded_files)} files")
         
         parsed_files = []
@@ -30,6 +55,7 @@ def lambda_handler(event, context):
         total_functions = 0
         total_classes = 0
         total_lines = 0
+        cache_hits = 0
         
         for file_info in uploaded_files:
             filename = file_info.get('filename', 'unknown')
@@ -38,12 +64,23 @@ def lambda_handler(event, context):
             print(f"📄 Parsing: {filename}")
             
             try:
-                # Download file from S3
-                response = s3_client.get_object(Bucket=BUCKET_NAME, Key=s3_key)
-                code = response['Body'].read().decode('utf-8')
+                # Same content was parsed before (earlier PR or a prewarmed push)
+                cached = blob_cache.get('parse', file_info.get('sha'))
                 
-                # Parse with AST
-                parsed_data = parse_python_file(code, filename)
+                if cached:
+                    parsed_data = dict(cached, filename=filename)
+                    cache_hits += 1
+                else:
+                    # Download file from S3
+                    response = get_client('s3').get_object(Bucket=BUCKET_NAME, Key=s3_key)
+                    code = response['Body'].read().decode('utf-8')
+                    
+                    # Parse with AST
+                    parsed_data = parse_python_file(code, filename)
+                    
+                    if parsed_data:
+                        blob_cache.put('parse', file_info.get('sha') or blob_cache.git_blob_sha(code),
+                                       {k: v for k, v in parsed_data.items() if k != 'filename'})
                 
                 if parsed_data:
                     parsed_files.append(parsed_data)
@@ -70,7 +107,8 @@ def lambda_handler(event, context):
             "skipped_files": len(skipped_files),
             "total_functions": total_functions,
             "total_classes": total_classes,
-            "total_lines": total_lines
+            "total_lines": total_lines,
+            "cache_hits": cache_hits
         }
         
         print("=" * 60)
@@ -99,102 +137,4 @@ def lambda_handler(event, context):
         }
 
 
-def parse_python_file(code: str, filename: str) -> Dict[str, Any]:
-    """Parse Python code using AST"""
-    try:
-        tree = ast.parse(code)
-        
-        functions = []
-        classes = []
-        imports = []
-        
-        # Extract top-level elements
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                func_info = {
-                    "name": node.name,
-                    "line": node.lineno,
-                    "args": [arg.arg for arg in node.args.args],
-                    "has_docstring": ast.get_docstring(node) is not None,
-                    "decorators": [d.id if isinstance(d, ast.Name) else 'decorator' for d in node.decorator_list]
-                }
-                functions.append(func_info)
-                
-            elif isinstance(node, ast.ClassDef):
-                methods = [n.name for n in node.body if isinstance(n, ast.FunctionDef)]
-                class_info = {
-                    "name": node.name,
-                    "line": node.lineno,
-                    "methods": methods,
-                    "bases": [b.id if isinstance(b, ast.Name) else 'base' for b in node.bases],
-                    "has_docstring": ast.get_docstring(node) is not None
-                }
-                classes.append(class_info)
-                
-            elif isinstance(node, ast.Import):
-                for alias in node.names:
-                    imports.append({
-                        "module": alias.name,
-                        "alias": alias.asname,
-                        "type": "import"
-                    })
-                    
-            elif isinstance(node, ast.ImportFrom):
-                module = node.module if node.module else ""
-                for alias in node.names:
-                    imports.append({
-                        "module": f"{module}.{alias.name}" if module else alias.name,
-                        "alias": alias.asname,
-                        "type": "from_import"
-                    })
-        
-        # Calculate metrics
-        lines = code.split('\n')
-        lines_of_code = len([l for l in lines if l.strip() and not l.strip().startswith('#')])
-        
-        # Calculate complexity (simplified cyclomatic complexity)
-        complexity = calculate_complexity(tree)
-        
-        # Documentation ratio
-        documented_functions = sum(1 for f in functions if f['has_docstring'])
-        documented_classes = sum(1 for c in classes if c['has_docstring'])
-        total_documentable = len(functions) + len(classes)
-        documentation_ratio = (documented_functions + documented_classes) / total_documentable if total_documentable > 0 else 1.0
-        
-        return {
-            "filename": filename,
-            "functions": functions,
-            "classes": classes,
-            "imports": imports,
-            "metrics": {
-                "lines_of_code": lines_of_code,
-                "function_count": len(functions),
-                "class_count": len(classes),
-                "import_count": len(imports),
-                "complexity": complexity,
-                "documentation_ratio": documentation_ratio
-            }
-        }
-        
-    except SyntaxError as e:
-        print(f"❌ Syntax error in {filename}: {str(e)}")
-        return None
-    except Exception as e:
-        print(f"❌ Error parsing {filename}: {str(e)}")
-        return None
-
-
-def calculate_complexity(tree: ast.AST) -> int:
-    """Calculate cyclomatic complexity"""
-    complexity = 1  # Base complexity
-    
-    for node in ast.walk(tree):
-        # Decision points increase complexity
-        if isinstance(node, (ast.If, ast.While, ast.For, ast.ExceptHandler)):
-            complexity += 1
-        elif isinstance(node, ast.BoolOp):
-            complexity += len(node.values) - 1
-        elif isinstance(node, (ast.And, ast.Or)):
-            complexity += 1
-    
-    return complexity
+pre_init(lambda: get_client('s3'))
@@ -0,0 +1,160 @@
+"""
+Per-file Python analysis shared by CodeParser, EmbeddingGenerator and PushPrewarmer
+
+parse_python_file() is the CodeParser output for one file;
+extract_code_snippets() turns it into the snippets EmbeddingGenerator embeds
+(source spans from code_snippets when the file content is at hand).
+"""
+
+import ast
+from typing import Dict, Any
+from static_performance import analyze_tree as analyze_performance
+from code_snippets import source_snippets
+
+
+def parse_python_file(code: str, filename: str) -> Dict[str, Any]:
+    """Parse Python code using AST"""
+    try:
+        tree = ast.parse(code)
+        
+        functions = []
+        classes = []
+        imports = []
+        
+        # Extract top-level elements
+        for node in ast.walk(tree):
+            if isinstance(node, ast.FunctionDef):
+                func_info = {
+                    "name": node.name,
+                    "line": node.lineno,
+                    "end_line": node.end_lineno,
+                    "args": [arg.arg for arg in node.args.args],
+                    "has_docstring": ast.get_docstring(node) is not None,
+                    "decorators": [d.id if isinstance(d, ast.Name) else 'decorator' for d in node.decorator_list]
+                }
+                functions.append(func_info)
+                
+            elif isinstance(node, ast.ClassDef):
+                methods = [n.name for n in node.body if isinstance(n, ast.FunctionDef)]
+                class_info = {
+                    "name": node.name,
+                    "line": node.lineno,
+                    "end_line": node.end_lineno,
+                    "methods": methods,
+                    "bases": [b.id if isinstance(b, ast.Name) else 'base' for b in node.bases],
+                    "has_docstring": ast.get_docstring(node) is not None
+                }
+                classes.append(class_info)
+                
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    imports.append({
+                        "module": alias.name,
+                        "alias": alias.asname,
+                        "type": "import"
+                    })
+                    
+            elif isinstance(node, ast.ImportFrom):
+                module = node.module if node.module else ""
+                for alias in node.names:
+                    imports.append({
+                        "module": f"{module}.{alias.name}" if module else alias.name,
+                        "alias": alias.asname,
+                        "type": "from_import"
+                    })
+        
+        # Calculate metrics
+        lines = code.split('\n')
+        lines_of_code = len([l for l in lines if l.strip() and not l.strip().startswith('#')])
+        
+        # Calculate complexity (simplified cyclomatic complexity)
+        complexity = calculate_complexity(tree)
+        
+        # Documentation ratio
+        documented_functions = sum(1 for f in functions if f['has_docstring'])
+        documented_classes = sum(1 for c in classes if c['has_docstring'])
+        total_documentable = len(functions) + len(classes)
+        documentation_ratio = (documented_functions + documented_classes) / total_documentable if total_documentable > 0 else 1.0
+        
+        return {
+            "filename": filename,
+            "functions": functions,
+            "classes": classes,
+            "imports": imports,
+            "performance_findings": analyze_performance(tree),
+            "metrics": {
+                "lines_of_code": lines_of_code,
+                "function_count": len(functions),
+                "class_count": len(classes),
+                "import_count": len(imports),
+                "complexity": complexity,
+                "documentation_ratio": documentation_ratio
+            }
+        }
+        
+    except SyntaxError as e:
+        print(f"❌ Syntax error in {filename}: {str(e)}")
+        return None
+    except Exception as e:
+        print(f"❌ Error parsing {filename}: {str(e)}")
+        return None
+
+
+def calculate_complexity(tree: ast.AST) -> int:
+    """Calculate cyclomatic complexity"""
+    complexity = 1  # Base complexity
+    
+    for node in ast.walk(tree):
+        # Decision points increase complexity
+        if isinstance(node, (ast.If, ast.While, ast.For, ast.ExceptHandler)):
+            complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        elif isinstance(node, (ast.And, ast.Or)):
+            complexity += 1
+    
+    return complexity
+
+
+def extract_code_snippets(parsed_file, code=None, max_snippets=10):
+    """
+    Extract important code snippets for embedding
+    
+    With the file's source, snippets are normalized source spans (see
+    code_snippets); without it, or for parse output cached before `end_line`
+    existed, they fall back to one-line descriptions.
+    """
+    if code is not None:
+        snippets = source_snippets(parsed_file, code)
+        if snippets:
+            return snippets
+    
+    snippets = []
+    
+    filename = parsed_file.get('filename', 'unknown')
+    
+    # Extract functions
+    functions = parsed_file.get('functions', [])
+    for func in functions[:max_snippets]:
+        snippet = {
+            'type': 'function',
+            'name': func.get('name'),
+            'filename': filename,
+            'line': func.get('line'),
+            'context': f"Function: {func.get('name')} with args {func.get('args', [])}"
+        }
+        snippets.append(snippet)
+    
+    # Extract classes
+    classes = parsed_file.get('classes', [])
+    for cls in classes[:max_snippets]:
+        snippet = {
+            'type': 'class',
+            'name': cls.get('name'),
+            'filename': filename,
+            'line': cls.get('line'),
+            'context': f"Class: {cls.get('name')} with methods {cls.get('methods', [])}"
+        }
+        snippets.append(snippet)
+    
+    return snippets
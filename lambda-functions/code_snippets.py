@@ -0,0 +1,178 @@
+"""
+Embedding snippets built from source spans
+
+Each function (methods included, nested functions folded into their parent)
+becomes a snippet of its own source, from the `line` / `end_line` CodeParser
+reports. A function longer than SNIPPET_MAX_TOKENS is split between
+statements of its body (descending into oversized if/for/try blocks); every
+chunk repeats the signature so it still reads as part of that function.
+Classes contribute a header snippet (signature, docstring, class
+attributes) without their methods.
+
+Snippet text is normalized before hashing and embedding: comments, blank
+lines, trailing whitespace and common indentation are dropped, so
+reformatting or re-commenting a function keeps its embedding_id.
+"""
+
+import ast
+import io
+import os
+import textwrap
+import tokenize
+from typing import Any, Dict, List, Optional
+
+SNIPPET_MAX_TOKENS = int(os.environ.get('SNIPPET_MAX_TOKENS', '512'))
+MAX_SNIPPETS_PER_FILE = int(os.environ.get('MAX_SNIPPETS_PER_FILE', '200'))
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _strip_comments(text: str) -> str:
+    """Remove comment tokens (line-based fallback when the text does not tokenize)"""
+    try:
+        tokens = [tok for tok in tokenize.generate_tokens(io.StringIO(text).readline)
+                  if tok.type != tokenize.COMMENT]
+        return tokenize.untokenize(tokens)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return '\n'.join(line for line in text.split('\n') if not line.strip().startswith('#'))
+
+
+def normalize_source(text: str) -> str:
+    """Comment-, blank-line- and indentation-insensitive form of a source span"""
+    text = textwrap.dedent(text.replace('\r\n', '\n').replace('\r', '\n'))
+    lines = [line.rstrip() for line in _strip_comments(text).split('\n')]
+    return '\n'.join(line for line in lines if line.strip())
+
+
+def _span(lines: List[str], start: int, end: int) -> str:
+    """1-based inclusive line span"""
+    return '\n'.join(lines[start - 1:end])
+
+
+def _body_statements(source: str) -> Optional[List[ast.stmt]]:
+    """Top-level body statements of a single def/class span"""
+    try:
+        tree = ast.parse(textwrap.dedent(source))
+    except SyntaxError:
+        return None
+    if not tree.body or not isinstance(tree.body[0], (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return None
+    return tree.body[0].body
+
+
+def _statement_units(statement: ast.AST, lines: List[str], budget: int) -> List[str]:
+    """
+    Source of a statement, or for an oversized compound statement its header
+    and nested statements (recursively) as separate units
+    """
+    text = _span(lines, statement.lineno, statement.end_lineno)
+    children = sorted(
+        (child for field in ('body', 'handlers', 'orelse', 'finalbody')
+         for child in getattr(statement, field, None) or []
+         if isinstance(child, (ast.stmt, ast.excepthandler))),
+        key=lambda child: child.lineno
+    )
+    if estimate_tokens(text) <= budget or not children:
+        return [text]
+
+    units = []
+    if children[0].lineno > statement.lineno:
+        units.append(_span(lines, statement.lineno, children[0].lineno - 1))
+    for index, child in enumerate(children):
+        units.extend(_statement_units(child, lines, budget))
+        # `else:` / `finally:` lines between two nested statements
+        end = children[index + 1].lineno - 1 if index + 1 < len(children) else statement.end_lineno
+        if child.end_lineno < end:
+            units.append(_span(lines, child.end_lineno + 1, end))
+    return units
+
+
+def chunk_function(source: str, max_tokens: int = None) -> List[str]:
+    """Split a function span at body statement boundaries; each chunk keeps the signature"""
+    max_tokens = max_tokens or SNIPPET_MAX_TOKENS
+    if estimate_tokens(source) <= max_tokens:
+        return [source]
+
+    body = _body_statements(source)
+    if not body:
+        return [source]
+
+    lines = textwrap.dedent(source).split('\n')
+    header = '\n'.join(lines[:body[0].lineno - 1])
+    budget = max(1, max_tokens - estimate_tokens(header))
+
+    units = [unit for statement in body for unit in _statement_units(statement, lines, budget)]
+
+    chunks, current, size = [], [], 0
+    for text in units:
+        tokens = estimate_tokens(text)
+        if current and size + tokens > budget:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += tokens
+    if current:
+        chunks.append(current)
+
+    return [header + '\n' + '\n'.join(chunk) for chunk in chunks]
+
+
+def _class_header(source: str) -> str:
+    """Class span without its method bodies"""
+    body = _body_statements(source)
+    if not body:
+        return source
+    lines = textwrap.dedent(source).split('\n')
+    kept = [_span(lines, 1, body[0].lineno - 1)]
+    kept.extend(
+        _span(lines, statement.lineno, statement.end_lineno) for statement in body
+        if not isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef))
+    )
+    return '\n'.join(kept)
+
+
+def source_snippets(parsed_file: Dict[str, Any], code: str, max_tokens: int = None) -> List[Dict[str, Any]]:
+    """Snippets with normalized source for every function and class in a parsed file"""
+    filename = parsed_file.get('filename', 'unknown')
+    lines = code.split('\n')
+    snippets = []
+
+    functions = [f for f in parsed_file.get('functions', []) if f.get('end_line')]
+    spans = [(f['line'], f['end_line']) for f in functions]
+
+    for func in functions:
+        start, end = func['line'], func['end_line']
+        # Nested functions are already part of their parent's chunks
+        if any(s < start and end <= e for s, e in spans):
+            continue
+        chunks = chunk_function(_span(lines, start, end), max_tokens)
+        for part, chunk in enumerate(chunks):
+            snippets.append({
+                'type': 'function',
+                'name': func.get('name'),
+                'filename': filename,
+                'line': start,
+                'end_line': end,
+                'part': part,
+                'parts': len(chunks),
+                'context': normalize_source(chunk)
+            })
+
+    for cls in parsed_file.get('classes', []):
+        if not cls.get('end_line'):
+            continue
+        snippets.append({
+            'type': 'class',
+            'name': cls.get('name'),
+            'filename': filename,
+            'line': cls['line'],
+            'end_line': cls['end_line'],
+            'part': 0,
+            'parts': 1,
+            'context': normalize_source(_class_header(_span(lines, cls['line'], cls['end_line'])))
+        })
+
+    return [s for s in snippets if s['context']][:MAX_SNIPPETS_PER_FILE]
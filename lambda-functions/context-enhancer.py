@@ -1,25 +1,58 @@
 import json
 import os
-import boto3
 from typing import Dict, List, Any
 from decimal import Decimal
-
-# Initialize clients
-dynamodb = boto3.resource('dynamodb')
-s3_client = boto3.client('s3')
+from lambda_startup import get_client, log_startup
+from review_coalescing import check_superseded
+from context_cache import CONTEXT_CACHE_MODE, create_file_caches
 
 EMBEDDINGS_TABLE = os.environ.get('EMBEDDINGS_TABLE', 'code_embeddings')
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
 
+# static_performance rule -> performance pattern name
+PERFORMANCE_RULE_PATTERNS = {
+    'nested-loop-same-iterable': 'nested_loops',
+    'list-membership-in-loop': 'list_membership_in_loop',
+    'string-concat-in-loop': 'string_concat_in_loop',
+    'append-to-comprehension': 'append_loop',
+    'io-in-loop': 'n_plus_one'
+}
+
 def lambda_handler(event, context):
     """Enhance code analysis with historical context from RAG pipeline"""
     
     print("=" * 60)
     print("🧠 CONTEXT ENHANCER Started (RAG Pipeline)")
     print("=" * 60)
+    log_startup("ContextEnhancer")
+    
+    # A newer push to the PR makes this execution stale
+    superseded = check_superseded(event, "ContextEnhancer")
+    if superseded:
+        return superseded
     
     try:
         parsed_files = event.get('parsed_files', [])
+        uploaded_files = event.get('uploaded_files', [])
+        
+        # A push that changed no reviewed file (incremental review) has nothing to parse
+        all_carried = (uploaded_files and all(f.get('carried_forward') for f in uploaded_files)) \
+            or event.get('incremental', {}).get('changed') == []
+        if not parsed_files and all_carried:
+            print("✅ Every file carried forward, no context to enhance")
+            return {
+                "statusCode": 200,
+                "context_map": {},
+                "context_caches": {},
+                "statistics": {
+                    "total_files": 0,
+                    "total_patterns": 0,
+                    "security_patterns": 0,
+                    "performance_patterns": 0,
+                    "quality_patterns": 0,
+                    "cached_contexts": 0
+                }
+            }
         
         if not parsed_files:
             return {
@@ -59,12 +92,22 @@ def lambda_handler(event, context):
             
             print(f"✅ {filename}: {len(patterns['security'])} security, {len(patterns['performance'])} performance, {len(patterns['quality'])} quality patterns")
         
+        # Upload each file once as a cached prefix shared by all agents
+        context_caches = {}
+        if CONTEXT_CACHE_MODE != 'off':
+            context_caches = create_context_caches(
+                parsed_files,
+                event.get('uploaded_files', []),
+                f"{event.get('repo_name', 'unknown')}#{event.get('pr_number', 0)}"
+            )
+        
         statistics = {
             "total_files": len(parsed_files),
             "total_patterns": total_patterns,
             "security_patterns": security_patterns,
             "performance_patterns": performance_patterns,
-            "quality_patterns": quality_patterns
+            "quality_patterns": quality_patterns,
+            "cached_contexts": len(context_caches)
         }
         
         print("=" * 60)
@@ -78,6 +121,7 @@ def lambda_handler(event, context):
         return {
             "statusCode": 200,
             "context_map": context_map,
+            "context_caches": context_caches,
             "statistics": statistics
         }
         
@@ -92,6 +136,31 @@ def lambda_handler(event, context):
         }
 
 
+def create_context_caches(parsed_files: List[Dict[str, Any]], uploaded_files: List[Dict[str, Any]],
+                          review_key: str) -> Dict[str, Dict[str, Any]]:
+    """Download each parsed file and register it as a cached agent context"""
+    
+    s3_keys = {f.get('filename'): f.get('s3_key') for f in uploaded_files}
+    files = []
+    
+    for parsed_file in parsed_files:
+        filename = parsed_file.get('filename')
+        s3_key = s3_keys.get(filename)
+        if not s3_key:
+            continue
+        
+        try:
+            response = get_client('s3').get_object(Bucket=BUCKET_NAME, Key=s3_key)
+            code = response['Body'].read().decode('utf-8')
+        except Exception as e:
+            print(f"⚠️  Could not load {filename} for context caching: {str(e)}")
+            continue
+        
+        files.append({"filename": filename, "code": code, "parsed_meta": parsed_file})
+    
+    return create_file_caches(files, review_key)
+
+
 def identify_code_patterns(parsed_file: Dict[str, Any]) -> Dict[str, List[str]]:
     """Identify security, performance, and quality patterns in code"""
     
@@ -135,6 +204,13 @@ def identify_code_patterns(parsed_file: Dict[str, Any]) -> Dict[str, List[str]]:
     if complexity > 10:
         patterns['performance'].append('high_complexity')
     
+    # Anti-patterns found by the AST analyzer in CodeParser
+    for result in parsed_file.get('performance_findings', []):
+        for finding in result.get('findings', []):
+            pattern = PERFORMANCE_RULE_PATTERNS.get(finding.get('rule'))
+            if pattern and pattern not in patterns['performance']:
+                patterns['performance'].append(pattern)
+    
     for func in functions:
         func_name = func.get('name', '').lower()
         
@@ -210,6 +286,22 @@ def find_historical_context(parsed_file: Dict[str, Any], patterns: Dict[str, Lis
             "recommendation": "Consider refactoring into smaller functions"
         })
     
+    if 'nested_loops' in patterns['performance']:
+        historical_issues.append({
+            "category": "performance",
+            "issue": "Nested loops over the same iterable detected",
+            "severity": "high",
+            "recommendation": "Index one side in a dict/set to avoid O(n²) scans"
+        })
+    
+    if 'n_plus_one' in patterns['performance']:
+        historical_issues.append({
+            "category": "performance",
+            "issue": "Queries or I/O issued inside loops (N+1)",
+            "severity": "high",
+            "recommendation": "Batch the calls or fetch everything once before the loop"
+        })
+    
     if 'search_operation' in patterns['performance']:
         historical_issues.append({
             "category": "performance",
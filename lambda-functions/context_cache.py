@@ -0,0 +1,217 @@
+"""
+Per-file prompt-prefix caching shared by the review agents
+
+The file source plus its CodeParser metadata is uploaded once per review as
+a cached context. Each agent then sends only its short instruction against
+that prefix, so the file tokens are billed/processed once instead of three
+times. Handles are plain dicts so they can travel through Step Functions,
+carry their own expiry, and are released by the aggregator when the review
+finishes.
+
+CONTEXT_CACHE_MODE:
+    off     - agents send the full prompt (default)
+    gemini  - Gemini cachedContents API (via gemini_client)
+    local   - in-process stand-in for tests and the local executor
+"""
+
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+CONTEXT_CACHE_MODE = os.environ.get('CONTEXT_CACHE_MODE', 'off')
+CACHE_TTL_SECONDS = int(os.environ.get('CONTEXT_CACHE_TTL_SECONDS', '900'))
+# Gemini rejects cached contents below the model's minimum token count
+MIN_CACHE_TOKENS = int(os.environ.get('CONTEXT_CACHE_MIN_TOKENS', '1024'))
+CACHE_MODEL = os.environ.get('CONTEXT_CACHE_MODEL', 'gemini-2.5-flash')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return len(text) // 4
+
+
+def build_file_context(code: str, filename: str, parsed_meta: Dict[str, Any]) -> str:
+    """Agent-neutral prefix: file metadata followed by the full source"""
+    metrics = parsed_meta.get('metrics', {}) if parsed_meta else {}
+    functions = [f.get('name') for f in (parsed_meta or {}).get('functions', [])]
+    classes = [c.get('name') for c in (parsed_meta or {}).get('classes', [])]
+
+    return f"""The following Python file is under review. Later instructions refer to it.
+
+**File:** `{filename}`
+
+**File Metadata:**
+- Functions: {metrics.get('function_count', len(functions))} ({', '.join(functions[:50])})
+- Classes: {metrics.get('class_count', len(classes))} ({', '.join(classes[:50])})
+- Lines of code: {metrics.get('lines_of_code', 'N/A')}
+- Complexity: {metrics.get('complexity', 'N/A')}
+- Documentation: {metrics.get('documentation_ratio', 0)*100:.0f}%
+
+**Code to analyze:**
+```python
+{code}
+```
+"""
+
+
+class LocalContextCache:
+    """In-process stand-in: keeps prefixes in memory and prepends them to the instruction"""
+
+    name = 'local'
+
+    def __init__(self):
+        self.entries = {}
+
+    def create(self, model_name: str, text: str, ttl_seconds: int, display_name: str) -> str:
+        cache_name = f"cachedContents/local-{uuid.uuid4().hex[:12]}"
+        self.entries[cache_name] = text
+        return cache_name
+
+    def generate(self, handle: Dict[str, Any], instruction: str, model, request_options=None,
+                 generation_config=None):
+        prefix = self.entries.get(handle['name'])
+        if prefix is None:
+            raise KeyError(f"Unknown or expired context cache: {handle['name']}")
+        return model.generate_content(f"{prefix}\n{instruction}", request_options=request_options)
+
+    def delete(self, cache_name: str):
+        self.entries.pop(cache_name, None)
+
+
+class GeminiContextCache:
+    """Gemini cachedContents backend (REST)"""
+
+    name = 'gemini'
+
+    def _client(self):
+        import gemini_client
+        if not gemini_client._api_key:
+            from secrets_helper import get_gemini_api_key
+            gemini_client.configure(api_key=get_gemini_api_key())
+        return gemini_client
+
+    def create(self, model_name: str, text: str, ttl_seconds: int, display_name: str) -> str:
+        resource = self._client().create_cached_content(
+            model_name, text, ttl_seconds=ttl_seconds, display_name=display_name
+        )
+        return resource['name']
+
+    def generate(self, handle: Dict[str, Any], instruction: str, model=None, request_options=None,
+                 generation_config=None):
+        client = self._client()
+        cached_model = client.GenerativeModel(handle['model'], generation_config=generation_config,
+                                              cached_content=handle['name'])
+        return cached_model.generate_content(instruction, request_options=request_options)
+
+    def delete(self, cache_name: str):
+        self._client().delete_cached_content(cache_name)
+
+
+_backends = {}
+
+
+def get_cache_backend(mode: str = None):
+    """Return the (memoized) backend for the given mode, or None when caching is off"""
+    mode = mode or CONTEXT_CACHE_MODE
+    if mode == 'off':
+        return None
+    if mode not in _backends:
+        if mode == 'gemini':
+            _backends[mode] = GeminiContextCache()
+        elif mode == 'local':
+            _backends[mode] = LocalContextCache()
+        else:
+            raise ValueError(f"Unknown CONTEXT_CACHE_MODE: {mode}")
+    return _backends[mode]
+
+
+def create_file_caches(files: List[Dict[str, Any]], review_key: str, mode: str = None,
+                       model_name: str = CACHE_MODEL) -> Dict[str, Dict[str, Any]]:
+    """
+    Create one cached context per file
+
+    Args:
+        files: [{'filename', 'code', 'parsed_meta'}]
+        review_key: Identifier used in cache display names (e.g. repo#pr)
+
+    Returns:
+        {filename: handle} for files large enough to be cached
+    """
+    backend = get_cache_backend(mode)
+    if backend is None:
+        return {}
+
+    handles = {}
+    for file_data in files:
+        filename = file_data['filename']
+        text = build_file_context(file_data['code'], filename, file_data.get('parsed_meta', {}))
+
+        if estimate_tokens(text) < MIN_CACHE_TOKENS:
+            print(f"⏭️  Not caching {filename}: below {MIN_CACHE_TOKENS} tokens")
+            continue
+
+        try:
+            cache_name = backend.create(model_name, text, CACHE_TTL_SECONDS, f"{review_key}:{filename}")
+        except Exception as e:
+            print(f"⚠️  Context cache creation failed for {filename}: {str(e)}")
+            continue
+
+        handles[filename] = {
+            "name": cache_name,
+            "backend": backend.name,
+            "model": model_name,
+            "expires_at": int(time.time()) + CACHE_TTL_SECONDS,
+            "cached_tokens": estimate_tokens(text)
+        }
+        print(f"🧊 Cached context for {filename}: {cache_name}")
+
+    return handles
+
+
+def get_live_handle(context_caches: Optional[Dict[str, Any]], filename: str) -> Optional[Dict[str, Any]]:
+    """Return the file's cache handle if it exists and has not expired"""
+    handle = (context_caches or {}).get(filename)
+    if not handle or handle.get('expires_at', 0) <= time.time() + 30:
+        return None
+    return handle
+
+
+def is_cache_miss(error: Exception) -> bool:
+    """
+    True when a cached call failed because the cache itself is gone
+
+    Expired or deleted cachedContents answer 404/NOT_FOUND (the local backend
+    raises KeyError). Throttling and timeouts are not misses: the policy has
+    already retried them, and a full-prompt fallback would double the quota.
+    """
+    if isinstance(error, KeyError):
+        return True
+    for attr in ('status', 'code', 'status_code'):
+        value = getattr(error, attr, None)
+        value = getattr(value, 'value', value)  # grpc/http enum codes
+        if value == 404:
+            return True
+    message = str(error)
+    return 'NOT_FOUND' in message or 'CachedContent not found' in message
+
+
+def generate_from_cache(handle: Dict[str, Any], instruction: str, model=None, request_options=None,
+                        generation_config=None):
+    """Run an agent instruction against a cached file context"""
+    backend = get_cache_backend(handle['backend'])
+    return backend.generate(handle, instruction, model, request_options=request_options,
+                            generation_config=generation_config)
+
+
+def release_caches(context_caches: Optional[Dict[str, Any]]) -> int:
+    """Delete all cache handles of a finished review; returns how many were released"""
+    released = 0
+    for filename, handle in (context_caches or {}).items():
+        try:
+            get_cache_backend(handle['backend']).delete(handle['name'])
+            released += 1
+        except Exception as e:
+            # The server-side TTL still expires it
+            print(f"⚠️  Could not release context cache for {filename}: {str(e)}")
+    return released
@@ -0,0 +1,77 @@
+import json
+import os
+from lambda_startup import get_genai, get_table, log_startup, pre_init
+from embedding_index import EMBEDDINGS_TABLE, index_snippets
+from embedding_jobs import EMBED_REQUESTS_PER_MINUTE, EMBEDDING_CONSUMER_CONCURRENCY, EMBEDDING_MAX_RECEIVES, receive_count
+from rate_limiter import TokenBucket
+
+# This container's share of the embedding request budget
+limiter = TokenBucket.per_minute(EMBED_REQUESTS_PER_MINUTE / max(1, EMBEDDING_CONSUMER_CONCURRENCY))
+
+_genai_configured = False
+
+
+def get_configured_genai():
+    """Import and configure the Gemini client on first use"""
+    global _genai_configured
+    
+    genai = get_genai()
+    if not _genai_configured:
+        genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
+        _genai_configured = True
+    return genai
+
+
+def lambda_handler(event, context):
+    """Index a batch of queued embedding jobs under the shared rate limit"""
+    
+    print("=" * 60)
+    print("🔢 EMBEDDING CONSUMER")
+    print("=" * 60)
+    log_startup("EmbeddingConsumer")
+    
+    records = event.get('Records', [])
+    jobs, job_records = [], []
+    
+    for record in records:
+        try:
+            job = json.loads(record['body'])
+            missing = [key for key in ('review_id', 'issues', 'snippets') if key not in job]
+            if missing:
+                raise KeyError(', '.join(missing))
+        except (ValueError, KeyError) as e:
+            # Retrying cannot fix a malformed job
+            print(f"❌ Dropping malformed job {record['messageId']}: {str(e)}")
+            continue
+        jobs.append(job)
+        job_records.append(record)
+    
+    print(f"📋 {len(jobs)} jobs, {sum(len(job['snippets']) for job in jobs)} snippets")
+    
+    try:
+        results = index_snippets(get_configured_genai(), jobs, limiter=limiter)
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        return {"batchItemFailures": [{"itemIdentifier": r['messageId']} for r in job_records]}
+    
+    # Retries are idempotent: stored vectors are reused, links overwritten
+    failures = []
+    for record, result in zip(job_records, results):
+        if result['complete']:
+            continue
+        attempts = receive_count(record)
+        destination = "dead-letter queue" if attempts >= EMBEDDING_MAX_RECEIVES else "retry"
+        print(f"⚠️  Job for {result['review_id']} incomplete ({result['links']}/{result['distinct']} linked), "
+              f"attempt {attempts} -> {destination}")
+        failures.append({"itemIdentifier": record['messageId']})
+    
+    print(f"✅ Indexed {len(results) - len(failures)} jobs, "
+          f"{sum(r['embedded'] for r in results)} new vectors, {sum(r['reused'] for r in results)} reused, "
+          f"{limiter.waited:.1f}s rate-limited")
+    
+    return {"batchItemFailures": failures}
+
+
+pre_init(get_configured_genai, lambda: get_table(EMBEDDINGS_TABLE))
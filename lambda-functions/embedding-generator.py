@@ -1,108 +1,46 @@
 import json
-import boto3
 import os
-import uuid
-from datetime import datetime
-from decimal import Decimal
-import google.generativeai as genai
+from lambda_startup import get_client, get_genai, get_table, log_startup, pre_init
+from code_analysis import extract_code_snippets
+from embedding_index import EMBEDDINGS_TABLE, index_snippets
+from embedding_jobs import EMBEDDING_MODE, build_jobs, enqueue_jobs
+from agent_results import agent_review
 
-# Initialize
-dynamodb = boto3.resource('dynamodb')
-genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
 
-EMBEDDINGS_TABLE = os.environ.get('EMBEDDINGS_TABLE', 'code_embeddings')
+_genai_configured = False
 
-embeddings_table = dynamodb.Table(EMBEDDINGS_TABLE)
 
-
-def generate_embedding(text):
-    """Generate embedding vector for text using Gemini"""
-    try:
-        print(f"🔢 Generating embedding for {len(text)} characters")
-        
-        # Truncate if too long
-        if len(text) > 8000:
-            text = text[:8000]
-            print(f"⚠️  Truncated to 8000 characters")
-        
-        # Gemini embeddings
-        result = genai.embed_content(
-            model="models/text-embedding-004",
-            content=text,
-            task_type="retrieval_document"
-        )
-        
-        embedding = result['embedding']
-        print(f"✅ Generated {len(embedding)}-dimensional embedding")
-        
-        return embedding
-        
-    except Exception as e:
-        print(f"❌ Embedding error: {str(e)}")
-        return None
+def get_configured_genai():
+    """Import and configure the Gemini client on first use"""
+    global _genai_configured
+    
+    genai = get_genai()
+    if not _genai_configured:
+        genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
+        _genai_configured = True
+    return genai
 
 
-def extract_code_snippets(parsed_file, max_snippets=10):
-    """Extract important code snippets for embedding"""
-    snippets = []
-    
-    filename = parsed_file.get('filename', 'unknown')
-    
-    # Extract functions
-    functions = parsed_file.get('functions', [])
-    for func in functions[:max_snippets]:
-        snippet = {
-            'type': 'function',
-            'name': func.get('name'),
-            'filename': filename,
-            'line': func.get('line'),
-            'context': f"Function: {func.get('name')} with args {func.get('args', [])}"
-        }
-        snippets.append(snippet)
-    
-    # Extract classes
-    classes = parsed_file.get('classes', [])
-    for cls in classes[:max_snippets]:
-        snippet = {
-            'type': 'class',
-            'name': cls.get('name'),
-            'filename': filename,
-            'line': cls.get('line'),
-            'context': f"Class: {cls.get('name')} with methods {cls.get('methods', [])}"
-        }
-        snippets.append(snippet)
-    
-    return snippets
+def load_sources(uploaded_files):
+    """Source of each uploaded file by filename (files that cannot be read are left out)"""
+    sources = {}
+    for file_info in uploaded_files:
+        if file_info.get('carried_forward') or not file_info.get('s3_key'):
+            continue
+        try:
+            response = get_client('s3').get_object(Bucket=BUCKET_NAME, Key=file_info['s3_key'])
+            sources[file_info['filename']] = response['Body'].read().decode('utf-8')
+        except Exception as e:
+            print(f"⚠️  Could not load {file_info.get('filename')}: {str(e)}")
+    return sources
 
 
-def store_embedding(embedding_data):
-    """Store embedding in DynamoDB"""
-    try:
-        embedding_vector = [Decimal(str(float(x))) for x in embedding_data['embedding']]
-        
-        item = {
-            'embedding_id': embedding_data['embedding_id'],
-            'timestamp': embedding_data['timestamp'],
-            'review_id': embedding_data.get('review_id'),
-            'snippet_type': embedding_data['snippet_type'],
-            'snippet_name': embedding_data['snippet_name'],
-            'filename': embedding_data['filename'],
-            'context': embedding_data['context'],
-            'embedding_vector': embedding_vector,
-            'embedding_dimension': len(embedding_vector),
-            'vulnerability_type': embedding_data.get('vulnerability_type', 'none'),
-            'performance_issue': embedding_data.get('performance_issue', False),
-            'code_quality_issue': embedding_data.get('code_quality_issue', False)
-        }
-        
-        embeddings_table.put_item(Item=item)
-        print(f"✅ Stored embedding: {embedding_data['embedding_id']}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Storage error: {str(e)}")
-        return False
+def agent_text(agent, result):
+    """Agent summary plus its structured findings, lowercased for keyword matching"""
+    findings = "\n".join(f"{f.get('rule', '')}: {f.get('message', '')} {f.get('detail', '')}"
+                          for f in result.get('findings', []))
+    return f"{agent_review(agent, result)}\n{findings}".lower()
 
 
 def analyze_for_issues(agent_results):
@@ -114,7 +52,7 @@ def analyze_for_issues(agent_results):
     }
     
     security = agent_results.get('security', {})
-    security_review = security.get('review', '').lower()
+    security_review = agent_text('security', security)
     
     if 'sql injection' in security_review:
         issues['vulnerabilities'].append('sql_injection')
@@ -128,7 +66,7 @@ def analyze_for_issues(agent_results):
         issues['vulnerabilities'].append('unsafe_pickle')
     
     performance = agent_results.get('performance', {})
-    performance_review = performance.get('review', '').lower()
+    performance_review = agent_text('performance', performance)
     
     if 'o(n²)' in performance_review or 'nested loop' in performance_review:
         issues['performance_issues'].append('nested_loops')
@@ -138,7 +76,7 @@ def analyze_for_issues(agent_results):
         issues['performance_issues'].append('memory_leak')
     
     best_practices = agent_results.get('best_practices', {})
-    quality_review = best_practices.get('review', '').lower()
+    quality_review = agent_text('best_practices', best_practices)
     
     if 'missing docstring' in quality_review or 'no docstring' in quality_review:
         issues['quality_issues'].append('missing_documentation')
@@ -150,12 +88,38 @@ def analyze_for_issues(agent_results):
     return issues
 
 
+def enqueue_review(review_id, snippets, issues):
+    """Hand the review's snippets to the embedding queue; never fails the review"""
+    jobs = build_jobs(review_id, snippets, issues) if snippets else []
+    try:
+        message_ids = enqueue_jobs(jobs)
+    except Exception as e:
+        print(f"⚠️  Could not enqueue embedding jobs: {str(e)}")
+        return {
+            'statusCode': 200,
+            'review_id': review_id,
+            'embedding_mode': 'queue',
+            'jobs_queued': 0,
+            'error': str(e)
+        }
+    
+    print(f"📬 Queued {len(message_ids)} embedding jobs ({len(snippets)} snippets)")
+    return {
+        'statusCode': 200,
+        'review_id': review_id,
+        'embedding_mode': 'queue',
+        'jobs_queued': len(message_ids),
+        'snippets': len(snippets)
+    }
+
+
 def lambda_handler(event, context):
     """Generate and store embeddings for analyzed code"""
     
     print("=" * 60)
     print("🔢 EMBEDDING GENERATOR Started (Gemini)")
     print("=" * 60)
+    log_startup("EmbeddingGenerator")
     
     try:
         review_id = event.get('review_id')
@@ -177,49 +141,26 @@ def lambda_handler(event, context):
         print(f"   - Performance: {len(issues['performance_issues'])}")
         print(f"   - Quality: {len(issues['quality_issues'])}")
         
-        embeddings_created = 0
-        timestamp = datetime.utcnow().isoformat() + 'Z'
+        # Snippets are source spans when DownloadCode's uploaded_files are passed in
+        sources = load_sources(event.get('uploaded_files', []))
         
+        snippets = []
         for parsed_file in parsed_files:
-            snippets = extract_code_snippets(parsed_file)
-            
-            print(f"\n📄 Processing {parsed_file.get('filename')}: {len(snippets)} snippets")
-            
-            for snippet in snippets:
-                embedding_vector = generate_embedding(snippet['context'])
-                
-                if embedding_vector:
-                    embedding_id = f"emb_{uuid.uuid4().hex[:16]}"
-                    
-                    snippet_name = snippet.get('name', '').lower()
-                    vulnerability_type = 'none'
-                    performance_issue = False
-                    quality_issue = False
-                    
-                    if 'query' in snippet_name and 'sql_injection' in issues['vulnerabilities']:
-                        vulnerability_type = 'sql_injection'
-                    elif 'search' in snippet_name and 'nested_loops' in issues['performance_issues']:
-                        performance_issue = True
-                    
-                    if 'missing_documentation' in issues['quality_issues']:
-                        quality_issue = True
-                    
-                    embedding_data = {
-                        'embedding_id': embedding_id,
-                        'timestamp': timestamp,
-                        'review_id': review_id,
-                        'snippet_type': snippet['type'],
-                        'snippet_name': snippet['name'],
-                        'filename': snippet['filename'],
-                        'context': snippet['context'],
-                        'embedding': embedding_vector,
-                        'vulnerability_type': vulnerability_type,
-                        'performance_issue': performance_issue,
-                        'code_quality_issue': quality_issue
-                    }
-                    
-                    if store_embedding(embedding_data):
-                        embeddings_created += 1
+            file_snippets = extract_code_snippets(parsed_file, sources.get(parsed_file.get('filename')))
+            print(f"📄 {parsed_file.get('filename')}: {len(file_snippets)} snippets")
+            snippets.extend(file_snippets)
+        
+        # Indexing runs in EmbeddingConsumer, outside the review's latency and failure path
+        if EMBEDDING_MODE == 'queue':
+            return enqueue_review(review_id, snippets, issues)
+        
+        # Unchanged snippets reuse their stored vector and only get a review link
+        embed_stats = index_snippets(get_configured_genai(), [
+            {'review_id': review_id, 'issues': issues, 'snippets': snippets}
+        ])[0]
+        embeddings_created = embed_stats['embedded']
+        print(f"♻️  Reused {embed_stats['reused']} of {embed_stats['distinct']} distinct snippets, "
+              f"embedded {embeddings_created}")
         
         print("\n" + "=" * 60)
         print(f"✅ Embedding Generation Complete")
@@ -231,6 +172,7 @@ def lambda_handler(event, context):
             'statusCode': 200,
             'review_id': review_id,
             'embeddings_created': embeddings_created,
+            'embedding_stats': embed_stats,
             'embedding_mode': 'gemini',
             'issues_tracked': {
                 'vulnerabilities': len(issues['vulnerabilities']),
@@ -247,4 +189,8 @@ def lambda_handler(event, context):
         return {
             'statusCode': 500,
             'error': str(e)
-        }
\ No newline at end of file
+        }
+
+
+if EMBEDDING_MODE != 'queue':
+    pre_init(get_configured_genai, lambda: get_table(EMBEDDINGS_TABLE))
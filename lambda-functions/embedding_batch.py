@@ -0,0 +1,117 @@
+"""
+Batched embedding of snippet texts
+
+embed_texts() embeds a whole review's snippets in a handful of requests
+instead of one embed_content call per snippet:
+
+    1. texts are truncated to EMBED_MAX_CHARS and de-duplicated
+    2. blob_cache hits are taken as-is
+    3. misses go to embed_content(content=[...]) in chunks of at most
+       EMBED_BATCH_SIZE texts / EMBED_BATCH_CHARS characters
+    4. a chunk that fails is split in half and retried, so one bad input
+       only loses its own vector
+
+Results are returned in input order, with None for texts that could not be
+embedded. Works with both GEMINI_CLIENT backends (the SDK and gemini_client
+both take a list and return {'embedding': [vector, ...]}).
+
+snippet_embedding_id() names an embedding after its normalized text and
+the model, so the same function body maps to the same stored vector in
+every review.
+"""
+
+import hashlib
+import os
+import textwrap
+from typing import Dict, List, Optional, Tuple
+import blob_cache
+
+EMBED_BATCH_SIZE = min(int(os.environ.get('EMBED_BATCH_SIZE', '100')), 100)
+EMBED_BATCH_CHARS = int(os.environ.get('EMBED_BATCH_CHARS', '200000'))
+EMBED_MAX_CHARS = 8000
+
+
+def normalize_snippet_text(text: str) -> str:
+    """Text as hashed for ids: LF line endings, no trailing spaces, common indent and blank edges removed"""
+    lines = [line.rstrip() for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n')]
+    return textwrap.dedent('\n'.join(lines)).strip('\n')
+
+
+def snippet_embedding_id(text: str, model: str = None) -> str:
+    """Stable embedding_id for a snippet under an embedding model"""
+    digest = hashlib.sha256(f"{model or blob_cache.EMBEDDING_MODEL}\n{normalize_snippet_text(text)}".encode('utf-8'))
+    return f"emb_{digest.hexdigest()[:32]}"
+
+
+def chunk_texts(texts: List[str], max_items: int = None, max_chars: int = None) -> List[List[int]]:
+    """Group text indexes into request-sized chunks (by count and total characters)"""
+    max_items = max_items or EMBED_BATCH_SIZE
+    max_chars = max_chars or EMBED_BATCH_CHARS
+    chunks, current, size = [], [], 0
+    for index, text in enumerate(texts):
+        if current and (len(current) >= max_items or size + len(text) > max_chars):
+            chunks.append(current)
+            current, size = [], 0
+        current.append(index)
+        size += len(text)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _embed_chunk(genai, texts: List[str], task_type: str, stats: Dict[str, int],
+                 limiter=None) -> List[Optional[List[float]]]:
+    """Embed one chunk, bisecting on failure to isolate the failing items"""
+    if limiter is not None:
+        limiter.acquire()
+    stats['requests'] += 1
+    try:
+        result = genai.embed_content(model=blob_cache.EMBEDDING_MODEL, content=texts, task_type=task_type)
+        vectors = result['embedding']
+        if len(vectors) != len(texts):
+            raise ValueError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+        return list(vectors)
+    except Exception as e:
+        if len(texts) == 1:
+            print(f"❌ Embedding error ({len(texts[0])} characters): {str(e)}")
+            stats['failed'] += 1
+            return [None]
+        print(f"⚠️  Batch of {len(texts)} failed, splitting: {str(e)}")
+        middle = len(texts) // 2
+        return (_embed_chunk(genai, texts[:middle], task_type, stats, limiter) +
+                _embed_chunk(genai, texts[middle:], task_type, stats, limiter))
+
+
+def embed_texts(genai, texts: List[str], task_type: str = "retrieval_document",
+                limiter=None) -> Tuple[List[Optional[List[float]]], Dict[str, int]]:
+    """
+    Embed many texts; returns (vectors in input order, stats)
+
+    limiter (rate_limiter.TokenBucket) is acquired once per request.
+
+    stats: texts, unique, cached, embedded, failed, requests
+    """
+    texts = [text[:EMBED_MAX_CHARS] for text in texts]
+    unique = list(dict.fromkeys(texts))
+    stats = {'texts': len(texts), 'unique': len(unique), 'cached': 0, 'embedded': 0, 'failed': 0, 'requests': 0}
+
+    vectors = {}
+    misses = []
+    for text in unique:
+        cached = blob_cache.get('embedding', blob_cache.text_key(text), namespace=blob_cache.EMBEDDING_MODEL)
+        if cached:
+            vectors[text] = cached
+            stats['cached'] += 1
+        else:
+            misses.append(text)
+
+    for chunk in chunk_texts(misses):
+        batch = [misses[i] for i in chunk]
+        for text, vector in zip(batch, _embed_chunk(genai, batch, task_type, stats, limiter)):
+            if vector is None:
+                continue
+            vectors[text] = vector
+            stats['embedded'] += 1
+            blob_cache.put('embedding', blob_cache.text_key(text), vector, namespace=blob_cache.EMBEDDING_MODEL)
+
+    return [vectors.get(text) for text in texts], stats
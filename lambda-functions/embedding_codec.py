@@ -0,0 +1,124 @@
+"""
+Compact binary storage of embedding vectors in `code_embeddings`
+
+Vectors are stored as one Binary attribute of packed little-endian floats
+instead of a List of Numbers (one Decimal per dimension):
+
+    embedding_vector     B   768 x float32 = 3 KB (float16: 1.5 KB)
+    embedding_dtype      S   'float32' | 'float16'
+    embedding_dimension  N
+
+decode_vector() returns a zero-copy memoryview over the attribute bytes for
+float32 (float16 has no native memoryview format, so it is unpacked), and
+still reads items written in the old List-of-Decimal layout.
+
+write_items() sends items through table.batch_writer(), which groups them
+into BatchWriteItem calls of 25 and resends UnprocessedItems;
+existing_keys() is the BatchGetItem counterpart used to skip stored vectors.
+"""
+
+import array
+import os
+import struct
+import sys
+from typing import Any, Dict, List, Sequence, Set, Union
+from lambda_startup import get_resource
+
+EMBEDDING_DTYPE = os.environ.get('EMBEDDING_DTYPE', 'float32')
+
+STRUCT_FORMATS = {'float32': 'f', 'float16': 'e'}
+ITEM_SIZES = {'float32': 4, 'float16': 2}
+BATCH_GET_LIMIT = 100
+BATCH_GET_ATTEMPTS = 5
+
+
+def encode_vector(vector: Sequence[float], dtype: str = None) -> bytes:
+    """Pack a vector as little-endian float32/float16 bytes"""
+    dtype = dtype or EMBEDDING_DTYPE
+    if dtype == 'float32':
+        packed = array.array('f', vector)
+        if sys.byteorder != 'little':
+            packed.byteswap()
+        return packed.tobytes()
+    if dtype == 'float16':
+        return struct.pack(f"<{len(vector)}e", *vector)
+    raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+
+def _raw_bytes(value: Any) -> Union[bytes, bytearray, memoryview]:
+    # boto3 wraps Binary attributes read from DynamoDB in boto3.dynamodb.types.Binary
+    return getattr(value, 'value', value)
+
+
+def decode_vector(value: Any, dtype: str = 'float32') -> Sequence[float]:
+    """
+    Vector from a stored embedding_vector attribute
+
+    float32 on a little-endian host is a memoryview over the stored bytes
+    (no copy); float16 and big-endian hosts get a list. Legacy
+    List-of-Decimal items come back as a list of floats.
+    """
+    if isinstance(value, list):
+        return [float(x) for x in value]
+
+    raw = _raw_bytes(value)
+    if dtype == 'float32' and sys.byteorder == 'little':
+        return memoryview(raw).cast('B').cast('f')
+    code = STRUCT_FORMATS.get(dtype)
+    if not code:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    return list(struct.unpack(f"<{len(raw) // ITEM_SIZES[dtype]}{code}", raw))
+
+
+def decode_item(item: Dict[str, Any]) -> Sequence[float]:
+    """Vector of a `code_embeddings` item in either layout"""
+    return decode_vector(item['embedding_vector'], item.get('embedding_dtype', 'float32'))
+
+
+def vector_attributes(vector: Sequence[float], dtype: str = None) -> Dict[str, Any]:
+    """Item attributes holding an encoded vector"""
+    dtype = dtype or EMBEDDING_DTYPE
+    return {
+        'embedding_vector': encode_vector(vector, dtype),
+        'embedding_dtype': dtype,
+        'embedding_dimension': len(vector)
+    }
+
+
+def write_items(table, items: List[Dict[str, Any]], key_names: List[str] = None) -> int:
+    """
+    Batch-write items (BatchWriteItem, unprocessed items retried by boto3)
+
+    key_names de-duplicates items with the same key inside one batch, which
+    BatchWriteItem would otherwise reject.
+    """
+    if not items:
+        return 0
+    with table.batch_writer(overwrite_by_pkeys=key_names) as batch:
+        for item in items:
+            batch.put_item(Item=item)
+    return len(items)
+
+
+def existing_keys(table_name: str, key_name: str, values: List[str]) -> Set[str]:
+    """Which of these partition key values already have an item (BatchGetItem, keys only)"""
+    dynamodb = get_resource('dynamodb')
+    found = set()
+    values = list(dict.fromkeys(values))
+
+    for start in range(0, len(values), BATCH_GET_LIMIT):
+        request = {table_name: {
+            'Keys': [{key_name: value} for value in values[start:start + BATCH_GET_LIMIT]],
+            'ProjectionExpression': '#k',
+            'ExpressionAttributeNames': {'#k': key_name}
+        }}
+        for _ in range(BATCH_GET_ATTEMPTS):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            found.update(item[key_name] for item in response.get('Responses', {}).get(table_name, []))
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                break
+        if request:
+            print(f"⚠️  {len(request[table_name]['Keys'])} keys unchecked after {BATCH_GET_ATTEMPTS} attempts")
+
+    return found
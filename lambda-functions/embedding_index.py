@@ -0,0 +1,149 @@
+"""
+Writing snippet embeddings into `code_embeddings`
+
+An indexing job is {'review_id', 'issues', 'snippets'}. index_snippets()
+handles any number of jobs in one pass: snippet ids (content hash) are
+looked up with BatchGetItem, only texts without a stored vector are
+embedded (batched, optionally under a rate limiter), and every snippet gets
+a review_link item for its job's review. Re-running a job is harmless:
+stored vectors are reused and links are overwritten.
+
+EmbeddingGenerator runs a single job inline; EmbeddingConsumer runs a
+whole SQS batch of jobs at once.
+"""
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List
+from lambda_startup import get_table
+from embedding_batch import embed_texts, snippet_embedding_id
+from embedding_codec import EMBEDDING_DTYPE, existing_keys, vector_attributes, write_items
+from blob_cache import EMBEDDING_MODEL
+
+EMBEDDINGS_TABLE = os.environ.get('EMBEDDINGS_TABLE', 'code_embeddings')
+
+
+def vector_item(embedding_id, snippet, vector, review_id, timestamp):
+    """Stored vector for one distinct snippet text (vector packed as binary)"""
+    return {
+        'embedding_id': embedding_id,
+        'item_type': 'vector',
+        'timestamp': timestamp,
+        'review_id': review_id,
+        'embedding_model': EMBEDDING_MODEL,
+        'snippet_type': snippet['type'],
+        'snippet_name': snippet['name'],
+        'filename': snippet['filename'],
+        'context': snippet['context'],
+        **vector_attributes(vector)
+    }
+
+
+def review_link_item(embedding_id, snippet, review_id, timestamp, issues):
+    """Association of a stored vector with one review, plus that review's issue flags"""
+    snippet_name = snippet.get('name', '').lower()
+    vulnerability_type = 'none'
+    performance_issue = False
+
+    if 'query' in snippet_name and 'sql_injection' in issues['vulnerabilities']:
+        vulnerability_type = 'sql_injection'
+    elif 'search' in snippet_name and 'nested_loops' in issues['performance_issues']:
+        performance_issue = True
+
+    return {
+        'embedding_id': f"{embedding_id}#review#{review_id}",
+        'item_type': 'review_link',
+        'vector_id': embedding_id,
+        'timestamp': timestamp,
+        'review_id': review_id,
+        'snippet_type': snippet['type'],
+        'snippet_name': snippet['name'],
+        'filename': snippet['filename'],
+        'vulnerability_type': vulnerability_type,
+        'performance_issue': performance_issue,
+        'code_quality_issue': 'missing_documentation' in issues['quality_issues']
+    }
+
+
+def find_stored(embedding_ids):
+    """Embedding ids already in the table (none when the lookup fails)"""
+    try:
+        return existing_keys(EMBEDDINGS_TABLE, 'embedding_id', embedding_ids)
+    except Exception as e:
+        print(f"⚠️  Could not check stored embeddings: {str(e)}")
+        return set()
+
+
+def store_items(items):
+    """Store items in DynamoDB with batched writes (None when the write failed)"""
+    try:
+        # A batch can hold the same key twice (split or redelivered jobs); keep the last
+        return write_items(get_table(EMBEDDINGS_TABLE), items, key_names=['embedding_id'])
+    except Exception as e:
+        print(f"❌ Storage error: {str(e)}")
+        return None
+
+
+def index_snippets(genai, jobs: List[Dict[str, Any]], limiter=None) -> List[Dict[str, Any]]:
+    """
+    Embed and store the snippets of several jobs in one batched pass
+
+    Returns per-job stats (snippets, distinct, reused, embedded, links,
+    complete); a job is complete when every one of its snippets ended up
+    with a stored vector and a review link.
+    """
+    timestamp = datetime.utcnow().isoformat() + 'Z'
+
+    job_ids = []
+    first_by_id = {}
+    for job in jobs:
+        ids = {}
+        for snippet in job.get('snippets', []):
+            ids.setdefault(snippet_embedding_id(snippet['context']), snippet)
+        job_ids.append(ids)
+        for eid, snippet in ids.items():
+            first_by_id.setdefault(eid, (snippet, job['review_id']))
+
+    stored = find_stored(list(first_by_id))
+    missing = [(eid, snippet, review_id) for eid, (snippet, review_id) in first_by_id.items() if eid not in stored]
+
+    vectors = []
+    if missing:
+        vectors, embed_stats = embed_texts(genai, [snippet['context'] for _, snippet, _ in missing], limiter=limiter)
+        print(f"🔢 Embedded {embed_stats['embedded']} of {len(missing)} new snippets "
+              f"({embed_stats['cached']} cached, {embed_stats['failed']} failed) in {embed_stats['requests']} requests")
+    vector_items = [
+        vector_item(eid, snippet, vector, review_id, timestamp)
+        for (eid, snippet, review_id), vector in zip(missing, vectors) if vector
+    ]
+    available = stored | {item['embedding_id'] for item in vector_items}
+
+    # Parts of one review (or a redelivered job) share (snippet, review) links
+    link_items = {}
+    job_links = []
+    for job, ids in zip(jobs, job_ids):
+        links = [
+            review_link_item(eid, snippet, job['review_id'], timestamp, job['issues'])
+            for eid, snippet in ids.items() if eid in available
+        ]
+        for link in links:
+            link_items.setdefault(link['embedding_id'], link)
+        job_links.append(len(links))
+    link_items = list(link_items.values())
+
+    written = store_items(vector_items + link_items) is not None
+    print(f"✅ Stored {len(vector_items)} new vectors ({EMBEDDING_DTYPE}) and {len(link_items)} review links")
+
+    new_ids = {item['embedding_id'] for item in vector_items}
+    return [
+        {
+            'review_id': job['review_id'],
+            'snippets': len(job.get('snippets', [])),
+            'distinct': len(ids),
+            'reused': sum(1 for eid in ids if eid in stored),
+            'embedded': sum(1 for eid in ids if eid in new_ids) if written else 0,
+            'links': links if written else 0,
+            'complete': written and links == len(ids)
+        }
+        for job, ids, links in zip(jobs, job_ids, job_links)
+    ]
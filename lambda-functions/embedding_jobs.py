@@ -0,0 +1,74 @@
+"""
+Embedding jobs queued off the review's critical path
+
+With EMBEDDING_MODE=queue, EmbeddingGenerator only extracts snippets and
+enqueues indexing jobs ({'review_id', 'issues', 'snippets'}), so review
+latency no longer includes embedding calls and an indexing failure cannot
+fail the execution. EmbeddingConsumer drains the queue in batches under
+the shared embedding rate limit; jobs that fail are reported as batch item
+failures and retried, and after EMBEDDING_MAX_RECEIVES receives the queue's
+redrive policy moves them to the dead-letter queue.
+
+Backends:
+    sqs    - EMBEDDING_QUEUE_URL, with a redrive policy to a DLQ
+             (maxReceiveCount = EMBEDDING_MAX_RECEIVES)
+    local  - job_queue.LocalQueue with the same receive limit; failed jobs
+             end up in its dead_letters list
+"""
+
+import json
+import os
+from typing import Any, Dict, List
+from job_queue import LocalQueue, SQSQueue
+
+EMBEDDING_MODE = os.environ.get('EMBEDDING_MODE', 'inline').lower()
+EMBEDDING_QUEUE_BACKEND = os.environ.get('EMBEDDING_QUEUE_BACKEND', 'sqs').lower()
+EMBEDDING_QUEUE_URL = os.environ.get('EMBEDDING_QUEUE_URL', '')
+EMBEDDING_MAX_RECEIVES = int(os.environ.get('EMBEDDING_MAX_RECEIVES', '5'))
+
+# Shared model budget, split across consumer containers
+EMBED_REQUESTS_PER_MINUTE = float(os.environ.get('EMBED_REQUESTS_PER_MINUTE', '1000'))
+EMBEDDING_CONSUMER_CONCURRENCY = int(os.environ.get('EMBEDDING_CONSUMER_CONCURRENCY', '2'))
+
+# Keeps each message well under the 256 KB SQS limit
+JOB_MAX_BYTES = 200000
+
+_local_queue = LocalQueue(max_receives=EMBEDDING_MAX_RECEIVES)
+
+
+def build_jobs(review_id: str, snippets: List[Dict[str, Any]], issues: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    """Split a review's snippets into jobs that each fit in one queue message"""
+    jobs, current, size = [], [], 0
+    for snippet in snippets:
+        snippet_size = len(json.dumps(snippet).encode('utf-8'))
+        if current and size + snippet_size > JOB_MAX_BYTES:
+            jobs.append(current)
+            current, size = [], 0
+        current.append(snippet)
+        size += snippet_size
+    if current:
+        jobs.append(current)
+
+    return [
+        {'review_id': review_id, 'issues': issues, 'snippets': chunk, 'part': index, 'parts': len(jobs)}
+        for index, chunk in enumerate(jobs)
+    ]
+
+
+def get_embedding_queue():
+    """Queue backend selected by EMBEDDING_QUEUE_BACKEND"""
+    if EMBEDDING_QUEUE_BACKEND == 'local':
+        return _local_queue
+    if not EMBEDDING_QUEUE_URL:
+        raise ValueError("EMBEDDING_QUEUE_URL is not set")
+    return SQSQueue(EMBEDDING_QUEUE_URL)
+
+
+def enqueue_jobs(jobs: List[Dict[str, Any]]) -> List[str]:
+    """Send jobs; returns their message ids"""
+    queue = get_embedding_queue()
+    return [queue.send(job) for job in jobs]
+
+
+def receive_count(record: Dict[str, Any]) -> int:
+    return int(record.get('attributes', {}).get('ApproximateReceiveCount', '1'))
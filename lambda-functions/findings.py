@@ -0,0 +1,260 @@
+"""
+Cross-agent finding consolidation for the combined review
+
+Every agent reports structured findings (file, line range, severity, issue
+type): the static rule packs of the security and performance agents, and the
+model findings each agent's review returns through FINDINGS_OUTPUT_FORMAT.
+Model and static findings share one issue vocabulary (ISSUE_TYPES, which
+includes the static rule ids), so the same problem reported by two agents
+carries the same `rule`, e.g. a formatted SQL string inside a loop flagged
+by security and by performance as `sql-string-format`.
+
+dedupe_findings() merges findings of the same file whose line ranges overlap
+and that share a rule or a normalized issue text
+(incremental_review.normalize_issue); the merged finding keeps the highest
+severity and lists every agent that reported it.
+
+ReviewAggregator renders the merged list once, in place of the per-agent
+issue lists: agent sections keep only the model's summary, and the
+"Static Analysis Findings" blocks are stripped. Critical and high findings are always
+listed; medium and low ones are listed until FINDINGS_BUDGET_CHARS and the
+rest are collapsed into per-file counts.
+"""
+
+import io
+import json
+import os
+import re
+from typing import Any, Dict, List, Tuple
+from incremental_review import normalize_issue
+from static_security import SEVERITY_ORDER
+
+FINDINGS_BUDGET_CHARS = int(os.environ.get('FINDINGS_BUDGET_CHARS', '15000'))
+ALWAYS_LISTED = ('critical', 'high')
+
+SEVERITY_ICONS = {'critical': '🔴', 'high': '🟠', 'medium': '🟡', 'low': '🟢'}
+
+# Issue types shared by every agent (static rule ids included) so duplicates share a rule
+ISSUE_TYPES = {
+    'eval-exec': "eval/exec/compile on dynamic input",
+    'pickle-loads': "unpickling untrusted data",
+    'subprocess-shell': "shell command built from input",
+    'sql-string-format': "SQL built by string formatting (injection)",
+    'hardcoded-credential': "secret, password or key in source",
+    'yaml-unsafe-load': "yaml.load without a safe loader",
+    'path-traversal': "file path built from user input",
+    'insecure-crypto': "weak hashing, cipher or randomness",
+    'missing-auth': "missing authentication or authorization check",
+    'sensitive-data-exposure': "secrets or personal data logged or returned",
+    'nested-loop-same-iterable': "nested loops over the same data (quadratic)",
+    'list-membership-in-loop': "`in` on a list inside a loop",
+    'string-concat-in-loop': "string concatenation inside a loop",
+    'append-to-comprehension': "loop appending that should be a comprehension",
+    'io-in-loop': "I/O, network or database call inside a loop",
+    'inefficient-algorithm': "avoidable super-linear algorithm or data structure",
+    'redundant-computation': "work repeated that could be cached or hoisted",
+    'unbounded-memory': "whole input loaded or accumulated in memory",
+    'error-handling': "bare/broad except, swallowed or missing error handling",
+    'missing-docstring': "public function or class without a docstring",
+    'missing-type-hints': "public signature without type hints",
+    'naming': "names that break PEP 8 or hide intent",
+    'complexity': "function too long or deeply nested",
+    'duplicate-code': "repeated logic that should be shared",
+    'dead-code': "unused imports, variables or unreachable code",
+    'mutable-default-argument': "mutable default argument",
+    'other': "anything else",
+}
+
+FINDINGS_OUTPUT_FORMAT = """**Output format:**
+Respond with a single JSON object and nothing else:
+{"summary": "<markdown: overall assessment and prioritized recommendations; do not repeat the findings>",
+ "findings": [{"line": <first line>, "end_line": <last line>, "severity": "critical|high|medium|low",
+               "issue_type": "<issue type>", "title": "<one-line description>",
+               "detail": "<markdown: why it matters and the fix, with a short code example>"}]}
+
+Use the file's own line numbers. Pick issue_type from:
+""" + "\n".join(f"- `{name}`: {text}" for name, text in ISSUE_TYPES.items()) + "\n"
+
+# Ask the model for JSON directly (the prompt alone is the fallback contract)
+FINDINGS_GENERATION_CONFIG = {'response_mime_type': 'application/json'}
+
+# Per-file block the security and performance agents append to their reviews
+STATIC_SECTION = re.compile(r"\n\n### 🔎 Static Analysis Findings\n\n.*?(?=\n\n## File: |\Z)", re.DOTALL)
+
+
+class ReportWriter:
+    """Append-only markdown buffer that tracks its size"""
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self.size = 0
+
+    def write(self, text: str):
+        self._buffer.write(text)
+        self.size += len(text)
+
+    def getvalue(self) -> str:
+        return self._buffer.getvalue()
+
+
+def _model_finding(raw: Dict[str, Any], filename: str, agent: str) -> Dict[str, Any]:
+    line = int(raw['line'])
+    end_line = int(raw.get('end_line') or line)
+    severity = str(raw.get('severity', '')).lower()
+    issue_type = str(raw.get('issue_type', '')).lower()
+    return {
+        "file": filename,
+        "agent": agent,
+        "source": "model",
+        "rule": issue_type if issue_type in ISSUE_TYPES else 'other',
+        "severity": severity if severity in SEVERITY_ORDER else 'medium',
+        "line": line,
+        "end_line": max(line, end_line),
+        "message": str(raw.get('title') or ISSUE_TYPES.get(issue_type, 'Issue')),
+        "detail": str(raw.get('detail') or '')
+    }
+
+
+def parse_model_review(text: str, filename: str, agent: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Split a FINDINGS_OUTPUT_FORMAT response into summary and findings
+
+    Code fences around the JSON are tolerated and malformed findings (no line
+    number) are dropped. A response that is not JSON at all is kept as the
+    summary with no findings, so free-form reviews still render.
+
+    Returns:
+        (summary markdown, findings tagged with file, agent and source 'model')
+    """
+    body = text.strip()
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", body, re.DOTALL)
+    if fenced:
+        body = fenced.group(1)
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return text, []
+    if not isinstance(data, dict):
+        return text, []
+
+    findings = []
+    for raw in data.get('findings') or []:
+        try:
+            findings.append(_model_finding(raw, filename, agent))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+    return str(data.get('summary') or ''), findings
+
+
+def _rank(finding: Dict[str, Any]) -> int:
+    return SEVERITY_ORDER.get(finding.get('severity'), len(SEVERITY_ORDER))
+
+
+def _overlaps(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    return a['line'] <= b.get('end_line', b['line']) and b['line'] <= a.get('end_line', a['line'])
+
+
+def dedupe_findings(findings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge duplicate findings across agents
+
+    Two findings are duplicates when they are in the same file, their line
+    ranges overlap and they share the rule or the normalized message. Fixed
+    findings (incremental reviews) are left out.
+
+    Returns:
+        Merged findings ordered by severity, file and line, each with
+        `agents` and `duplicates` (number of findings folded into it)
+    """
+    merged = []
+    # (file, 'rule' | 'issue', value) -> merged findings with that identity
+    index = {}
+
+    for finding in sorted(findings, key=lambda f: (f.get('file', ''), f.get('line', 0))):
+        if finding.get('status') == 'fixed' or 'line' not in finding:
+            continue
+        keys = [(finding.get('file', ''), 'issue', normalize_issue(finding.get('message', '')))]
+        if finding.get('rule', 'other') != 'other':
+            keys.insert(0, (finding.get('file', ''), 'rule', finding['rule']))
+
+        target = next((m for key in keys for m in index.get(key, []) if _overlaps(m, finding)), None)
+        if target is None:
+            target = dict(finding, end_line=finding.get('end_line', finding['line']),
+                          agents=[finding['agent']] if finding.get('agent') else [], duplicates=0)
+            merged.append(target)
+        else:
+            if _rank(finding) < _rank(target):
+                target.update({k: finding[k] for k in ('severity', 'rule', 'message', 'cwe', 'detail') if k in finding})
+            elif finding.get('detail') and not target.get('detail'):
+                target['detail'] = finding['detail']
+            if finding.get('agent') and finding['agent'] not in target['agents']:
+                target['agents'].append(finding['agent'])
+            if finding.get('status') == 'new':
+                target['status'] = 'new'
+            target['line'] = min(target['line'], finding['line'])
+            target['end_line'] = max(target['end_line'], finding.get('end_line', finding['line']))
+            target['duplicates'] += 1
+
+        for key in keys:
+            bucket = index.setdefault(key, [])
+            if target not in bucket:
+                bucket.append(target)
+
+    return sorted(merged, key=lambda f: (_rank(f), f.get('file', ''), f['line']))
+
+
+def strip_static_sections(review: str) -> str:
+    """Agent review without its per-file static findings blocks (rendered once, merged)"""
+    return STATIC_SECTION.sub('', review)
+
+
+def _format_finding(finding: Dict[str, Any]) -> str:
+    span = f"L{finding['line']}" if finding['end_line'] == finding['line'] else f"L{finding['line']}-{finding['end_line']}"
+    agents = ', '.join(finding['agents'])
+    status = " 🆕" if finding.get('status') == 'new' else ""
+    text = (f"- {SEVERITY_ICONS.get(finding['severity'], '⚪')} `{finding.get('file')}` **{span}** "
+            f"`{finding.get('rule')}`: {finding.get('message')} _({agents})_{status}\n")
+    if finding.get('detail'):
+        # Indented under the list item so code blocks stay inside it
+        text += "\n" + "\n".join(f"  {line}" if line else "" for line in finding['detail'].strip().splitlines()) + "\n\n"
+    return text
+
+
+def write_findings_section(writer: ReportWriter, merged: List[Dict[str, Any]], budget: int = None) -> Dict[str, int]:
+    """
+    Render merged findings into the writer
+
+    Returns:
+        {'listed': n, 'collapsed': n}
+    """
+    budget = budget or FINDINGS_BUDGET_CHARS
+    if not merged:
+        return {'listed': 0, 'collapsed': 0}
+
+    folded = sum(f['duplicates'] for f in merged)
+    writer.write(f"## 🧭 Consolidated Findings\n\n{len(merged)} findings"
+                 + (f" ({folded} duplicates merged)" if folded else "") + "\n\n")
+
+    start = writer.size
+    collapsed = {}
+    listed = 0
+    for finding in merged:
+        line = _format_finding(finding)
+        if finding['severity'] not in ALWAYS_LISTED and writer.size - start + len(line) > budget:
+            counts = collapsed.setdefault(finding.get('file'), {})
+            counts[finding['severity']] = counts.get(finding['severity'], 0) + 1
+            continue
+        writer.write(line)
+        listed += 1
+
+    hidden = sum(sum(counts.values()) for counts in collapsed.values())
+    if collapsed:
+        writer.write(f"\n<details><summary>{hidden} more lower-severity findings</summary>\n\n")
+        for filename, counts in sorted(collapsed.items()):
+            summary = ', '.join(f"{count} {severity}" for severity, count
+                                in sorted(counts.items(), key=lambda item: SEVERITY_ORDER.get(item[0], 9)))
+            writer.write(f"- `{filename}`: {summary}\n")
+        writer.write("\n</details>\n")
+
+    writer.write("\n---\n\n")
+    return {'listed': listed, 'collapsed': hidden}
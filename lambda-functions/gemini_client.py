@@ -0,0 +1,247 @@
+"""
+Lightweight REST client for the Gemini API
+
+Drop-in alternative to the subset of google.generativeai used by the agents
+and the embedding generator (configure, GenerativeModel.generate_content,
+embed_content). Talks to the public REST endpoints over a pooled urllib3
+connection, so the Lambda layer no longer needs grpcio/protobuf on the hot path.
+
+Select it with GEMINI_CLIENT=rest (default: sdk).
+
+Calls made through request_policy.call_with_policy are sent without urllib3
+retries; the policy retries them (with jitter and hedging) instead.
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import urllib3
+from request_policy import policy_active
+
+API_BASE = os.environ.get('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com/v1beta')
+DEFAULT_TIMEOUT_SECONDS = float(os.environ.get('GEMINI_TIMEOUT_SECONDS', '60'))
+CONNECT_TIMEOUT_SECONDS = float(os.environ.get('GEMINI_CONNECT_TIMEOUT_SECONDS', '5'))
+MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', '3'))
+BATCH_EMBED_LIMIT = 100  # batchEmbedContents accepts at most 100 requests
+
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# Pool created OUTSIDE handler for connection reuse
+http = urllib3.PoolManager(maxsize=10)
+
+_api_key = None
+
+
+class GeminiAPIError(Exception):
+    """Raised when the Gemini REST API returns a non-200 response"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Gemini API error {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def configure(api_key: str = None):
+    """Set the API key used for every request (mirrors genai.configure)"""
+    global _api_key
+    _api_key = api_key
+
+
+def _retry_policy() -> Union[urllib3.Retry, bool]:
+    if policy_active():
+        return False
+    return urllib3.Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=RETRYABLE_STATUSES,
+        allowed_methods=None,  # generateContent/embedContent are POSTs but safe to repeat
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+
+
+def _request(path: str, body: Dict[str, Any] = None, timeout: float = None, stream: bool = False,
+             method: str = 'POST'):
+    """Send a JSON request to the Gemini API and return the raw urllib3 response"""
+    if not _api_key:
+        raise GeminiAPIError(401, "API key not configured - call configure(api_key=...) first")
+
+    response = http.request(
+        method,
+        f"{API_BASE}/{path}",
+        body=json.dumps(body).encode('utf-8') if body is not None else None,
+        headers={
+            'Content-Type': 'application/json',
+            'x-goog-api-key': _api_key
+        },
+        timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT_SECONDS, read=timeout or DEFAULT_TIMEOUT_SECONDS),
+        retries=_retry_policy(),
+        preload_content=not stream
+    )
+
+    if response.status != 200:
+        message = response.data.decode('utf-8', errors='replace')
+        response.release_conn()
+        raise GeminiAPIError(response.status, message)
+
+    return response
+
+
+def _post_json(path: str, body: Dict[str, Any], timeout: float = None) -> Dict[str, Any]:
+    response = _request(path, body, timeout=timeout)
+    return json.loads(response.data.decode('utf-8'))
+
+
+def _model_path(model: str) -> str:
+    return model if model.startswith('models/') else f"models/{model}"
+
+
+def _to_contents(contents: Union[str, List[str], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Normalize prompt input into the REST `contents` structure"""
+    if isinstance(contents, str):
+        return [{"role": "user", "parts": [{"text": contents}]}]
+    if contents and isinstance(contents[0], dict):
+        return contents
+    return [{"role": "user", "parts": [{"text": part} for part in contents]}]
+
+
+def _timeout_from(request_options: Optional[Dict[str, Any]]) -> Optional[float]:
+    return (request_options or {}).get('timeout')
+
+
+class GenerateContentResponse:
+    """Minimal response wrapper exposing `.text` like the SDK"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.candidates = data.get('candidates', [])
+        self.usage_metadata = data.get('usageMetadata', {})
+        self.prompt_feedback = data.get('promptFeedback', {})
+
+    @property
+    def text(self) -> str:
+        if not self.candidates:
+            reason = self.prompt_feedback.get('blockReason', 'no candidates returned')
+            raise ValueError(f"Response has no text: {reason}")
+        parts = self.candidates[0].get('content', {}).get('parts', [])
+        return "".join(part.get('text', '') for part in parts)
+
+
+class GenerativeModel:
+    """REST equivalent of genai.GenerativeModel"""
+
+    def __init__(self, model_name: str = 'gemini-2.5-flash', generation_config: Dict[str, Any] = None,
+                 system_instruction: str = None, cached_content: str = None):
+        self.model_name = _model_path(model_name)
+        self.generation_config = generation_config
+        self.system_instruction = system_instruction
+        self.cached_content = cached_content
+
+    def _body(self, contents) -> Dict[str, Any]:
+        body = {"contents": _to_contents(contents)}
+        if self.cached_content:
+            body["cachedContent"] = self.cached_content
+        if self.generation_config:
+            body["generationConfig"] = self.generation_config
+        if self.system_instruction:
+            body["systemInstruction"] = {"parts": [{"text": self.system_instruction}]}
+        return body
+
+    def generate_content(self, contents, stream: bool = False, request_options: Dict[str, Any] = None):
+        """Generate a response; with stream=True returns an iterator of partial responses"""
+        timeout = _timeout_from(request_options)
+
+        if stream:
+            return self._stream(contents, timeout)
+
+        data = _post_json(f"{self.model_name}:generateContent", self._body(contents), timeout=timeout)
+        return GenerateContentResponse(data)
+
+    def _stream(self, contents, timeout: float = None) -> Iterator[GenerateContentResponse]:
+        response = _request(
+            f"{self.model_name}:streamGenerateContent?alt=sse",
+            self._body(contents),
+            timeout=timeout,
+            stream=True
+        )
+        try:
+            buffer = b""
+            for chunk in response.stream(4096):
+                buffer += chunk
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    line = line.strip()
+                    if line.startswith(b"data:"):
+                        yield GenerateContentResponse(json.loads(line[5:]))
+            if buffer.strip().startswith(b"data:"):
+                yield GenerateContentResponse(json.loads(buffer.strip()[5:]))
+        finally:
+            response.release_conn()
+
+
+def create_cached_content(model: str, contents, ttl_seconds: int, display_name: str = None,
+                          system_instruction: str = None) -> Dict[str, Any]:
+    """Upload a reusable prompt prefix (cachedContents) and return its resource"""
+    body = {
+        "model": _model_path(model),
+        "contents": _to_contents(contents),
+        "ttl": f"{int(ttl_seconds)}s"
+    }
+    if display_name:
+        body["displayName"] = display_name[:128]
+    if system_instruction:
+        body["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+    return _post_json("cachedContents", body)
+
+
+def delete_cached_content(name: str):
+    """Delete a cachedContents resource before its TTL runs out"""
+    response = _request(name, method='DELETE')
+    response.release_conn()
+
+
+def embed_content(model: str, content: Union[str, List[str]], task_type: str = None,
+                  title: str = None, request_options: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Embed a single text (embedContent) or a list of texts (batchEmbedContents)
+
+    Mirrors genai.embed_content: returns {'embedding': vector} for a string
+    and {'embedding': [vector, ...]} for a list.
+    """
+    timeout = _timeout_from(request_options)
+
+    if isinstance(content, str):
+        body = _embed_request(model, content, task_type, title)
+        data = _post_json(f"{_model_path(model)}:embedContent", body, timeout=timeout)
+        return {'embedding': data['embedding']['values']}
+
+    return {'embedding': batch_embed_contents(model, content, task_type=task_type, timeout=timeout)}
+
+
+def batch_embed_contents(model: str, texts: List[str], task_type: str = None,
+                         timeout: float = None) -> List[List[float]]:
+    """Embed many texts, splitting into requests of at most BATCH_EMBED_LIMIT"""
+    vectors = []
+
+    for start in range(0, len(texts), BATCH_EMBED_LIMIT):
+        chunk = texts[start:start + BATCH_EMBED_LIMIT]
+        body = {"requests": [_embed_request(model, text, task_type) for text in chunk]}
+        data = _post_json(f"{_model_path(model)}:batchEmbedContents", body, timeout=timeout)
+        vectors.extend(item['values'] for item in data['embeddings'])
+
+    return vectors
+
+
+def _embed_request(model: str, text: str, task_type: str = None, title: str = None) -> Dict[str, Any]:
+    request = {
+        "model": _model_path(model),
+        "content": {"parts": [{"text": text}]}
+    }
+    if task_type:
+        request["taskType"] = task_type.upper()
+    if title:
+        request["title"] = title
+    return request
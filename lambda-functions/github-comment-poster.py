@@ -1,9 +1,9 @@
 import json
-import boto3
 import urllib3
+from lambda_startup import get_client, log_startup, pre_init
+from review_coalescing import check_superseded
+from review_store import ReviewBody
 
-# Initialize clients
-secretsmanager = boto3.client('secretsmanager', region_name='ap-south-2')
 http = urllib3.PoolManager()
 
 # Cache for GitHub token
@@ -17,6 +17,7 @@ def get_github_token():
         return _github_token
     
     try:
+        secretsmanager = get_client('secretsmanager', region_name='ap-south-2')
         response = secretsmanager.get_secret_value(SecretId='CodeReview/GitHubToken')
         secret_dict = json.loads(response['SecretString'])
         _github_token = secret_dict.get('GITHUB_TOKEN')
@@ -32,15 +33,21 @@ def lambda_handler(event, context):
     print("=" * 60)
     print("💬 GITHUB COMMENT POSTER")
     print("=" * 60)
+    log_startup("GitHubCommentPoster")
+    
+    # A newer push to the PR makes this execution stale
+    superseded = check_superseded(event, "GitHubCommentPoster")
+    if superseded:
+        return superseded
     
     try:
         # Get aggregated review
         aggregation_result = event.get('aggregation_result', {})
-        aggregated_review = aggregation_result.get('combined_review', '')
+        review_body = ReviewBody.from_item(aggregation_result)
         pr_number = event.get('pr_number')
         repo_name = event.get('repo_name')
         
-        if not all([aggregated_review, pr_number, repo_name]):
+        if not all([review_body, pr_number, repo_name]):
             return {
                 "statusCode": 400,
                 "error": True,
@@ -52,6 +59,9 @@ def lambda_handler(event, context):
         # Get GitHub token
         token = get_github_token()
         
+        # Stored bodies are downloaded only now, after validation and the token lookup
+        aggregated_review = review_body.text
+        
         # Prepare comment body
         comment_body = f"""## 🤖 AI Code Review
 
@@ -116,4 +126,7 @@ def lambda_handler(event, context):
             "statusCode": 500,
             "error": True,
             "message": str(e)
-        }
\ No newline at end of file
+        }
+
+
+pre_init(get_github_token, lambda: get_client('s3'))
@@ -1,12 +1,16 @@
 import json
 import hmac
 import hashlib
-import boto3
-from datetime import datetime
+import os
+from lambda_startup import get_client, log_startup, pre_init
+from review_coalescing import WEBHOOK_DEDUP, claim_delivery, release_events
+from job_queue import INGESTION_MODE, build_job, get_queue, start_review
 
-# Initialize clients
-secretsmanager = boto3.client('secretsmanager', region_name='ap-south-2')
-stepfunctions = boto3.client('stepfunctions', region_name='ap-south-2')
+REGION = 'ap-south-2'
+
+# Speculative pre-analysis of feature-branch pushes (see push-prewarmer.py)
+PUSH_PREWARM = os.environ.get('PUSH_PREWARM', 'false').lower() == 'true'
+PREWARM_FUNCTION = os.environ.get('PREWARM_FUNCTION', 'PushPrewarmer')
 
 # Cache for webhook secret
 _webhook_secret = None
@@ -19,6 +23,7 @@ def get_webhook_secret():
         return _webhook_secret
     
     try:
+        secretsmanager = get_client('secretsmanager', region_name=REGION)
         response = secretsmanager.get_secret_value(SecretId='CodeReview/GitHubWebhookSecret')
         secret_dict = json.loads(response['SecretString'])
         _webhook_secret = secret_dict.get('GITHUB_WEBHOOK_SECRET')
@@ -47,12 +52,54 @@ def verify_signature(payload_body, signature_header):
     # Constant-time comparison
     return hmac.compare_digest(expected_signature, signature_header)
 
+def handle_push(payload):
+    """Hand Python files pushed to a feature branch to PushPrewarmer (async, fire-and-forget)"""
+    ref = payload.get('ref', '')
+    repository = payload.get('repository', {})
+    branch = ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else None
+    
+    if not PUSH_PREWARM or not branch or branch == repository.get('default_branch') or payload.get('deleted'):
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'Push ignored'})
+        }
+    
+    paths = sorted({
+        path
+        for commit in payload.get('commits', [])
+        for path in commit.get('added', []) + commit.get('modified', [])
+        if path.endswith('.py')
+    })
+    if not paths:
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'No Python files pushed'})
+        }
+    
+    get_client('lambda', region_name=REGION).invoke(
+        FunctionName=PREWARM_FUNCTION,
+        InvocationType='Event',
+        Payload=json.dumps({
+            'repo_name': repository.get('full_name'),
+            'branch': branch,
+            'head_sha': payload.get('after'),
+            'paths': paths
+        }).encode('utf-8')
+    )
+    print(f"🔥 Prewarming {len(paths)} files from {repository.get('full_name')}@{branch}")
+    
+    return {
+        'statusCode': 202,
+        'body': json.dumps({'message': 'Prewarm queued', 'files': len(paths)})
+    }
+
 def lambda_handler(event, context):
     """Handle GitHub webhook events"""
     
     print("=" * 60)
     print("🪝 GITHUB WEBHOOK HANDLER")
     print("=" * 60)
+    log_startup("GithubWebhookHandler")
     
     try:
         # Get signature from headers
@@ -108,33 +155,81 @@ def lambda_handler(event, context):
                     'body': json.dumps({'message': f'Skipped action: {action}'})
                 }
             
-            # Start Step Functions workflow
-            state_machine_arn = 'arn:aws:states:ap-south-2:943598056428:stateMachine:CodeReviewOrchestrator'
+            delivery_id = headers.get('x-github-delivery') or headers.get('X-GitHub-Delivery')
+            job = build_job(payload, action, delivery_id)
+            head_sha = job['head_sha']
             
-            execution_input = {
-                'pr_number': pr_number,
-                'repo_name': repo_name,
-                'action': action,
-                'payload': payload
-            }
+            # Idempotency: redeliveries and already-reviewed heads start nothing
+            claimed_keys = []
+            if WEBHOOK_DEDUP:
+                duplicate, claimed_keys = claim_delivery(
+                    delivery_id, repo_name, pr_number, head_sha,
+                    check_head=action != 'reopened'
+                )
+                if duplicate:
+                    print(f"♻️  Duplicate {duplicate} ({delivery_id if duplicate == 'delivery' else head_sha[:7]}), not starting a review")
+                    return {
+                        'statusCode': 200,
+                        'body': json.dumps({
+                            'message': f'Duplicate {duplicate}, review already started',
+                            'pr_number': pr_number,
+                            'head_sha': head_sha
+                        })
+                    }
+            
+            try:
+                # Queue mode: acknowledge now, ReviewDispatcher starts the execution
+                if INGESTION_MODE == 'queue':
+                    message_id = get_queue().send(job)
+                    print(f"📬 Queued review job: {message_id}")
+                    return {
+                        'statusCode': 202,
+                        'body': json.dumps({
+                            'message': 'Code review queued',
+                            'pr_number': pr_number,
+                            'job_id': message_id
+                        })
+                    }
+                
+                result = start_review(job)
+            except Exception:
+                # Let GitHub's redelivery retry this event
+                release_events(claimed_keys)
+                raise
             
-            response = stepfunctions.start_execution(
-                stateMachineArn=state_machine_arn,
-                name=f"pr-{pr_number}-{datetime.now().strftime('%Y%m%d-%H%M%S')}",
-                input=json.dumps(execution_input)
-            )
+            if result['status'] == 'skipped':
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({
+                        'message': 'No reviewable files, review skipped',
+                        'pr_number': pr_number,
+                        'reason': result['reason']
+                    })
+                }
             
-            print(f"🚀 Started Step Functions execution: {response['executionArn']}")
+            if result['status'] == 'coalesced':
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({
+                        'message': 'Review already in progress for this head',
+                        'pr_number': pr_number,
+                        'head_sha': head_sha
+                    })
+                }
             
             return {
                 'statusCode': 200,
                 'body': json.dumps({
                     'message': 'Code review started',
                     'pr_number': pr_number,
-                    'execution_arn': response['executionArn']
+                    'execution_arn': result['execution_arn']
                 })
             }
         
+        # Feature-branch pushes warm the blob cache before a PR exists
+        if event_type == 'push':
+            return handle_push(payload)
+        
         # Unknown event type
         print(f"⚠️  Unknown event type: {event_type}")
         return {
@@ -153,4 +248,10 @@ def lambda_handler(event, context):
                 'error': 'Internal error',
                 'message': str(e)
             })
-        }
\ No newline at end of file
+        }
+
+
+pre_init(
+    get_webhook_secret,
+    lambda: get_client('sqs' if INGESTION_MODE == 'queue' else 'stepfunctions', region_name=REGION)
+)
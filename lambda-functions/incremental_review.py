@@ -0,0 +1,181 @@
+"""
+Incremental re-review for `synchronize` events
+
+The previous review of a PR stores per-file results (blob SHA, per-agent
+review text, structured findings) in S3. On the next push:
+    - CodeDownloader compares blob SHAs and only downloads changed files;
+      unchanged files are marked `carried_forward`,
+    - the agents skip carried-forward files,
+    - ReviewAggregator carries their previous reviews forward and marks every
+      finding as new, fixed or still open.
+
+A file whose review failed for any agent is stored without its blob SHA,
+so the next push reviews it again instead of carrying the error forward.
+
+Statuses cover the structured findings (the static rules' line-anchored
+results). Model review text has no stable finding identity, so it is carried
+forward or replaced per file rather than diffed.
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from lambda_startup import get_client
+from agent_results import is_error_review
+from review_store import latest_review
+
+INCREMENTAL_REVIEW = os.environ.get('INCREMENTAL_REVIEW', 'false').lower() == 'true'
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
+
+AGENTS = ('security', 'performance', 'best_practices')
+
+
+def file_results_key(repo_name: str, pr_number: int, review_id: str) -> str:
+    return f"reviews/{repo_name}/pr-{pr_number}/{review_id}/files.json"
+
+
+def load_previous_review(repo_name: str, pr_number: int) -> Optional[Dict[str, Any]]:
+    """Latest stored review of the PR that has per-file results, or None"""
+    # One query on the (repo_name, review_key) range of this PR, newest first
+    return latest_review(repo_name, pr_number, require='file_results_key', use_cache=False)
+
+
+def load_file_results(s3_key: str) -> Dict[str, Any]:
+    """Per-file results of a previous review ({} when missing)"""
+    try:
+        response = get_client('s3').get_object(Bucket=BUCKET_NAME, Key=s3_key)
+        return json.loads(response['Body'].read())
+    except Exception as e:
+        print(f"⚠️  Could not load previous file results {s3_key}: {str(e)}")
+        return {}
+
+
+def store_file_results(s3_key: str, file_results: Dict[str, Any]):
+    get_client('s3').put_object(
+        Bucket=BUCKET_NAME,
+        Key=s3_key,
+        Body=json.dumps(file_results).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+def plan_incremental(files: List[Dict[str, Any]], previous_results: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Split the PR's current files by comparing blob SHAs with the previous review
+
+    Args:
+        files: GitHub PR file entries ({'filename', 'sha', ...}) still in the PR
+        previous_results: {filename: {'sha', ...}} from the previous review
+    """
+    changed, unchanged = [], []
+    for file_info in files:
+        filename = file_info.get('filename')
+        previous = previous_results.get(filename)
+        # Results stored before failed reviews were left out may still hold an error
+        failed = any(is_error_review(text) for text in (previous or {}).get('reviews', {}).values())
+        if previous and previous.get('sha') and previous['sha'] == file_info.get('sha') and not failed:
+            unchanged.append(filename)
+        else:
+            changed.append(filename)
+
+    current = {f.get('filename') for f in files}
+    removed = [name for name in previous_results if name not in current]
+    return {"changed": changed, "unchanged": unchanged, "removed": removed}
+
+
+def normalize_issue(text: str) -> str:
+    """Line-number-free, whitespace/case-insensitive issue text"""
+    text = re.sub(r'\bL?\d+(-\d+)?\b', '', text.lower())
+    return re.sub(r'[^a-z0-9]+', ' ', text).strip()
+
+
+def finding_key(finding: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Identity of a finding across pushes (lines shift, so they are not part of it)"""
+    return (finding.get('file', ''), finding.get('rule', ''), normalize_issue(finding.get('message', '')))
+
+
+def merge_findings(current: List[Dict[str, Any]], previous_results: Dict[str, Any],
+                   plan: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    """
+    Mark findings as new / still_open / fixed against the previous review
+
+    Findings of unchanged files are carried forward as still_open; findings of
+    changed files that no longer appear, or of removed files, become fixed.
+    """
+    merged = []
+    reviewed = set(plan['changed'])
+
+    previous_by_file = {name: result.get('findings', []) for name, result in previous_results.items()}
+    previous_keys = {finding_key(f) for name in reviewed for f in previous_by_file.get(name, [])}
+    current_keys = set()
+
+    for finding in current:
+        key = finding_key(finding)
+        current_keys.add(key)
+        merged.append(dict(finding, status='still_open' if key in previous_keys else 'new'))
+
+    for name in plan['unchanged']:
+        merged.extend(dict(f, status='still_open', carried_forward=True) for f in previous_by_file.get(name, []))
+
+    for name in list(reviewed) + plan['removed']:
+        for finding in previous_by_file.get(name, []):
+            if finding_key(finding) not in current_keys:
+                merged.append(dict(finding, status='fixed'))
+
+    return merged
+
+
+def status_counts(findings: List[Dict[str, Any]]) -> Dict[str, int]:
+    counts = {"new": 0, "still_open": 0, "fixed": 0}
+    for finding in findings:
+        status = finding.get('status')
+        if status in counts:
+            counts[status] += 1
+    return counts
+
+
+def build_file_results(uploaded_files: List[Dict[str, Any]], agent_results: Dict[str, Dict[str, Any]],
+                       findings: List[Dict[str, Any]], previous_results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Per-file results to store for the next incremental review
+
+    Reviewed files take this run's reviews; carried-forward files keep the
+    previous entry. Fixed findings are dropped. Error reviews are not stored,
+    and a file with an error or a missing agent review gets no `sha`, so it
+    is re-reviewed on the next push.
+    """
+    open_findings = {}
+    for finding in findings:
+        if finding.get('status') != 'fixed':
+            clean = {k: v for k, v in finding.items() if k not in ('status', 'carried_forward')}
+            open_findings.setdefault(finding.get('file'), []).append(clean)
+
+    file_results = {}
+    for file_info in uploaded_files:
+        filename = file_info.get('filename')
+        if file_info.get('carried_forward') and filename in previous_results:
+            reviews = previous_results[filename].get('reviews', {})
+            complete = True
+        else:
+            reviews = {
+                agent: next((r['review'] for r in result.get('file_reviews', []) if r['file'] == filename), None)
+                for agent, result in agent_results.items()
+            }
+            complete = all(text and not is_error_review(text) for text in reviews.values())
+        file_results[filename] = {
+            "sha": file_info.get('sha') if complete else None,
+            "reviews": {agent: text for agent, text in reviews.items() if text and not is_error_review(text)},
+            "findings": open_findings.get(filename, [])
+        }
+    return file_results
+
+
+def carried_forward_reviews(agent: str, plan: Dict[str, List[str]], previous_results: Dict[str, Any]) -> str:
+    """Markdown for an agent's previous reviews of files unchanged since then"""
+    sections = []
+    for filename in plan.get('unchanged', []):
+        review = previous_results.get(filename, {}).get('reviews', {}).get(agent)
+        if review:
+            sections.append(f"## File: {filename} (unchanged since last review)\n\n{review}")
+    return "\n\n".join(sections)
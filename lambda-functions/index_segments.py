@@ -0,0 +1,52 @@
+"""
+Compact embedding index segments
+
+Bulk loads (tools/backfill.py) write vectors as immutable segments instead
+of one `code_embeddings` item each:
+
+    <prefix>/segment-00000.vec     vectors, packed little-endian (embedding_codec)
+    <prefix>/segment-00000.jsonl   one metadata record per vector, same order
+    <prefix>/segment-00000.json    manifest: count, dimension, dtype, model
+
+The manifest is written last, so a segment without one is incomplete and
+ignored by readers. Prefixes are local directories or s3://bucket/prefix
+(object_store).
+"""
+
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+from embedding_codec import EMBEDDING_DTYPE, ITEM_SIZES, decode_vector, encode_vector
+from object_store import read_object, write_object
+
+
+def segment_name(index: int) -> str:
+    return f"segment-{index:05d}"
+
+
+def write_segment(prefix: str, index: int, records: List[Dict[str, Any]], vectors: List[Sequence[float]],
+                  model: str, dtype: str = None) -> Dict[str, Any]:
+    """Write one segment (vectors + metadata, then the manifest); returns the manifest"""
+    dtype = dtype or EMBEDDING_DTYPE
+    if len(records) != len(vectors):
+        raise ValueError(f"{len(records)} records but {len(vectors)} vectors")
+
+    dimension = len(vectors[0]) if vectors else 0
+    name = segment_name(index)
+    write_object(prefix, f"{name}.vec", b''.join(encode_vector(vector, dtype) for vector in vectors))
+    write_object(prefix, f"{name}.jsonl", ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8'))
+
+    manifest = {'segment': index, 'count': len(records), 'dimension': dimension, 'dtype': dtype, 'model': model}
+    write_object(prefix, f"{name}.json", json.dumps(manifest).encode('utf-8'))
+    return manifest
+
+
+def read_segment(prefix: str, index: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[Sequence[float]]]:
+    """(manifest, records, vectors); float32 vectors are views over one buffer"""
+    name = segment_name(index)
+    manifest = json.loads(read_object(prefix, f"{name}.json"))
+    records = [json.loads(line) for line in read_object(prefix, f"{name}.jsonl").decode('utf-8').splitlines() if line]
+    data = memoryview(read_object(prefix, f"{name}.vec"))
+
+    stride = manifest['dimension'] * ITEM_SIZES[manifest['dtype']]
+    vectors = [decode_vector(data[i * stride:(i + 1) * stride], manifest['dtype']) for i in range(manifest['count'])]
+    return manifest, records, vectors
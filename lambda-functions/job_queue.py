@@ -0,0 +1,236 @@
+"""
+Review job queue between the webhook handler and the state machine
+
+With INGESTION_MODE=queue the webhook handler only verifies the delivery,
+enqueues a compact job and answers GitHub. ReviewDispatcher consumes the
+queue and starts executions under a global concurrency cap; jobs it cannot
+start yet are sent back to the queue as new messages with DelaySeconds
+(backpressure), so waiting under load never counts toward the redrive
+policy's maxReceiveCount; only jobs that fail to start are reported as
+batch item failures.
+
+Backends:
+    sqs    - REVIEW_QUEUE_URL (production)
+    local  - in-process queue with SQS-shaped batches (tests, local runs)
+"""
+
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List
+from lambda_startup import get_client
+from review_coalescing import (COALESCE_WINDOW_SECONDS, REVIEW_COALESCING, claim_head, execution_running,
+                               record_execution, release_head, stop_superseded)
+from review_filter import REVIEW_FILTER, prefilter
+
+INGESTION_MODE = os.environ.get('INGESTION_MODE', 'direct').lower()
+QUEUE_BACKEND = os.environ.get('REVIEW_QUEUE_BACKEND', 'sqs').lower()
+REVIEW_QUEUE_URL = os.environ.get('REVIEW_QUEUE_URL', '')
+# Delay before a deferred job is offered again (SQS allows up to 900)
+DEFER_DELAY_SECONDS = int(os.environ.get('DEFER_DELAY_SECONDS', '30'))
+STATE_MACHINE_ARN = os.environ.get(
+    'STATE_MACHINE_ARN',
+    'arn:aws:states:ap-south-2:943598056428:stateMachine:CodeReviewOrchestrator'
+)
+REGION = 'ap-south-2'
+
+
+def build_job(payload: Dict[str, Any], action: str, delivery_id: str = None) -> Dict[str, Any]:
+    """Compact review job: only the PR fields the pipeline reads"""
+    pull_request = payload['pull_request']
+    return {
+        'repo_name': payload['repository']['full_name'],
+        'pr_number': pull_request['number'],
+        'action': action,
+        'head_sha': pull_request.get('head', {}).get('sha', ''),
+        'delivery_id': delivery_id,
+        'changed_files': pull_request.get('changed_files', 0),
+        'pr_url': pull_request.get('url'),
+        'received_at': time.time()
+    }
+
+
+def execution_input(job: Dict[str, Any], debounce_seconds: int = 0) -> Dict[str, Any]:
+    """State machine input for a job (payload keeps the shape CodeDownloader reads)"""
+    return {
+        'pr_number': job['pr_number'],
+        'repo_name': job['repo_name'],
+        'action': job['action'],
+        'head_sha': job['head_sha'],
+        'debounce_seconds': debounce_seconds,
+        'payload': {
+            'pull_request': {
+                'url': job['pr_url'],
+                'number': job['pr_number'],
+                'head': {'sha': job['head_sha']},
+                'changed_files': job.get('changed_files', 0)
+            },
+            'repository': {'full_name': job['repo_name']}
+        }
+    }
+
+
+def execution_name(job: Dict[str, Any]) -> str:
+    """Execution name carrying the tenant (repo owner) so running reviews can be counted per tenant"""
+    tenant = re.sub(r'[^A-Za-z0-9_-]', '_', job['repo_name'].split('/', 1)[0])[:39]
+    head = job['head_sha'][:7] or 'head'
+    return f"{tenant}--pr-{job['pr_number']}-{head}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+
+def start_review(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Start the state machine for a job, coalescing pushes to the same PR
+
+    Returns:
+        {'status': 'started', 'execution_arn'}, {'status': 'coalesced'} or
+        {'status': 'skipped', 'reason'} when nothing in the PR is reviewable
+    """
+    repo_name, pr_number, head_sha = job['repo_name'], job['pr_number'], job['head_sha']
+
+    # Docs/config-only PRs never reach the state machine
+    if REVIEW_FILTER:
+        decision = prefilter(job)
+        if not decision['review']:
+            print(f"⏭️  Nothing to review in PR #{pr_number}: {decision['reason']}")
+            return {'status': 'skipped', 'reason': decision['reason']}
+
+    # Coalesce pushes: one review per PR head, older heads are cancelled
+    debounce_seconds = 0
+    if REVIEW_COALESCING and head_sha:
+        claimed, previous = claim_head(repo_name, pr_number, head_sha)
+        if not claimed:
+            print(f"🔁 Head {head_sha[:7]} is already being reviewed, coalescing")
+            return {'status': 'coalesced'}
+        previous_arn = previous.get('execution_arn')
+        if previous_arn and previous.get('head_sha') != head_sha:
+            stop_superseded(previous_arn, f"Superseded by head {head_sha}")
+        elif previous_arn and execution_running(previous_arn):
+            # Same head after the window: keep the review that is still running
+            if not record_execution(repo_name, pr_number, head_sha, previous_arn):
+                stop_superseded(previous_arn, "Superseded by a newer head")
+            print(f"🔁 Head {head_sha[:7]} is still being reviewed, coalescing")
+            return {'status': 'coalesced'}
+        debounce_seconds = COALESCE_WINDOW_SECONDS
+
+    stepfunctions = get_client('stepfunctions', region_name=REGION)
+    try:
+        response = stepfunctions.start_execution(
+            stateMachineArn=STATE_MACHINE_ARN,
+            name=execution_name(job),
+            input=json.dumps(execution_input(job, debounce_seconds))
+        )
+    except Exception:
+        if REVIEW_COALESCING and head_sha:
+            release_head(repo_name, pr_number, head_sha)
+        raise
+    print(f"🚀 Started Step Functions execution: {response['executionArn']}")
+
+    # A newer push may have claimed the PR while this execution was starting
+    if REVIEW_COALESCING and head_sha and not record_execution(repo_name, pr_number, head_sha, response['executionArn']):
+        stop_superseded(response['executionArn'], "Superseded by a newer head")
+
+    return {'status': 'started', 'execution_arn': response['executionArn']}
+
+
+def running_by_tenant() -> Dict[str, int]:
+    """Running executions of the review state machine per tenant ('' for unnamed)"""
+    stepfunctions = get_client('stepfunctions', region_name=REGION)
+    running = {}
+    kwargs = {'stateMachineArn': STATE_MACHINE_ARN, 'statusFilter': 'RUNNING', 'maxResults': 1000}
+
+    while True:
+        response = stepfunctions.list_executions(**kwargs)
+        for execution in response.get('executions', []):
+            name = execution.get('name', '')
+            tenant = name.split('--', 1)[0] if '--' in name else ''
+            running[tenant] = running.get(tenant, 0) + 1
+        if not response.get('nextToken'):
+            return running
+        kwargs['nextToken'] = response['nextToken']
+
+
+class SQSQueue:
+    """Review jobs on SQS"""
+
+    def __init__(self, queue_url: str):
+        self.queue_url = queue_url
+
+    def send(self, job: Dict[str, Any], delay_seconds: int = 0) -> str:
+        response = get_client('sqs', region_name=REGION).send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps(job),
+            DelaySeconds=min(max(int(delay_seconds), 0), 900)
+        )
+        return response['MessageId']
+
+
+class LocalQueue:
+    """
+    In-process stand-in for SQS
+
+    receive() returns an SQS-shaped Lambda event; complete() applies the
+    handler's batchItemFailures (failed messages go back to the queue). With
+    max_receives, a message failed that many times moves to dead_letters
+    like an SQS redrive policy. Send delays are recorded in `delays` but
+    messages are available immediately.
+    """
+
+    def __init__(self, max_receives: int = None):
+        self.messages = deque()
+        self.in_flight = OrderedDict()
+        self.max_receives = max_receives
+        self.receive_counts = {}
+        self.dead_letters = []
+        self.delays = {}
+
+    def send(self, job: Dict[str, Any], delay_seconds: int = 0) -> str:
+        message_id = uuid.uuid4().hex
+        self.messages.append((message_id, json.dumps(job)))
+        if delay_seconds:
+            self.delays[message_id] = delay_seconds
+        return message_id
+
+    def receive(self, max_messages: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+        records = []
+        while self.messages and len(records) < max_messages:
+            message_id, body = self.messages.popleft()
+            self.in_flight[message_id] = body
+            self.receive_counts[message_id] = self.receive_counts.get(message_id, 0) + 1
+            records.append({
+                'messageId': message_id,
+                'body': body,
+                'attributes': {'ApproximateReceiveCount': str(self.receive_counts[message_id])},
+                'eventSource': 'aws:sqs'
+            })
+        return {'Records': records}
+
+    def complete(self, response: Dict[str, Any]):
+        failed = {item['itemIdentifier'] for item in (response or {}).get('batchItemFailures', [])}
+        for message_id, body in list(self.in_flight.items()):
+            del self.in_flight[message_id]
+            if message_id not in failed:
+                self.receive_counts.pop(message_id, None)
+            elif self.max_receives and self.receive_counts[message_id] >= self.max_receives:
+                self.dead_letters.append((message_id, body))
+                self.receive_counts.pop(message_id, None)
+            else:
+                self.messages.append((message_id, body))
+
+    def __len__(self):
+        return len(self.messages) + len(self.in_flight)
+
+
+_local_queue = LocalQueue()
+
+
+def get_queue():
+    """Queue backend selected by REVIEW_QUEUE_BACKEND"""
+    if QUEUE_BACKEND == 'local':
+        return _local_queue
+    if not REVIEW_QUEUE_URL:
+        raise ValueError("REVIEW_QUEUE_URL is not set")
+    return SQSQueue(REVIEW_QUEUE_URL)
@@ -0,0 +1,125 @@
+"""
+Lazy client and import registry shared by all Lambda functions
+
+Clients and heavy SDKs are built on first use and memoized for the lifetime
+of the container, so invocations that return early (400s, ping events,
+skipped actions) never pay for boto3 or Gemini imports. Import/init timings
+are recorded for cold-start analysis.
+"""
+
+import importlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+# Opt-in warm-up during the INIT phase (captured by SnapStart snapshots)
+PRE_INIT = os.environ.get('LAMBDA_PRE_INIT', 'false').lower() == 'true'
+
+_clients = {}
+_modules = {}
+_timings = {}
+_lock = threading.Lock()
+_cold_start = True
+
+
+def _timed(label: str, factory: Callable[[], Any]) -> Any:
+    start = time.perf_counter()
+    value = factory()
+    _timings[label] = round((time.perf_counter() - start) * 1000, 2)
+    return value
+
+
+def lazy_import(module_name: str):
+    """Import a module on first use and memoize it"""
+    module = _modules.get(module_name)
+    if module is None:
+        with _lock:
+            module = _modules.get(module_name)
+            if module is None:
+                module = _timed(f"import:{module_name}", lambda: importlib.import_module(module_name))
+                _modules[module_name] = module
+    return module
+
+
+def _memoized(key: tuple, label: str, factory: Callable[[], Any]) -> Any:
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _timed(label, factory)
+                _clients[key] = client
+    return client
+
+
+def get_client(service: str, region_name: str = None):
+    """Get a memoized boto3 client, created on first use"""
+    boto3 = lazy_import('boto3')
+    return _memoized(
+        ('client', service, region_name),
+        f"client:{service}",
+        lambda: boto3.client(service, region_name=region_name)
+    )
+
+
+def get_resource(service: str, region_name: str = None):
+    """Get a memoized boto3 resource, created on first use"""
+    boto3 = lazy_import('boto3')
+    return _memoized(
+        ('resource', service, region_name),
+        f"resource:{service}",
+        lambda: boto3.resource(service, region_name=region_name)
+    )
+
+
+def get_table(table_name: str, region_name: str = None):
+    """Get a memoized DynamoDB Table handle"""
+    return _memoized(
+        ('table', table_name, region_name),
+        f"table:{table_name}",
+        lambda: get_resource('dynamodb', region_name).Table(table_name)
+    )
+
+
+def get_genai():
+    """Import the Gemini client selected by GEMINI_CLIENT (sdk or rest)"""
+    if os.environ.get('GEMINI_CLIENT', 'sdk') == 'rest':
+        return lazy_import('gemini_client')
+    return lazy_import('google.generativeai')
+
+
+def get_init_timings() -> Dict[str, float]:
+    """Import/init timings (ms) recorded in this container"""
+    return dict(_timings)
+
+
+def log_startup(lambda_name: str):
+    """Log whether this is a cold start plus the init timings so far"""
+    global _cold_start
+
+    print(json.dumps({
+        "level": "INFO",
+        "message": f"{lambda_name} startup",
+        "cold_start": _cold_start,
+        "init_timings_ms": get_init_timings()
+    }))
+    _cold_start = False
+
+
+def pre_init(*warmers: Callable[[], Any]):
+    """
+    Run warm-up callables at import time when LAMBDA_PRE_INIT=true
+
+    Used for snapshot-style warm starts: work done here lands in the INIT
+    phase (and in the SnapStart snapshot) instead of the first invocation.
+    """
+    if not PRE_INIT:
+        return
+
+    for warmer in warmers:
+        try:
+            warmer()
+        except Exception as e:
+            print(f"⚠️  Pre-init warmer failed: {str(e)}")
@@ -0,0 +1,160 @@
+"""
+Risk-aware model routing for the review agents
+
+Chooses, per agent and per file, between:
+    deep    - full model (gemini-2.5-flash)
+    fast    - cheaper/faster tier (gemini-2.5-flash-lite)
+    static  - no model call; local checks only
+
+using the ContextEnhancer risk score plus CodeParser metrics. The risk score
+mixes every category (one security pattern adds only 1.0), so each agent
+also counts the patterns of its own category: `deep_patterns` of them force
+the full model. Thresholds are configurable per agent through
+MODEL_ROUTING_CONFIG (JSON), e.g.
+    {"security": {"deep_at": 2.0}, "best_practices": {"static_below": 1.0}}
+"""
+
+import json
+import os
+from typing import Any, Dict
+
+MODEL_ROUTING_ENABLED = os.environ.get('MODEL_ROUTING_ENABLED', 'false').lower() == 'true'
+
+TIER_MODELS = {
+    'deep': os.environ.get('DEEP_MODEL', 'gemini-2.5-flash'),
+    'fast': os.environ.get('FAST_MODEL', 'gemini-2.5-flash-lite'),
+    'static': None
+}
+
+# context_map historical_issues category reported by each agent's static review
+AGENT_CATEGORIES = {
+    'security': 'security',
+    'performance': 'performance',
+    'best_practices': 'quality'
+}
+
+DEFAULT_ROUTING = {
+    'security': {
+        'static_below': 0.5,        # risk score below which no model is called
+        'deep_at': 2.0,             # risk score from which the full model is used
+        'deep_patterns': 1,         # patterns of the agent's own category that force the full model (0 = off)
+        'deep_complexity': 15,      # complexity that forces the full model
+        'deep_lines': 400,          # lines of code that force the full model
+        'trivial_lines': 15         # files this small are static-only when risk is low
+    },
+    'performance': {
+        'static_below': 0.5,
+        'deep_at': 3.0,
+        'deep_patterns': 2,
+        'deep_complexity': 10,
+        'deep_lines': 300,
+        'trivial_lines': 20
+    },
+    'best_practices': {
+        'static_below': 0.3,
+        'deep_at': 5.0,
+        'deep_patterns': 0,
+        'deep_complexity': 25,
+        'deep_lines': 600,
+        'trivial_lines': 10
+    }
+}
+
+
+def load_routing_config() -> Dict[str, Dict[str, float]]:
+    """Defaults merged with per-agent overrides from MODEL_ROUTING_CONFIG"""
+    config = {agent: dict(rules) for agent, rules in DEFAULT_ROUTING.items()}
+    overrides = os.environ.get('MODEL_ROUTING_CONFIG')
+
+    if overrides:
+        try:
+            for agent, rules in json.loads(overrides).items():
+                config.setdefault(agent, dict(DEFAULT_ROUTING['best_practices'])).update(rules)
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️  Ignoring invalid MODEL_ROUTING_CONFIG: {str(e)}")
+
+    return config
+
+
+ROUTING_CONFIG = load_routing_config()
+
+
+def route_file(agent: str, filename: str, parsed_meta: Dict[str, Any],
+               file_context: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Decide which tier reviews this file for the given agent
+
+    Args:
+        agent: 'security', 'performance' or 'best_practices'
+        parsed_meta: CodeParser output for the file
+        file_context: ContextEnhancer context_map entry (risk_score, patterns)
+
+    Returns:
+        {'file', 'tier', 'model', 'risk_score', 'reason'}
+    """
+    metrics = (parsed_meta or {}).get('metrics', {})
+    risk_score = float((file_context or {}).get('risk_score', 0.0))
+    lines = metrics.get('lines_of_code', 0)
+    complexity = metrics.get('complexity', 0)
+    category = AGENT_CATEGORIES.get(agent, agent)
+    own_patterns = len(((file_context or {}).get('patterns') or {}).get(category, []))
+
+    def decision(tier: str, reason: str) -> Dict[str, Any]:
+        return {
+            "file": filename,
+            "tier": tier,
+            "model": TIER_MODELS[tier],
+            "risk_score": risk_score,
+            "reason": reason
+        }
+
+    if not MODEL_ROUTING_ENABLED:
+        return decision('deep', 'routing disabled')
+
+    if not parsed_meta or not file_context:
+        return decision('deep', 'no parse/context metadata')
+
+    rules = ROUTING_CONFIG.get(agent, DEFAULT_ROUTING['best_practices'])
+
+    if risk_score >= rules['deep_at']:
+        return decision('deep', f"risk {risk_score} >= {rules['deep_at']}")
+    if rules.get('deep_patterns') and own_patterns >= rules['deep_patterns']:
+        return decision('deep', f"{own_patterns} {category} patterns >= {rules['deep_patterns']}")
+    if complexity >= rules['deep_complexity']:
+        return decision('deep', f"complexity {complexity} >= {rules['deep_complexity']}")
+    if lines >= rules['deep_lines']:
+        return decision('deep', f"{lines} lines >= {rules['deep_lines']}")
+
+    if risk_score < rules['static_below']:
+        return decision('static', f"risk {risk_score} < {rules['static_below']}")
+    if lines <= rules['trivial_lines']:
+        return decision('static', f"trivial file ({lines} lines)")
+
+    return decision('fast', f"risk {risk_score} below deep threshold {rules['deep_at']}")
+
+
+def override_route(route: Dict[str, Any], tier: str, reason: str) -> Dict[str, Any]:
+    """Copy of a routing decision moved to another tier (e.g. after static checks)"""
+    return dict(route, tier=tier, model=TIER_MODELS[tier], reason=reason)
+
+
+def summarize_routing(decisions) -> Dict[str, int]:
+    """Count routing decisions per tier"""
+    summary = {tier: 0 for tier in TIER_MODELS}
+    for item in decisions or []:
+        summary[item.get('tier', 'deep')] = summary.get(item.get('tier', 'deep'), 0) + 1
+    return summary
+
+
+def static_review(agent: str, route: Dict[str, Any], file_context: Dict[str, Any] = None) -> str:
+    """Markdown review for files routed to static-only checks"""
+    category = AGENT_CATEGORIES.get(agent, agent)
+    issues = [i for i in (file_context or {}).get('historical_issues', []) if i.get('category') == category]
+
+    lines = [f"✅ Low-risk file (risk score {route['risk_score']}) - model review skipped: {route['reason']}."]
+    if issues:
+        lines.append("")
+        lines.append("**Static signals:**")
+        for issue in issues:
+            lines.append(f"- [{issue.get('severity', 'low').upper()}] {issue.get('issue')} - {issue.get('recommendation')}")
+    return "\n".join(lines)
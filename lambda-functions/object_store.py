@@ -0,0 +1,54 @@
+"""
+Small object store over a local directory or an S3 prefix
+
+Prefixes are either filesystem paths or s3://bucket/prefix; names are
+relative keys ("shards/00001.json"). Local writes go through a temp file
+and a rename, so readers never see a partial object.
+"""
+
+import os
+from typing import Tuple
+from lambda_startup import get_client
+
+
+def _split_s3(prefix: str) -> Tuple[str, str]:
+    bucket, _, key = prefix[len('s3://'):].partition('/')
+    return bucket, key.rstrip('/')
+
+
+def _s3_key(prefix: str, name: str) -> Tuple[str, str]:
+    bucket, key = _split_s3(prefix)
+    return bucket, f"{key}/{name}" if key else name
+
+
+def write_object(prefix: str, name: str, data: bytes, content_type: str = None):
+    if prefix.startswith('s3://'):
+        bucket, key = _s3_key(prefix, name)
+        extra = {'ContentType': content_type} if content_type else {}
+        get_client('s3').put_object(Bucket=bucket, Key=key, Body=data, **extra)
+        return
+    path = os.path.join(prefix, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def read_object(prefix: str, name: str) -> bytes:
+    if prefix.startswith('s3://'):
+        bucket, key = _s3_key(prefix, name)
+        return get_client('s3').get_object(Bucket=bucket, Key=key)['Body'].read()
+    with open(os.path.join(prefix, name), 'rb') as f:
+        return f.read()
+
+
+def object_exists(prefix: str, name: str) -> bool:
+    if prefix.startswith('s3://'):
+        bucket, key = _s3_key(prefix, name)
+        s3 = get_client('s3')
+        try:
+            s3.head_object(Bucket=bucket, Key=key)
+            return True
+        except s3.exceptions.ClientError:
+            return False
+    return os.path.exists(os.path.join(prefix, name))
@@ -1,16 +1,45 @@
 import json
 import os
-import boto3
-import google.generativeai as genai
 from secrets_helper import get_gemini_api_key
+from lambda_startup import get_client, get_genai, log_startup, pre_init
+from review_coalescing import check_superseded
+from context_cache import generate_from_cache, get_live_handle, is_cache_miss
+from work_items import load_work_item, store_item_result
+from findings import FINDINGS_GENERATION_CONFIG, FINDINGS_OUTPUT_FORMAT, parse_model_review
+from request_policy import REQUEST_TIMEOUT_SECONDS, call_with_policy, summarize_reports
+from model_router import override_route, route_file, static_review, summarize_routing
+from static_performance import analyze_source, flatten, format_function_findings
 
-s3_client = boto3.client('s3')
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
+# Clean files (no static findings) below this risk score skip the model
+PRESCREEN_MAX_RISK = float(os.environ.get('PERFORMANCE_PRESCREEN_MAX_RISK', '1.0'))
+# Files longer than this send only the flagged functions to the model
+FOCUS_MIN_LINES = int(os.environ.get('PERFORMANCE_FOCUS_MIN_LINES', '200'))
+
+PERFORMANCE_ROLE = "You are a performance optimization expert reviewing Python code."
+
+PERFORMANCE_TASK = """**Your task:**
+1. Identify performance bottlenecks (O(n²) algorithms, inefficient loops, etc.)
+2. Classify by severity: critical, high, medium
+3. Provide specific code examples
+4. Suggest optimized alternatives with Big-O analysis
+5. Focus on algorithmic improvements and data structure choices
+
+""" + FINDINGS_OUTPUT_FORMAT
 
 def lambda_handler(event, context):
     """Performance-focused code review agent powered by Gemini"""
     
     lambda_name = "PerformanceAgent"
+    log_startup(lambda_name)
+    
+    # Map mode sends a pointer to the work item stored in S3
+    event = load_work_item(event)
+    
+    # A newer push to the PR makes this execution stale
+    superseded = check_superseded(event, lambda_name)
+    if superseded:
+        return superseded
     
     try:
         print("=" * 60)
@@ -27,6 +56,8 @@ def lambda_handler(event, context):
         
         uploaded_files = event.get('uploaded_files', [])
         parsed_files = event.get('parsed_files', [])
+        context_caches = event.get('context_caches', {})
+        context_map = event.get('context_map', {})
         
         print(f"📁 Analyzing {len(uploaded_files)} files for performance")
         
@@ -41,8 +72,9 @@ def lambda_handler(event, context):
                     "lambda": lambda_name
                 }
             
+            genai = get_genai()
             genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-2.5-flash')
+            models = {}
             
             print("✅ Gemini API key retrieved from Secrets Manager")
             
@@ -56,16 +88,22 @@ def lambda_handler(event, context):
             }
         
         all_reviews = []
+        routing = []
+        findings = []
         total_tokens = 0
         
         for file_info in uploaded_files:
             filename = file_info.get('filename', 'unknown')
             s3_key = file_info.get('s3_key')
             
+            if file_info.get('carried_forward'):
+                print(f"♻️  Unchanged since last review, skipping: {filename}")
+                continue
+            
             print(f"📄 Processing: {filename}")
             
             try:
-                response = s3_client.get_object(Bucket=BUCKET_NAME, Key=s3_key)
+                response = get_client('s3').get_object(Bucket=BUCKET_NAME, Key=s3_key)
                 code = response['Body'].read().decode('utf-8')
             except Exception as e:
                 print(f"❌ Error downloading {s3_key}: {str(e)}")
@@ -77,17 +115,77 @@ def lambda_handler(event, context):
                 continue
             
             parsed_meta = next((p for p in parsed_files if p.get('filename') == filename), {})
+            file_context = context_map.get(filename)
+            
+            # AST anti-pattern results (computed by CodeParser, or locally as a fallback)
+            hotspots = parsed_meta.get('performance_findings')
+            if hotspots is None:
+                hotspots = analyze_source(code)
+            findings.extend({"file": filename, "agent": "performance", "source": "static", **f} for f in flatten(hotspots))
+            static_section = ""
+            if hotspots:
+                static_section = f"\n\n### 🔎 Static Analysis Findings\n\n{format_function_findings(hotspots)}"
+            
+            # Route by risk: static-only checks, fast tier or full model
+            route = route_file('performance', filename, parsed_meta, file_context)
+            if hotspots and route['tier'] == 'static':
+                route = override_route(route, 'fast', f"{len(flatten(hotspots))} static performance findings")
+            elif not hotspots and file_context and route['risk_score'] < PRESCREEN_MAX_RISK:
+                route = override_route(route, 'static', "no anti-patterns found by static analysis")
+            routing.append(route)
+            
+            if route['tier'] == 'static':
+                print(f"⏭️  Static-only review for {filename}: {route['reason']}")
+                all_reviews.append({
+                    "file": filename,
+                    "review": static_review('performance', route, file_context) + static_section,
+                    "tokens": 0
+                })
+                continue
+            
+            if route['model'] not in models:
+                models[route['model']] = genai.GenerativeModel(
+                    route['model'], generation_config=FINDINGS_GENERATION_CONFIG
+                )
+            model = models[route['model']]
             
             try:
-                prompt = create_performance_prompt(code, filename, parsed_meta)
-                response = model.generate_content(prompt)
+                cache_handle = get_live_handle(context_caches, filename)
+                if cache_handle and cache_handle['model'] != route['model']:
+                    cache_handle = None  # caches are bound to the model they were created for
+                request_options = {'timeout': REQUEST_TIMEOUT_SECONDS}
+                if cache_handle:
+                    # File source already uploaded once as a shared prefix
+                    prompt = create_performance_instruction(filename, hotspots)
+                    try:
+                        response, request_report = call_with_policy(
+                            lambda prompt=prompt: generate_from_cache(
+                                cache_handle, prompt, model, request_options, FINDINGS_GENERATION_CONFIG
+                            )
+                        )
+                    except Exception as e:
+                        # Expired or deleted cache: send the whole file instead (other errors were already retried)
+                        if not is_cache_miss(e):
+                            raise
+                        print(f"⚠️  Cached context failed for {filename}, using the full prompt: {str(e)}")
+                        cache_handle = None
+                if not cache_handle:
+                    prompt = create_performance_prompt(code, filename, parsed_meta, hotspots)
+                    response, request_report = call_with_policy(
+                        lambda prompt=prompt: model.generate_content(prompt, request_options=request_options)
+                    )
                 review_text = response.text
                 tokens_used = len(prompt.split()) + len(review_text.split())
                 
+                # Issues go to the structured findings, the review keeps the summary
+                summary, model_findings = parse_model_review(review_text, filename, "performance")
+                findings.extend(model_findings)
+                
                 all_reviews.append({
                     "file": filename,
-                    "review": review_text,
-                    "tokens": tokens_used
+                    "review": summary + static_section,
+                    "tokens": tokens_used,
+                    "request": request_report
                 })
                 
                 total_tokens += tokens_used
@@ -96,25 +194,28 @@ def lambda_handler(event, context):
                 print(f"❌ Error analyzing {filename}: {str(e)}")
                 all_reviews.append({
                     "file": filename,
-                    "review": f"Error analyzing file: {str(e)}",
-                    "tokens": 0
+                    "review": f"Error analyzing file: {str(e)}" + static_section,
+                    "tokens": 0,
+                    "request": getattr(e, 'policy_report', None)
                 })
         
-        combined_review = "\n\n".join([f"## File: {r['file']}\n\n{r['review']}" for r in all_reviews])
-        
         print("=" * 60)
         print("✅ Performance Agent Complete")
         print(f"📊 Total tokens: {total_tokens}")
         print(f"💰 Total cost: $0.0000 (FREE with Gemini!)")
         print("=" * 60)
         
-        return {
+        return store_item_result(event, {
             "statusCode": 200,
             "agent": "performance",
-            "review": f"# ⚡ PERFORMANCE ANALYSIS\n\n{combined_review}",
             "tokens": total_tokens,
-            "cost": 0.0
-        }
+            "cost": 0.0,
+            "request_stats": summarize_reports([r.get('request') for r in all_reviews]),
+            "routing": routing,
+            "routing_summary": summarize_routing(routing),
+            "file_reviews": [{"file": r['file'], "review": r['review']} for r in all_reviews],
+            "findings": findings
+        })
         
     except Exception as e:
         print(f"❌ CRITICAL ERROR in {lambda_name}: {str(e)}")
@@ -128,7 +229,31 @@ def lambda_handler(event, context):
             "lambda": lambda_name
         }
 
-def create_performance_prompt(code, filename, parsed_meta):
+def format_hotspot_anchors(hotspots):
+    """Prompt block steering the model towards statically flagged functions"""
+    if not hotspots:
+        return ""
+    return f"""
+**Static analysis hotspots (verified line numbers):**
+{format_function_findings(hotspots)}
+
+Prioritize these functions: confirm each finding, quantify its Big-O impact and propose a fix.
+"""
+
+def focus_code(code, hotspots):
+    """Source of the flagged functions only, for long files"""
+    if not hotspots or len(code.splitlines()) < FOCUS_MIN_LINES or \
+            any(h['function'] == '<module>' for h in hotspots):
+        return code
+    
+    lines = code.splitlines()
+    sections = []
+    for hotspot in hotspots:
+        body = "\n".join(lines[hotspot['line'] - 1:hotspot['end_line']])
+        sections.append(f"# --- {hotspot['function']} (lines {hotspot['line']}-{hotspot['end_line']}) ---\n{body}")
+    return "\n\n".join(sections)
+
+def create_performance_prompt(code, filename, parsed_meta, hotspots=None):
     """Create performance analysis prompt"""
     context = ""
     if parsed_meta:
@@ -139,30 +264,25 @@ def create_performance_prompt(code, filename, parsed_meta):
 - Lines of code: {parsed_meta.get('lines_of_code', 'N/A')}
 """
     
-    prompt = f"""You are a performance optimization expert reviewing Python code.
+    prompt = f"""{PERFORMANCE_ROLE}
 
 {context}
 
 **Code to analyze:**
 ```python
-{code}
+{focus_code(code, hotspots)}
 ```
+{format_hotspot_anchors(hotspots)}
+{PERFORMANCE_TASK}"""
+    return prompt
 
-**Your task:**
-1. Identify performance bottlenecks (O(n²) algorithms, inefficient loops, etc.)
-2. Classify by severity: 🔴 CRITICAL, 🟠 HIGH, 🟡 MEDIUM
-3. Provide specific code examples
-4. Suggest optimized alternatives with Big-O analysis
-5. Focus on algorithmic improvements and data structure choices
+def create_performance_instruction(filename, hotspots=None):
+    """Create performance instruction sent against the cached file context"""
+    return f"""{PERFORMANCE_ROLE}
 
-**Output format:**
-## 🔴 CRITICAL Performance Issues
-[List with code examples and optimization suggestions]
+Review the file `{filename}` provided in the cached context above.
+{format_hotspot_anchors(hotspots)}
+{PERFORMANCE_TASK}"""
 
-## 🟠 HIGH Performance Issues
-[List with code examples]
 
-## ✅ Performance Summary
-[Brief summary with prioritized optimizations]
-"""
-    return prompt
\ No newline at end of file
+pre_init(lambda: get_client('s3'), get_genai)
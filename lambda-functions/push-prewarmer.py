@@ -0,0 +1,146 @@
+import os
+import time
+import urllib3
+from lambda_startup import get_genai, get_table, log_startup, pre_init
+from secrets_helper import get_gemini_api_key
+from code_analysis import extract_code_snippets, parse_python_file
+from static_security import analyze_source
+from embedding_batch import embed_texts
+from rate_limiter import TokenBucket
+from review_filter import file_skip_reason, get_review_config
+from review_coalescing import EVENTS_TABLE, EVENTS_TABLE_KEY
+import blob_cache
+
+http = urllib3.PoolManager()
+
+# Files prewarmed per repo per hour, and per push
+PREWARM_FILES_PER_HOUR = int(os.environ.get('PREWARM_FILES_PER_HOUR', '200'))
+PREWARM_MAX_FILES = int(os.environ.get('PREWARM_MAX_FILES', '50'))
+PREWARM_EMBEDDINGS = os.environ.get('PREWARM_EMBEDDINGS', 'false').lower() == 'true'
+# Embedding budget reserved for prewarming (kept out of EMBED_REQUESTS_PER_MINUTE)
+PREWARM_EMBED_REQUESTS_PER_MINUTE = float(os.environ.get('PREWARM_EMBED_REQUESTS_PER_MINUTE', '60'))
+PREWARM_CONCURRENCY = int(os.environ.get('PREWARM_CONCURRENCY', '2'))
+QUOTA_TTL_SECONDS = 2 * 3600
+
+# This container's share of the prewarm embedding budget
+limiter = TokenBucket.per_minute(PREWARM_EMBED_REQUESTS_PER_MINUTE / max(1, PREWARM_CONCURRENCY))
+
+_genai_configured = False
+
+
+def consume_quota(repo_name, files):
+    """Reserve prewarm budget in the repo's hourly bucket; False when it would be exceeded"""
+    table = get_table(EVENTS_TABLE)
+    now = int(time.time())
+    try:
+        table.update_item(
+            Key={EVENTS_TABLE_KEY: f"prewarm#{repo_name}#{time.strftime('%Y%m%d%H', time.gmtime(now))}"},
+            UpdateExpression='ADD files :n SET expires_at = :expires',
+            ConditionExpression='attribute_not_exists(files) OR files <= :remaining',
+            ExpressionAttributeValues={
+                ':n': files,
+                ':remaining': PREWARM_FILES_PER_HOUR - files,
+                ':expires': now + QUOTA_TTL_SECONDS
+            }
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def embed_snippets(parsed_file, code):
+    """Embed snippet contexts not yet in the store"""
+    global _genai_configured
+    
+    genai = get_genai()
+    if not _genai_configured:
+        genai.configure(api_key=get_gemini_api_key())
+        _genai_configured = True
+    
+    snippets = extract_code_snippets(parsed_file, code)
+    _, stats = embed_texts(genai, [snippet['context'] for snippet in snippets], limiter=limiter)
+    return stats['embedded']
+
+
+def lambda_handler(event, context):
+    """Pre-analyze files pushed to a feature branch into the content-addressed store"""
+    
+    print("=" * 60)
+    print("🔥 PUSH PREWARMER")
+    print("=" * 60)
+    log_startup("PushPrewarmer")
+    
+    try:
+        repo_name = event.get('repo_name')
+        head_sha = event.get('head_sha')
+        paths = event.get('paths', [])
+        
+        if not all([repo_name, head_sha]) or not blob_cache.BLOB_CACHE:
+            return {
+                "statusCode": 400,
+                "error": "Missing repo_name/head_sha, or BLOB_CACHE is disabled"
+            }
+        
+        review_config = get_review_config(repo_name)
+        paths = [p for p in paths if not file_skip_reason({'filename': p}, review_config)][:PREWARM_MAX_FILES]
+        
+        if not paths:
+            return {"statusCode": 200, "prewarmed": 0, "message": "No reviewable files"}
+        
+        # Pushes only use spare budget: over quota, nothing is done
+        if not consume_quota(repo_name, len(paths)):
+            print(f"⏭️  Hourly prewarm quota reached for {repo_name}")
+            return {"statusCode": 429, "prewarmed": 0, "message": "Prewarm quota exceeded"}
+        
+        print(f"📋 {repo_name}@{head_sha[:7]} on {event.get('branch')}: {len(paths)} files")
+        
+        stats = {"prewarmed": 0, "already_cached": 0, "failed": 0, "embeddings": 0}
+        
+        for path in paths:
+            raw_url = f"https://raw.githubusercontent.com/{repo_name}/{head_sha}/{path}"
+            try:
+                response = http.request('GET', raw_url, timeout=10.0)
+                if response.status != 200:
+                    print(f"❌ Failed to download {path}: {response.status}")
+                    stats["failed"] += 1
+                    continue
+                
+                code = response.data.decode('utf-8')
+                sha = blob_cache.git_blob_sha(code)
+                if blob_cache.get('parse', sha):
+                    stats["already_cached"] += 1
+                    continue
+                
+                parsed = parse_python_file(code, path)
+                if parsed:
+                    blob_cache.put('parse', sha, {k: v for k, v in parsed.items() if k != 'filename'})
+                blob_cache.put('security', sha, analyze_source(code))
+                
+                if parsed and PREWARM_EMBEDDINGS:
+                    stats["embeddings"] += embed_snippets(parsed, code)
+                
+                stats["prewarmed"] += 1
+                print(f"✅ Prewarmed {path} ({sha[:7]})")
+            
+            except Exception as e:
+                print(f"❌ Error prewarming {path}: {str(e)}")
+                stats["failed"] += 1
+        
+        print("=" * 60)
+        print(f"✅ Prewarmed {stats['prewarmed']}, cached {stats['already_cached']}, failed {stats['failed']}")
+        print("=" * 60)
+        
+        return {"statusCode": 200, **stats}
+    
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        
+        return {
+            "statusCode": 500,
+            "error": str(e)
+        }
+
+
+pre_init(lambda: get_table(EVENTS_TABLE))
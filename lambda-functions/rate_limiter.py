@@ -0,0 +1,64 @@
+"""
+Token bucket for model request rates
+
+EmbeddingConsumer takes one token per embedding request. The account-wide
+limit (EMBED_REQUESTS_PER_MINUTE) is divided by the consumer's reserved
+concurrency, so all containers together stay under it:
+
+    limiter = TokenBucket.per_minute(EMBED_REQUESTS_PER_MINUTE / EMBEDDING_CONSUMER_CONCURRENCY)
+    limiter.acquire()        # blocks until a token is available
+
+Clock and sleep are injectable (review_scheduler.SimulatedClock works) so
+tests run without waiting.
+"""
+
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """`rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.waited = 0.0
+
+    @classmethod
+    def per_minute(cls, requests_per_minute: float, **kwargs) -> 'TokenBucket':
+        return cls(requests_per_minute / 60.0, capacity=max(1.0, requests_per_minute / 60.0), **kwargs)
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` would be available"""
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """Block until `tokens` are taken; False if that would exceed `timeout` seconds"""
+        wait = self.wait_time(tokens)
+        if timeout is not None and wait > timeout:
+            return False
+        while not self.try_acquire(tokens):
+            delay = self.wait_time(tokens)
+            self.sleep(delay)
+            self.waited += delay
+        return True
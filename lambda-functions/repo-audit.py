@@ -0,0 +1,219 @@
+import json
+import urllib3
+from lambda_startup import get_client, log_startup, pre_init
+from job_queue import REGION
+from review_filter import GITHUB_API, HEADERS, file_skip_reason, get_review_config
+from repo_audit import (AGENT_FUNCTIONS, AUDIT_AGENTS, AUDIT_MAX_CONCURRENCY, BUCKET_NAME, audit_prefix,
+                        ManifestMismatch, build_manifest, load_results, pending_shards, plan_manifest,
+                        read_manifest, reduce_shards, run_shard, store_report)
+
+http = urllib3.PoolManager()
+
+def fetch_tree(repo_name, sha, recursive=True):
+    url = f"{GITHUB_API}/repos/{repo_name}/git/trees/{sha}" + ("?recursive=1" if recursive else "")
+    response = http.request('GET', url, headers=HEADERS, timeout=30.0)
+    if response.status != 200:
+        raise RuntimeError(f"Failed to list tree: {response.status}")
+    return json.loads(response.data.decode('utf-8'))
+
+
+def walk_tree(repo_name, sha, path=""):
+    """
+    Every entry below a tree, with full paths, and whether any listing stayed truncated
+
+    GitHub truncates large recursive listings; those trees are listed one
+    level at a time and each subtree is walked on its own.
+    """
+    tree = fetch_tree(repo_name, sha)
+    if not tree.get('truncated'):
+        return [dict(item, path=path + item['path']) for item in tree.get('tree', [])], False
+    
+    print(f"⚠️  Recursive listing of {path or '/'} truncated, walking its subtrees")
+    listing = fetch_tree(repo_name, sha, recursive=False)
+    items, truncated = [], bool(listing.get('truncated'))
+    for item in listing.get('tree', []):
+        if item.get('type') == 'tree':
+            subtree, subtree_truncated = walk_tree(repo_name, item['sha'], f"{path}{item['path']}/")
+            items.extend(subtree)
+            truncated = truncated or subtree_truncated
+        else:
+            items.append(dict(item, path=path + item['path']))
+    return items, truncated
+
+
+def list_tree(repo_name, commit):
+    """
+    Python blobs of a commit as manifest entries, filtered by the repo's review config
+
+    Returns:
+        (entries, truncated) - truncated when even a one-level listing was cut short
+    """
+    tree, truncated = walk_tree(repo_name, commit)
+    if truncated:
+        print("⚠️  GitHub truncated a tree listing; the audit covers the returned entries only")
+    
+    config = get_review_config(repo_name)
+    entries = []
+    for item in tree:
+        if item.get('type') != 'blob':
+            continue
+        if file_skip_reason({'filename': item['path']}, config):
+            continue
+        if config['max_file_bytes'] and item.get('size', 0) > config['max_file_bytes']:
+            continue
+        entries.append({'path': item['path'], 'sha': item['sha'], 'size': item.get('size', 0)})
+    return entries, truncated
+
+
+def download(repo_name, commit):
+    def read_content(entry):
+        response = http.request('GET', f"https://raw.githubusercontent.com/{repo_name}/{commit}/{entry['path']}",
+                                timeout=10.0)
+        if response.status != 200:
+            raise RuntimeError(f"download failed: {response.status}")
+        return response.data.decode('utf-8')
+    return read_content
+
+
+def agent_runner(repo_name, commit, read_content):
+    """Run AUDIT_AGENTS (synchronous Lambda invokes) on the shard's files with static findings"""
+    def run(results):
+        flagged = [r for r in results if r['findings']]
+        if not flagged:
+            return []
+        
+        uploaded_files = []
+        for result in flagged:
+            s3_key = f"audits/{repo_name}/{commit[:12]}/files/{result['file']}"
+            content = result['content'] or read_content({'path': result['file']})
+            get_client('s3').put_object(Bucket=BUCKET_NAME, Key=s3_key, Body=content.encode('utf-8'),
+                                        ContentType='text/plain')
+            uploaded_files.append({'filename': result['file'], 's3_key': s3_key, 'sha': result['sha']})
+        
+        reviews = []
+        for agent in AUDIT_AGENTS:
+            response = get_client('lambda', region_name=REGION).invoke(
+                FunctionName=AGENT_FUNCTIONS[agent],
+                Payload=json.dumps({'repo_name': repo_name, 'uploaded_files': uploaded_files}).encode('utf-8')
+            )
+            output = json.loads(response['Payload'].read())
+            if output.get('statusCode') != 200:
+                raise RuntimeError(f"{agent}: {output.get('message', output.get('error'))}")
+            reviews.extend({'agent': agent, **review} for review in output.get('file_reviews', []))
+        return reviews
+    return run
+
+
+def lambda_handler(event, context):
+    """Full-repository audit: plan shards, audit one shard, or reduce shard results into a report"""
+    
+    print("=" * 60)
+    print("🛡️  REPO AUDIT")
+    print("=" * 60)
+    log_startup("RepoAudit")
+    
+    try:
+        action = event.get('action', 'plan')
+        repo_name = event.get('repo_name')
+        commit = event.get('commit')
+        
+        if not all([repo_name, commit]):
+            return {
+                "statusCode": 400,
+                "error": "Missing required parameters: repo_name or commit"
+            }
+        
+        prefix = audit_prefix(repo_name, commit, event.get('audit_prefix'))
+        
+        if action == 'plan':
+            # Keeps the stored manifest of an unchanged plan; refuses to mix plans
+            entries, truncated = list_tree(repo_name, commit)
+            manifest = plan_manifest(prefix, build_manifest(repo_name, commit, entries, truncated=truncated))
+            
+            # A rerun of the same commit only maps the shards without a result
+            pending = pending_shards(prefix, manifest)
+            print(f"📋 {repo_name}@{commit[:12]}: {manifest['files']} files, {manifest['bytes']} bytes, "
+                  f"{len(manifest['shards'])} shards ({len(pending)} pending)")
+            
+            return {
+                "statusCode": 200,
+                "repo_name": repo_name,
+                "commit": commit,
+                "audit_prefix": prefix,
+                "shard_ids": pending,
+                "truncated": manifest.get('truncated', False),
+                "max_concurrency": AUDIT_MAX_CONCURRENCY
+            }
+        
+        if action == 'shard':
+            manifest = read_manifest(prefix)
+            shard = manifest['shards'][event['shard']]
+            read_content = download(repo_name, commit)
+            runner = agent_runner(repo_name, commit, read_content) if AUDIT_AGENTS else None
+            
+            result = run_shard(prefix, manifest, shard, read_content, runner)
+            
+            print(f"✅ Shard {shard['shard']}: {result['audited']}/{result['files']} files, "
+                  f"{len(result['findings'])} findings, {len(result['errors'])} errors"
+                  + (" (already done)" if result.get('resumed') else f" in {result['seconds']}s")
+                  + (" - partial, rerun to retry the failed files" if result.get('partial') else ""))
+            
+            # Only a summary goes back to the Map state (payload limits)
+            return {
+                "statusCode": 200,
+                "shard": shard['shard'],
+                "audited": result['audited'],
+                "findings": len(result['findings']),
+                "errors": len(result['errors']),
+                "partial": result.get('partial', False)
+            }
+        
+        if action == 'reduce':
+            manifest = read_manifest(prefix)
+            report = reduce_shards(manifest, load_results(prefix, manifest))
+            keys = store_report(prefix, report)
+            
+            print("=" * 60)
+            print(f"✅ Audit complete: {report['audited']}/{report['files']} files, "
+                  f"{len(report['findings'])} findings {report['by_severity']}")
+            if report['missing_shards']:
+                print(f"⚠️  Missing shards: {report['missing_shards']} (rerun to resume)")
+            if report['partial_shards']:
+                print(f"⚠️  Partial shards: {report['partial_shards']} (rerun to retry their failed files)")
+            print("=" * 60)
+            
+            return {
+                "statusCode": 200,
+                "audit_prefix": prefix,
+                "report": keys,
+                "findings": len(report['findings']),
+                "by_severity": report['by_severity'],
+                "missing_shards": report['missing_shards'],
+                "partial_shards": report['partial_shards'],
+                "truncated": report['truncated']
+            }
+        
+        return {
+            "statusCode": 400,
+            "error": f"Unknown action: {action}"
+        }
+    
+    except ManifestMismatch as e:
+        print(f"❌ {str(e)}")
+        return {
+            "statusCode": 409,
+            "error": str(e)
+        }
+    
+    except Exception as e:
+        print(f"❌ CRITICAL ERROR in RepoAudit: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        
+        return {
+            "statusCode": 500,
+            "error": str(e)
+        }
+
+
+pre_init(lambda: get_client('s3'))
@@ -0,0 +1,378 @@
+"""
+Full-repository audit: sharding contract shared by the RepoAudit Lambda
+and tools/audit_local.py
+
+    plan    list the tree -> shard_files() -> manifest.json
+    shard   audit_shard() on one shard -> shards/<n>.json  (skipped if present)
+            or shards/<n>.partial.json when some files failed
+    reduce  reduce_shards() over every shard result -> report.json / report.md
+
+Shards are contiguous runs of the path-sorted tree capped by bytes and file
+count, so each fits in one Lambda invocation and neighbouring files stay
+together. All state lives under one prefix (object_store: S3 or a local
+directory) keyed by the audited commit, so rerunning an audit of the same
+commit only processes shards without a complete result. A partial result
+(files that failed to download or parse, or a failed agent run) stays
+pending: the rerun audits only its failed files and merges them in, or the
+whole shard again when the agents failed.
+
+Shard results are only valid for the shard plan that produced them: the
+manifest carries a `manifest_id` (hash of every shard's files) and each
+shard result records it. A rerun with different limits or review config
+reuses nothing; plan_manifest() refuses to replace a manifest that already
+has shard results, and stored results from another plan are rejected.
+
+Per file the audit runs the CodeParser parse (with static performance
+checks) and the static security rules, reusing blob_cache results by git
+blob SHA. The model agents can be added per shard through `agent_runner`
+(the Lambda runs the AUDIT_AGENTS on files with static findings).
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+import blob_cache
+from code_analysis import parse_python_file
+from object_store import object_exists, read_object, write_object
+from static_performance import flatten
+from static_security import SEVERITY_ORDER, analyze_source
+
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
+AUDIT_PREFIX = os.environ.get('AUDIT_PREFIX', f"s3://{BUCKET_NAME}/audits")
+AUDIT_SHARD_BYTES = int(os.environ.get('AUDIT_SHARD_BYTES', str(4 * 1024 * 1024)))
+AUDIT_SHARD_FILES = int(os.environ.get('AUDIT_SHARD_FILES', '400'))
+AUDIT_MAX_CONCURRENCY = int(os.environ.get('AUDIT_MAX_CONCURRENCY', '20'))
+AGENT_FUNCTIONS = {
+    'security': 'SecurityAgent',
+    'performance': 'PerformanceAgent',
+    'best_practices': 'BestPracticesAgent'
+}
+# Model agents run on files with static findings, e.g. "security,performance" (empty = static only)
+AUDIT_AGENTS = [a.strip() for a in os.environ.get('AUDIT_AGENTS', '').split(',') if a.strip() in AGENT_FUNCTIONS]
+REPORT_TOP_FILES = 25
+
+MANIFEST = 'manifest.json'
+
+
+def shard_name(index: int) -> str:
+    return f"shards/{index:05d}.json"
+
+
+def partial_name(index: int) -> str:
+    return f"shards/{index:05d}.partial.json"
+
+
+def _has_result(prefix: str, index: int) -> bool:
+    return object_exists(prefix, shard_name(index)) or object_exists(prefix, partial_name(index))
+
+
+def shard_files(entries: List[Dict[str, Any]], max_bytes: int = None, max_files: int = None) -> List[Dict[str, Any]]:
+    """
+    Split tree entries ({'path', 'sha', 'size'}) into shards
+
+    Entries are taken in path order; a shard closes when the next file would
+    exceed max_bytes or max_files. A file larger than max_bytes gets a shard
+    of its own.
+    """
+    max_bytes = max_bytes or AUDIT_SHARD_BYTES
+    max_files = max_files or AUDIT_SHARD_FILES
+
+    shards, current, size = [], [], 0
+    for entry in sorted(entries, key=lambda e: e['path']):
+        if current and (size + entry['size'] > max_bytes or len(current) >= max_files):
+            shards.append(current)
+            current, size = [], 0
+        current.append(entry)
+        size += entry['size']
+    if current:
+        shards.append(current)
+
+    return [
+        {'shard': index, 'files': files, 'bytes': sum(f['size'] for f in files)}
+        for index, files in enumerate(shards)
+    ]
+
+
+class ManifestMismatch(ValueError):
+    """The audit prefix already holds results of a different shard plan"""
+
+
+def manifest_id(shards: List[Dict[str, Any]]) -> str:
+    """Identity of a shard plan: which blobs are in which shard"""
+    plan = [[(f['path'], f['sha']) for f in shard['files']] for shard in shards]
+    return hashlib.sha256(json.dumps(plan).encode('utf-8')).hexdigest()[:16]
+
+
+def build_manifest(repo_name: str, commit: str, entries: List[Dict[str, Any]], truncated: bool = False,
+                   **shard_limits) -> Dict[str, Any]:
+    """Shard plan of a commit; truncated marks a tree listing that missed entries"""
+    shards = shard_files(entries, **shard_limits)
+    return {
+        'manifest_id': manifest_id(shards),
+        'repo_name': repo_name,
+        'commit': commit,
+        'files': len(entries),
+        'bytes': sum(e['size'] for e in entries),
+        'shards': shards,
+        'truncated': truncated,
+        'created_at': time.time()
+    }
+
+
+def write_manifest(prefix: str, manifest: Dict[str, Any]):
+    write_object(prefix, MANIFEST, json.dumps(manifest).encode('utf-8'), 'application/json')
+
+
+def read_manifest(prefix: str) -> Dict[str, Any]:
+    return json.loads(read_object(prefix, MANIFEST))
+
+
+def plan_manifest(prefix: str, manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store the manifest of a (re)run and return the one in effect
+
+    The stored manifest is kept when it describes the same plan. A different
+    plan only replaces it while no shard has a result yet; otherwise results
+    of two plans would be mixed, so ManifestMismatch is raised.
+    """
+    if object_exists(prefix, MANIFEST):
+        stored = read_manifest(prefix)
+        if stored.get('manifest_id') == manifest['manifest_id']:
+            return stored
+        done = [s['shard'] for s in stored['shards'] if _has_result(prefix, s['shard'])]
+        if done:
+            raise ManifestMismatch(
+                f"{prefix} already has {len(done)} shard results for another shard plan "
+                f"({stored.get('manifest_id')} != {manifest['manifest_id']}; shard limits or review "
+                f"config changed). Audit into a new prefix or delete the old one."
+            )
+    write_manifest(prefix, manifest)
+    return manifest
+
+
+def _stored_result(prefix: str, manifest: Dict[str, Any], name: str) -> Dict[str, Any]:
+    result = json.loads(read_object(prefix, name))
+    if result.get('manifest_id') != manifest['manifest_id']:
+        raise ManifestMismatch(f"{prefix}/{name} belongs to shard plan {result.get('manifest_id')}, "
+                               f"not {manifest['manifest_id']}")
+    return result
+
+
+def audit_file(path: str, sha: str, read_content: Callable[[], str]) -> Dict[str, Any]:
+    """Parse metrics and static findings for one file (content read only on cache misses)"""
+    content = None
+
+    def source():
+        nonlocal content
+        if content is None:
+            content = read_content()
+        return content
+
+    parsed = blob_cache.get('parse', sha)
+    if parsed is None:
+        parsed = parse_python_file(source(), path)
+        if parsed:
+            blob_cache.put('parse', sha, {k: v for k, v in parsed.items() if k != 'filename'})
+    security, _ = blob_cache.get_or_compute('security', sha, lambda: analyze_source(source()))
+
+    if not parsed:
+        return {'file': path, 'sha': sha, 'error': 'parse failed', 'findings': []}
+
+    findings = [{'file': path, 'agent': 'security', 'source': 'static', **f} for f in security]
+    findings.extend(
+        {'file': path, 'agent': 'performance', 'source': 'static', **f}
+        for f in flatten(parsed.get('performance_findings', []))
+    )
+    return {
+        'file': path,
+        'sha': sha,
+        'metrics': parsed['metrics'],
+        'findings': findings,
+        'content': content
+    }
+
+
+def audit_shard(shard: Dict[str, Any], read_content: Callable[[Dict[str, Any]], str],
+                agent_runner: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+    """
+    Audit every file of a shard
+
+    read_content(entry) returns a file's source; agent_runner(file_results)
+    returns agent reviews ({'file', 'agent', 'review'}) for the shard.
+    """
+    started = time.perf_counter()
+    results, errors = [], []
+
+    for entry in shard['files']:
+        try:
+            result = audit_file(entry['path'], entry['sha'], lambda entry=entry: read_content(entry))
+        except Exception as e:
+            errors.append({'file': entry['path'], 'error': str(e)})
+            continue
+        if result.get('error'):
+            errors.append({'file': entry['path'], 'error': result['error']})
+        else:
+            results.append(result)
+
+    agent_reviews = []
+    if agent_runner:
+        try:
+            agent_reviews = agent_runner(results)
+        except Exception as e:
+            errors.append({'file': None, 'error': f"agents: {str(e)}"})
+
+    return {
+        'shard': shard['shard'],
+        'files': len(shard['files']),
+        'audited': len(results),
+        'lines_of_code': sum(r['metrics']['lines_of_code'] for r in results),
+        'complexity': {r['file']: r['metrics']['complexity'] for r in results},
+        'findings': [f for result in results for f in result['findings']],
+        'agent_reviews': agent_reviews,
+        'errors': errors,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def _merge_retry(previous: Dict[str, Any], retried: Dict[str, Any]) -> Dict[str, Any]:
+    """A partial shard result with its failed files audited again"""
+    return dict(
+        previous,
+        audited=previous['audited'] + retried['audited'],
+        lines_of_code=previous['lines_of_code'] + retried['lines_of_code'],
+        complexity={**previous['complexity'], **retried['complexity']},
+        findings=previous['findings'] + retried['findings'],
+        agent_reviews=previous.get('agent_reviews', []) + retried['agent_reviews'],
+        errors=retried['errors'],
+        retried=retried['files'],
+        seconds=round(previous['seconds'] + retried['seconds'], 3)
+    )
+
+
+def run_shard(prefix: str, manifest: Dict[str, Any], shard: Dict[str, Any], read_content,
+              agent_runner=None) -> Dict[str, Any]:
+    """
+    Audit a shard unless a previous run of the same plan already completed it
+
+    A result with errors is stored as partial. The next run audits only
+    the files that failed, or the whole shard if the agents failed (their
+    reviews cover every flagged file of the shard).
+    """
+    name = shard_name(shard['shard'])
+    if object_exists(prefix, name):
+        result = _stored_result(prefix, manifest, name)
+        result['resumed'] = True
+        return result
+
+    previous = None
+    if object_exists(prefix, partial_name(shard['shard'])):
+        previous = _stored_result(prefix, manifest, partial_name(shard['shard']))
+
+    if previous and all(e['file'] for e in previous['errors']):
+        failed = {e['file'] for e in previous['errors']}
+        retry = dict(shard, files=[f for f in shard['files'] if f['path'] in failed])
+        result = _merge_retry(previous, audit_shard(retry, read_content, agent_runner))
+    else:
+        result = audit_shard(shard, read_content, agent_runner)
+
+    result = dict(result, manifest_id=manifest['manifest_id'], partial=bool(result['errors']))
+    write_object(prefix, partial_name(shard['shard']) if result['partial'] else name,
+                 json.dumps(result).encode('utf-8'), 'application/json')
+    return result
+
+
+def audit_prefix(repo_name: str, commit: str, base: str = None) -> str:
+    """State prefix of one audit; keyed by commit so a rerun resumes"""
+    return f"{(base or AUDIT_PREFIX).rstrip('/')}/{repo_name}/{commit[:12]}"
+
+
+def pending_shards(prefix: str, manifest: Dict[str, Any]) -> List[int]:
+    """Shards without a complete result (partial ones are audited again)"""
+    return [s['shard'] for s in manifest['shards'] if not object_exists(prefix, shard_name(s['shard']))]
+
+
+def reduce_shards(manifest: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One report from all shard results (missing shards are listed, not fatal)"""
+    findings = sorted(
+        (f for r in results for f in r['findings']),
+        key=lambda f: (SEVERITY_ORDER.get(f.get('severity'), 9), f['file'], f.get('line', 0))
+    )
+    by_severity, by_rule, by_file = {}, {}, {}
+    for f in findings:
+        by_severity[f['severity']] = by_severity.get(f['severity'], 0) + 1
+        by_rule[f['rule']] = by_rule.get(f['rule'], 0) + 1
+        by_file[f['file']] = by_file.get(f['file'], 0) + 1
+
+    complexity = {}
+    for r in results:
+        complexity.update(r.get('complexity', {}))
+
+    done = {r['shard'] for r in results}
+    return {
+        'repo_name': manifest['repo_name'],
+        'commit': manifest['commit'],
+        'files': manifest['files'],
+        'audited': sum(r['audited'] for r in results),
+        'lines_of_code': sum(r['lines_of_code'] for r in results),
+        'shards': len(manifest['shards']),
+        'missing_shards': [s['shard'] for s in manifest['shards'] if s['shard'] not in done],
+        'partial_shards': [r['shard'] for r in results if r.get('partial')],
+        'truncated': manifest.get('truncated', False),
+        'errors': [e for r in results for e in r['errors']],
+        'agent_reviews': [review for r in results for review in r.get('agent_reviews', [])],
+        'shard_seconds': round(sum(r['seconds'] for r in results), 1),
+        'by_severity': by_severity,
+        'by_rule': dict(sorted(by_rule.items(), key=lambda item: -item[1])),
+        'top_files': sorted(by_file.items(), key=lambda item: -item[1])[:REPORT_TOP_FILES],
+        'most_complex': sorted(complexity.items(), key=lambda item: -item[1])[:REPORT_TOP_FILES],
+        'findings': findings
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Markdown summary of a reduced audit"""
+    lines = [
+        f"# 🛡️ Repository Audit: {report['repo_name']} @ {report['commit'][:12]}",
+        "",
+        f"- **Files audited:** {report['audited']}/{report['files']} ({report['lines_of_code']} lines of code)",
+        f"- **Shards:** {report['shards'] - len(report['missing_shards'])}/{report['shards']}"
+        + (f" (missing: {report['missing_shards']})" if report['missing_shards'] else "")
+        + (f" (partial: {report['partial_shards']})" if report.get('partial_shards') else ""),
+        f"- **Findings:** {len(report['findings'])} "
+        + ", ".join(f"{severity}: {report['by_severity'][severity]}"
+                    for severity in sorted(report['by_severity'], key=lambda s: SEVERITY_ORDER.get(s, 9))),
+        f"- **Agent reviews:** {len(report['agent_reviews'])}",
+        f"- **Errors:** {len(report['errors'])}",
+        ""
+    ]
+    if report.get('truncated'):
+        lines.extend(["> ⚠️ GitHub truncated the tree listing: files missing from it were not audited.", ""])
+    lines.extend(["## Findings by Rule", ""])
+    lines.extend(f"- `{rule}`: {count}" for rule, count in report['by_rule'].items())
+    lines.extend(["", "## Files with Most Findings", ""])
+    lines.extend(f"- `{path}`: {count}" for path, count in report['top_files'])
+    lines.extend(["", "## Critical and High Findings", ""])
+    lines.extend(
+        f"- `{f['file']}` L{f.get('line')} [{f['severity'].upper()}] `{f['rule']}`: {f['message']}"
+        for f in report['findings'] if f['severity'] in ('critical', 'high')
+    )
+    return "\n".join(lines) + "\n"
+
+
+def store_report(prefix: str, report: Dict[str, Any]) -> Dict[str, str]:
+    write_object(prefix, 'report.json', json.dumps(report).encode('utf-8'), 'application/json')
+    write_object(prefix, 'report.md', format_report(report).encode('utf-8'), 'text/markdown')
+    return {'report_json': 'report.json', 'report_md': 'report.md'}
+
+
+def load_results(prefix: str, manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Stored result of every shard: the complete one, else the partial one"""
+    results = []
+    for shard in manifest['shards']:
+        for name in (shard_name(shard['shard']), partial_name(shard['shard'])):
+            if object_exists(prefix, name):
+                results.append(_stored_result(prefix, manifest, name))
+                break
+    return results
@@ -0,0 +1,240 @@
+"""
+Request policy for model calls: timeouts, jittered retries and hedging
+
+Wraps any zero-argument callable (e.g. a generate_content call) with:
+- a per-call deadline,
+- full-jitter exponential retries for retryable errors (429/5xx/timeouts),
+- optional hedging: if the first request has not answered after the
+  observed p95 latency, a duplicate is issued and the first answer wins.
+
+Every call returns a report with per-attempt timings so agents can surface
+where the time went.
+
+The policy owns retries: calls it runs see policy_active() and gemini_client
+then sends without urllib3 transport retries, so one call makes at most
+MAX_ATTEMPTS (x2 with hedging) HTTP requests. Losing or timed-out requests
+cannot be interrupted; they are cancelled if not started yet, otherwise
+tracked until they finish, and no hedge is sent while MAX_ABANDONED of them
+still hold workers of the shared pool.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Tuple
+
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get('MODEL_TIMEOUT_SECONDS', '60'))
+MAX_ATTEMPTS = int(os.environ.get('MODEL_MAX_ATTEMPTS', '3'))
+BACKOFF_BASE_SECONDS = float(os.environ.get('MODEL_BACKOFF_BASE_SECONDS', '1.0'))
+BACKOFF_MAX_SECONDS = float(os.environ.get('MODEL_BACKOFF_MAX_SECONDS', '20'))
+HEDGING_ENABLED = os.environ.get('MODEL_HEDGING', 'false').lower() == 'true'
+HEDGE_PERCENTILE = float(os.environ.get('MODEL_HEDGE_PERCENTILE', '95'))
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.environ.get('MODEL_HEDGE_DEFAULT_DELAY_SECONDS', '15'))
+HEDGE_MIN_DELAY_SECONDS = 1.0
+HEDGE_MIN_SAMPLES = 20
+POOL_WORKERS = 8
+MAX_ABANDONED = POOL_WORKERS // 2
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    'RequestTimeout', 'TimeoutError', 'DeadlineExceeded', 'ResourceExhausted',
+    'ServiceUnavailable', 'InternalServerError', 'TooManyRequests', 'GatewayTimeout',
+    'ConnectionError', 'ProtocolError', 'ReadTimeoutError', 'MaxRetryError', 'NewConnectionError'
+}
+
+# Successful call latencies (seconds) in this container, used for the hedge delay
+_latencies = deque(maxlen=200)
+_latencies_lock = threading.Lock()
+
+# Shared pool; abandoned (timed-out/losing) requests finish in the background
+_executor = ThreadPoolExecutor(max_workers=POOL_WORKERS, thread_name_prefix='model-request')
+_abandoned = set()
+_abandoned_lock = threading.Lock()
+_local = threading.local()
+
+
+class RequestTimeout(Exception):
+    """Raised when no attempt answered before the per-call deadline"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """Decide whether a failed model call is worth retrying"""
+    for attr in ('status', 'code', 'status_code'):
+        value = getattr(error, attr, None)
+        value = getattr(value, 'value', value)  # grpc/http enum codes
+        if isinstance(value, int) and value in RETRYABLE_STATUSES:
+            return True
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def policy_active() -> bool:
+    """True inside a call made by call_with_policy (transport clients should not retry)"""
+    return getattr(_local, 'active', False)
+
+
+def _call_in_policy(fn: Callable[[], Any]) -> Any:
+    _local.active = True
+    try:
+        return fn()
+    finally:
+        _local.active = False
+
+
+def _abandon(futures):
+    """Cancel requests nobody waits for; track the ones already running"""
+    for future in futures:
+        if future.cancel():
+            continue
+        with _abandoned_lock:
+            _abandoned.add(future)
+        future.add_done_callback(_forget)
+
+
+def _forget(future):
+    with _abandoned_lock:
+        _abandoned.discard(future)
+
+
+def abandoned_requests() -> int:
+    """Losing or timed-out requests still occupying pool workers"""
+    with _abandoned_lock:
+        return len(_abandoned)
+
+
+def record_latency(seconds: float):
+    with _latencies_lock:
+        _latencies.append(seconds)
+
+
+def hedge_delay() -> float:
+    """p95 of observed latencies, or a conservative default until enough samples exist"""
+    with _latencies_lock:
+        samples = sorted(_latencies)
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY_SECONDS
+    index = min(len(samples) - 1, int(len(samples) * HEDGE_PERCENTILE / 100))
+    return max(samples[index], HEDGE_MIN_DELAY_SECONDS)
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given (1-based) attempt"""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** (attempt - 1))))
+
+
+def _run_attempt(fn: Callable[[], Any], attempt: int, timeout: float, hedge: bool,
+                 report: Dict[str, Any]) -> Any:
+    start = time.perf_counter()
+    deadline = start + timeout
+    futures = {_executor.submit(_call_in_policy, fn): False}
+
+    if hedge:
+        done, _ = wait(futures, timeout=min(hedge_delay(), timeout))
+        if not done:
+            if abandoned_requests() < MAX_ABANDONED:
+                futures[_executor.submit(_call_in_policy, fn)] = True
+            else:
+                report["hedges_skipped"] = report.get("hedges_skipped", 0) + 1
+
+    pending = set(futures)
+    last_error = None
+
+    while pending:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            elapsed = time.perf_counter() - start
+            entry = {
+                "attempt": attempt,
+                "hedged": futures[future],
+                "duration_ms": round(elapsed * 1000, 1)
+            }
+            error = future.exception()
+            if error is None:
+                entry["outcome"] = "success"
+                report["attempts"].append(entry)
+                for loser in pending:
+                    report["attempts"].append({
+                        "attempt": attempt,
+                        "hedged": futures[loser],
+                        "duration_ms": entry["duration_ms"],
+                        "outcome": "abandoned"
+                    })
+                record_latency(elapsed)
+                _abandon(pending)
+                return future.result()
+
+            entry["outcome"] = "error"
+            entry["error"] = f"{type(error).__name__}: {str(error)[:200]}"
+            report["attempts"].append(entry)
+            last_error = error
+
+    for future in pending:
+        report["attempts"].append({
+            "attempt": attempt,
+            "hedged": futures[future],
+            "duration_ms": round(timeout * 1000, 1),
+            "outcome": "timeout"
+        })
+    _abandon(pending)
+
+    if last_error is not None and not pending:
+        raise last_error
+    raise RequestTimeout(f"No response within {timeout:.0f}s")
+
+
+def call_with_policy(fn: Callable[[], Any], timeout: float = None, max_attempts: int = None,
+                     hedge: bool = None) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Call fn under the request policy
+
+    Returns:
+        (result, report) where report = {'attempts': [...], 'total_ms': float}
+
+    Raises the last error once attempts are exhausted (or immediately for
+    non-retryable errors); the report is attached as `error.policy_report`.
+    """
+    timeout = timeout or REQUEST_TIMEOUT_SECONDS
+    max_attempts = max_attempts or MAX_ATTEMPTS
+    hedge = HEDGING_ENABLED if hedge is None else hedge
+
+    report = {"attempts": []}
+    start = time.perf_counter()
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            result = _run_attempt(fn, attempt, timeout, hedge, report)
+            report["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            return result, report
+        except Exception as e:
+            if attempt == max_attempts or not is_retryable(e):
+                report["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                e.policy_report = report
+                raise
+            delay = backoff_seconds(attempt)
+            print(f"🔁 Retrying model call in {delay:.1f}s after {type(e).__name__} (attempt {attempt}/{max_attempts})")
+            time.sleep(delay)
+
+
+def summarize_reports(reports) -> Dict[str, Any]:
+    """Aggregate per-call reports into agent-level request statistics"""
+    reports = [r for r in reports if r]
+    attempts = [a for r in reports for a in r.get('attempts', [])]
+    total_ms = [r.get('total_ms', 0) for r in reports]
+
+    return {
+        "calls": len(reports),
+        "attempts": len(attempts),
+        "retries": len({(i, a['attempt']) for i, r in enumerate(reports) for a in r['attempts']}) - len(reports),
+        "hedges": sum(1 for a in attempts if a.get('hedged')),
+        "hedge_wins": sum(1 for a in attempts if a.get('hedged') and a.get('outcome') == 'success'),
+        "hedges_skipped": sum(r.get('hedges_skipped', 0) for r in reports),
+        "timeouts": sum(1 for a in attempts if a.get('outcome') == 'timeout'),
+        "max_call_ms": max(total_ms, default=0),
+        "total_call_ms": round(sum(total_ms), 1)
+    }
@@ -1,15 +1,16 @@
 import json
-import os
-import boto3
 import uuid
 from datetime import datetime
 from decimal import Decimal
-
-# Initialize clients
-dynamodb = boto3.resource('dynamodb')
-
-REVIEWS_TABLE = os.environ.get('REVIEWS_TABLE', 'CodeReviews')
-reviews_table = dynamodb.Table(REVIEWS_TABLE)
+from lambda_startup import get_table, log_startup, pre_init
+from review_coalescing import check_superseded
+from context_cache import release_caches
+from model_router import summarize_routing
+from agent_results import agent_review
+from incremental_review import (build_file_results, carried_forward_reviews, file_results_key, load_file_results,
+                                merge_findings, status_counts, store_file_results)
+from findings import ReportWriter, dedupe_findings, strip_static_sections, write_findings_section
+from review_store import REVIEW_BODY_STORAGE, REVIEWS_TABLE, record_review_stats, review_key, store_review_body
 
 def lambda_handler(event, context):
     """Aggregate reviews from all agents into a single formatted report"""
@@ -17,6 +18,12 @@ def lambda_handler(event, context):
     print("=" * 60)
     print("📊 REVIEW AGGREGATOR Started")
     print("=" * 60)
+    log_startup("ReviewAggregator")
+    
+    # A newer push to the PR makes this execution stale
+    superseded = check_superseded(event, "ReviewAggregator")
+    if superseded:
+        return superseded
     
     try:
         # Get agent results
@@ -37,53 +44,130 @@ def lambda_handler(event, context):
         performance_error = performance.get('error', False)
         best_practices_error = best_practices.get('error', False)
         
+        # Model routing decisions across all agents
+        routing = {
+            'security': security.get('routing', []),
+            'performance': performance.get('routing', []),
+            'best_practices': best_practices.get('routing', [])
+        }
+        routing_summary = summarize_routing([r for decisions in routing.values() for r in decisions])
+        
+        # Incremental re-review: carry unchanged files forward and track finding status
+        uploaded_files = event.get('uploaded_files', [])
+        incremental = event.get('incremental')
+        agent_results = {'security': security, 'performance': performance, 'best_practices': best_practices}
+        findings = security.get('findings', []) + performance.get('findings', []) + best_practices.get('findings', [])
+        previous_results = {}
+        incremental_summary = None
+        carried_sections = {}
+        
+        if incremental:
+            previous_results = load_file_results(incremental['file_results_key'])
+            findings = merge_findings(findings, previous_results, incremental)
+            for agent, result in agent_results.items():
+                carried = carried_forward_reviews(agent, incremental, previous_results)
+                if carried and not result.get('error'):
+                    carried_sections[agent] = carried
+            incremental_summary = dict(
+                status_counts(findings),
+                previous_review_id=incremental.get('previous_review_id'),
+                changed_files=len(incremental['changed']),
+                unchanged_files=len(incremental['unchanged']),
+                removed_files=len(incremental['removed'])
+            )
+            print(f"🔁 Findings: {incremental_summary['new']} new, {incremental_summary['still_open']} still open, "
+                  f"{incremental_summary['fixed']} fixed")
+        
         # Calculate totals
         total_tokens = security.get('tokens', 0) + performance.get('tokens', 0) + best_practices.get('tokens', 0)
         total_cost = security.get('cost', 0) + performance.get('cost', 0) + best_practices.get('cost', 0)
         
+        # Findings flagged by several agents are reported once
+        merged_findings = dedupe_findings(findings)
+        
         # Format combined review
-        combined_review = format_combined_review(
+        combined_review, section_stats = format_combined_review(
             security, 
             performance, 
             best_practices,
             parse_statistics,
             context_statistics,
             total_tokens,
-            total_cost
+            total_cost,
+            routing_summary,
+            incremental_summary,
+            merged_findings,
+            carried_sections
         )
+        findings_summary = dict(
+            section_stats,
+            reported=sum(1 for f in findings if f.get('status') != 'fixed'),
+            merged=len(merged_findings),
+            by_severity={severity: sum(1 for f in merged_findings if f['severity'] == severity)
+                         for severity in ('critical', 'high', 'medium', 'low')},
+            review_chars=len(combined_review)
+        )
+        print(f"🧭 Findings: {findings_summary['reported']} reported -> {len(merged_findings)} merged, "
+              f"{section_stats['collapsed']} collapsed; review is {len(combined_review):,} chars")
         
         # Generate review ID
         review_id = f"review_{uuid.uuid4().hex[:12]}"
         timestamp = datetime.utcnow().isoformat() + 'Z'
         
+        # Per-file results let the next push re-review only what changed
+        results_key = file_results_key(repo_name, pr_number, review_id)
+        if uploaded_files:
+            store_file_results(results_key, build_file_results(uploaded_files, agent_results, findings, previous_results))
+        
+        # The body goes to S3 (gzip); the item keeps metadata and a pointer
+        review_body = None
+        if REVIEW_BODY_STORAGE == 's3':
+            try:
+                review_body = store_review_body(repo_name, pr_number, review_id, combined_review)
+                print(f"🗜️  Review body: {review_body['bytes']:,} -> {review_body['stored_bytes']:,} bytes "
+                      f"at {review_body['s3_key']}")
+            except Exception as e:
+                print(f"⚠️  Could not store review body in S3, keeping it inline: {str(e)}")
+        
         # Store in DynamoDB
         review_item = {
             'review_id': review_id,
             'timestamp': timestamp,
             'repo_name': repo_name,
             'pr_number': pr_number,
-            'combined_review': combined_review,
+            # (repo_name, review_key) keys the table or its repo GSI: a PR's reviews in time order
+            'review_key': review_key(pr_number, timestamp, review_id),
             'agent_results': {
                 'security': {
                     'tokens': security.get('tokens', 0),
                     'cost': float(security.get('cost', 0)),
-                    'error': security_error
+                    'error': security_error,
+                    'request_stats': to_dynamodb(security.get('request_stats', {})),
+                    'routing': summarize_routing(security.get('routing'))
                 },
                 'performance': {
                     'tokens': performance.get('tokens', 0),
                     'cost': float(performance.get('cost', 0)),
-                    'error': performance_error
+                    'error': performance_error,
+                    'request_stats': to_dynamodb(performance.get('request_stats', {})),
+                    'routing': summarize_routing(performance.get('routing'))
                 },
                 'best_practices': {
                     'tokens': best_practices.get('tokens', 0),
                     'cost': float(best_practices.get('cost', 0)),
-                    'error': best_practices_error
+                    'error': best_practices_error,
+                    'request_stats': to_dynamodb(best_practices.get('request_stats', {})),
+                    'routing': summarize_routing(best_practices.get('routing'))
                 }
             },
             'totals': {
                 'tokens': total_tokens,
                 'cost': float(total_cost)
             },
+            'routing': to_dynamodb(routing),
+            'routing_summary': routing_summary,
+            'incremental': incremental_summary,
+            'findings_summary': findings_summary,
             'statistics': {
                 'parsed_files': parse_statistics.get('parsed_files', 0),
                 'total_functions': parse_statistics.get('total_functions', 0),
@@ -92,9 +176,29 @@ def lambda_handler(event, context):
             }
         }
         
-        reviews_table.put_item(Item=review_item)
+        # Only reviews with per-file results can seed an incremental review (no NULL placeholder)
+        if uploaded_files:
+            review_item['file_results_key'] = results_key
+        
+        if review_body:
+            review_item['review_body'] = review_body
+        else:
+            review_item['combined_review'] = combined_review
+        
+        get_table(REVIEWS_TABLE).put_item(Item=review_item)
         
         print(f"✅ Review stored: {review_id}")
+        
+        try:
+            record_review_stats(repo_name, pr_number, timestamp, review_item['totals'], findings_summary)
+        except Exception as e:
+            print(f"⚠️  Could not update repo stats: {str(e)}")
+        
+        # Review is finished - expire the shared per-file agent contexts
+        context_caches = event.get('context_caches', {})
+        if context_caches:
+            released = release_caches(context_caches)
+            print(f"🧊 Released {released}/{len(context_caches)} context caches")
         print(f"📊 Total tokens: {total_tokens}")
         print(f"💰 Total cost: ${total_cost:.4f}")
         
@@ -105,12 +209,17 @@ def lambda_handler(event, context):
         return {
             "statusCode": 200,
             "review_id": review_id,
-            "combined_review": combined_review,
+            # With a stored body, PostComment loads it from S3 (keeps the state payload small)
+            "review_body": review_body,
+            "combined_review": None if review_body else combined_review,
             "timestamp": timestamp,
             "totals": {
                 "tokens": total_tokens,
                 "cost": total_cost
-            }
+            },
+            "routing_summary": routing_summary,
+            "incremental": incremental_summary,
+            "findings_summary": findings_summary
         }
         
     except Exception as e:
@@ -124,11 +233,57 @@ def lambda_handler(event, context):
         }
 
 
-def format_combined_review(security, performance, best_practices, parse_stats, context_stats, total_tokens, total_cost):
-    """Format all agent reviews into a single markdown report"""
+def to_dynamodb(value):
+    """Convert floats in nested JSON-like data to Decimal for DynamoDB"""
+    return json.loads(json.dumps(value), parse_float=Decimal)
+
+
+def format_routing_line(routing_summary):
+    """Markdown bullet describing how agent reviews were routed across model tiers"""
+    if not routing_summary or not any(routing_summary.values()):
+        return ""
+    return (f"- **Model Routing:** {routing_summary.get('deep', 0)} full model, "
+            f"{routing_summary.get('fast', 0)} fast tier, {routing_summary.get('static', 0)} static-only\n")
+
+
+def format_incremental_section(incremental_summary):
+    """Markdown section comparing findings with the previous review of the PR"""
+    if not incremental_summary:
+        return ""
+    return f"""
+### 🔁 Incremental Review
+- **Compared With:** {incremental_summary.get('previous_review_id')}
+- **Files:** {incremental_summary.get('changed_files', 0)} re-reviewed, {incremental_summary.get('unchanged_files', 0)} unchanged, {incremental_summary.get('removed_files', 0)} removed
+- **Findings:** 🆕 {incremental_summary.get('new', 0)} new, ⏳ {incremental_summary.get('still_open', 0)} still open, ✅ {incremental_summary.get('fixed', 0)} fixed
+"""
+
+
+AGENT_SECTIONS = (
+    ('security', "## 🔒 SECURITY ANALYSIS", "Security analysis", "No security review available"),
+    ('performance', "## ⚡ PERFORMANCE ANALYSIS", "Performance analysis", "No performance review available"),
+    ('best_practices', "## 📚 BEST PRACTICES ANALYSIS", "Best practices analysis", "No best practices review available")
+)
+
+
+def format_combined_review(security, performance, best_practices, parse_stats, context_stats, total_tokens, total_cost,
+                           routing_summary=None, incremental_summary=None, merged_findings=None,
+                           carried_sections=None):
+    """
+    Format all agent reviews into a single markdown report
+
+    Each agent section is assembled from its file_reviews, followed by the
+    carried-forward reviews of unchanged files. Merged findings (static and
+    model, across agents) are listed once up front; agent sections hold the
+    model summaries, and their static findings blocks are dropped.
+
+    Returns:
+        (report, findings_section_stats)
+    """
+    
+    writer = ReportWriter()
     
     # Header
-    report = f"""## 🎯 Code Analysis Summary
+    writer.write(f"""## 🎯 Code Analysis Summary
 
 **Analysis Completed:** {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}
 
@@ -145,61 +300,32 @@ def format_combined_review(security, performance, best_practices, parse_stats, c
 ### 💰 Analysis Metrics
 - **Total Tokens:** {total_tokens:,}
 - **Total Cost:** ${total_cost:.4f} (FREE with Gemini! 🎉)
-
----
-
-"""
-    
-    # Security Review
-    if security.get('error'):
-        report += f"""## 🔒 SECURITY ANALYSIS
-
-⚠️ Security analysis encountered an error: {security.get('review', 'Unknown error')}
-
----
-
-"""
-    else:
-        report += f"""{security.get('review', 'No security review available')}
-
+{format_routing_line(routing_summary)}{format_incremental_section(incremental_summary)}
 ---
 
-"""
+""")
     
-    # Performance Review
-    if performance.get('error'):
-        report += f"""## ⚡ PERFORMANCE ANALYSIS
-
-⚠️ Performance analysis encountered an error: {performance.get('review', 'Unknown error')}
-
----
-
-"""
-    else:
-        report += f"""{performance.get('review', 'No performance review available')}
-
----
-
-"""
+    section_stats = write_findings_section(writer, merged_findings or [])
     
-    # Best Practices Review
-    if best_practices.get('error'):
-        report += f"""## 📚 BEST PRACTICES ANALYSIS
-
-⚠️ Best practices analysis encountered an error: {best_practices.get('review', 'Unknown error')}
-
----
-
-"""
-    else:
-        report += f"""{best_practices.get('review', 'No best practices review available')}
-
----
-
-"""
+    # Agent reviews
+    results = {'security': security, 'performance': performance, 'best_practices': best_practices}
+    for agent, heading, label, missing in AGENT_SECTIONS:
+        result = results[agent]
+        if result.get('error'):
+            writer.write(f"{heading}\n\n⚠️ {label} encountered an error: {result.get('message', 'Unknown error')}\n\n---\n\n")
+            continue
+        if not result.get('file_reviews') and not (carried_sections or {}).get(agent):
+            writer.write(f"{heading}\n\n{missing}\n\n---\n\n")
+            continue
+        review = agent_review(agent, result)
+        if (carried_sections or {}).get(agent):
+            review = f"{review}\n\n{carried_sections[agent]}"
+        if merged_findings:
+            review = strip_static_sections(review)
+        writer.write(f"{review}\n\n---\n\n")
     
     # Footer
-    report += f"""## 📝 Next Steps
+    writer.write("""## 📝 Next Steps
 
 1. Review the issues identified above, prioritizing by severity
 2. Focus on 🔴 CRITICAL and 🟠 HIGH severity issues first
@@ -210,6 +336,9 @@ def format_combined_review(security, performance, best_practices, parse_stats, c
 
 **🤖 Powered by AI Code Review Platform**  
 *Using Google Gemini 2.5 Flash - 100% Free!*
-"""
+""")
     
-    return report
+    return writer.getvalue(), section_stats
+
+
+pre_init(lambda: get_table(REVIEWS_TABLE))
@@ -0,0 +1,92 @@
+import json
+import os
+from lambda_startup import get_client, log_startup, pre_init
+from job_queue import DEFER_DELAY_SECONDS, REGION, get_queue, running_by_tenant, start_review
+from review_scheduler import MAX_REVIEWS_PER_TENANT, FairScheduler, load_fair_state, save_fair_state
+
+# Global cap on concurrently running CodeReviewOrchestrator executions
+MAX_CONCURRENT_REVIEWS = int(os.environ.get('MAX_CONCURRENT_REVIEWS', '5'))
+
+def lambda_handler(event, context):
+    """Start queued review jobs fairly across repos without exceeding concurrency caps"""
+    
+    print("=" * 60)
+    print("🚦 REVIEW DISPATCHER")
+    print("=" * 60)
+    log_startup("ReviewDispatcher")
+    
+    records = event.get('Records', [])
+    failures = []
+    started = 0
+    deferred = 0
+    
+    try:
+        running = running_by_tenant()
+    except Exception as e:
+        # Without a count nothing can be started safely - retry the whole batch later
+        print(f"❌ Could not count running executions: {str(e)}")
+        return {"batchItemFailures": [{"itemIdentifier": r['messageId']} for r in records]}
+    
+    scheduler = FairScheduler(max_running=MAX_CONCURRENT_REVIEWS, tenant_limit=MAX_REVIEWS_PER_TENANT)
+    scheduler.seed_running(running)
+    
+    jobs = []
+    for record in records:
+        try:
+            job = json.loads(record['body'])
+            jobs.append((job, record, job['repo_name']))
+        except (ValueError, KeyError) as e:
+            print(f"❌ Dropping malformed job {record['messageId']}: {str(e)}")
+    
+    # Virtual time carries over from earlier batches; without it each batch is fair on its own
+    try:
+        scheduler.restore(**load_fair_state(repo for _, _, repo in jobs))
+    except Exception as e:
+        print(f"⚠️  Could not load fair-queue state: {str(e)}")
+    
+    for job, record, _ in jobs:
+        scheduler.submit(job, item=record)
+    
+    print(f"📋 {len(records)} queued jobs, {scheduler.total_running()}/{MAX_CONCURRENT_REVIEWS} reviews running")
+    
+    while True:
+        record = scheduler.next_job()
+        if record is None:
+            break
+        
+        job = json.loads(record['body'])
+        print(f"🔀 PR #{job['pr_number']} in {job['repo_name']} ({job.get('changed_files', 0)} files)")
+        
+        try:
+            result = start_review(job)
+            if result['status'] == 'started':
+                started += 1
+            else:
+                scheduler.complete(job)
+        except Exception as e:
+            print(f"❌ Failed to start job {record['messageId']}: {str(e)}")
+            scheduler.complete(job)
+            failures.append({"itemIdentifier": record['messageId']})
+    
+    # Backpressure: jobs over the global or per-tenant caps go back on the queue as new,
+    # delayed messages - a batch item failure would count toward maxReceiveCount
+    for record in scheduler.pending():
+        try:
+            get_queue().send(json.loads(record['body']), delay_seconds=DEFER_DELAY_SECONDS)
+            deferred += 1
+        except Exception as e:
+            print(f"⚠️  Could not re-enqueue job {record['messageId']}, leaving it on the queue: {str(e)}")
+            failures.append({"itemIdentifier": record['messageId']})
+    
+    try:
+        save_fair_state(scheduler)
+    except Exception as e:
+        print(f"⚠️  Could not save fair-queue state: {str(e)}")
+    
+    scheduler.log_metrics()
+    print(f"✅ Started {started}, deferred {deferred}, failed {len(failures)}")
+    
+    return {"batchItemFailures": failures}
+
+
+pre_init(lambda: get_client('stepfunctions', region_name=REGION))
@@ -0,0 +1,67 @@
+import json
+from lambda_startup import get_table, log_startup, pre_init
+from review_store import REVIEWS_TABLE, latest_review, repo_stats, review_history
+
+def response(status, body):
+    return {
+        'statusCode': status,
+        'headers': {'Content-Type': 'application/json'},
+        'body': json.dumps(body)
+    }
+
+
+def lambda_handler(event, context):
+    """Review history API: paginated history, latest review of a PR, per-repo stats"""
+    
+    print("=" * 60)
+    print("📚 REVIEW HISTORY")
+    print("=" * 60)
+    log_startup("ReviewHistory")
+    
+    # API Gateway query string, or direct invocation fields
+    params = dict(event.get('queryStringParameters') or {}, **{
+        key: event[key] for key in ('action', 'repo', 'pr', 'limit', 'cursor') if key in event
+    })
+    action = params.get('action', 'history')
+    repo_name = params.get('repo')
+    
+    if not repo_name:
+        return response(400, {'error': 'Missing required parameter: repo'})
+    
+    try:
+        pr_number = int(params['pr']) if params.get('pr') not in (None, '') else None
+        limit = int(params.get('limit', 20))
+    except ValueError:
+        return response(400, {'error': 'pr and limit must be integers'})
+    
+    print(f"📋 {action} for {repo_name}" + (f" PR #{pr_number}" if pr_number is not None else ""))
+    
+    try:
+        if action == 'history':
+            return response(200, review_history(repo_name, pr_number, limit, params.get('cursor')))
+        
+        if action == 'latest':
+            if pr_number is None:
+                return response(400, {'error': 'Missing required parameter: pr'})
+            review = latest_review(repo_name, pr_number)
+            if not review:
+                return response(404, {'error': f"No review for {repo_name} PR #{pr_number}"})
+            return response(200, review)
+        
+        if action == 'stats':
+            stats = repo_stats(repo_name)
+            if not stats:
+                return response(404, {'error': f"No reviews for {repo_name}"})
+            return response(200, stats)
+        
+        return response(400, {'error': f"Unknown action: {action}"})
+    
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        
+        return response(500, {'error': str(e)})
+
+
+pre_init(lambda: get_table(REVIEWS_TABLE))
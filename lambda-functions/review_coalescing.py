@@ -0,0 +1,228 @@
+"""
+Per-PR coalescing and idempotent delivery of review executions
+
+The github_events table holds one state item per PR (`pr#<repo>#<number>`)
+recording the newest head SHA and the execution reviewing it:
+    - the webhook handler claims the head SHA, stops the execution of any
+      older head SHA and passes a debounce delay to the state machine; an
+      event for the same head after the window is still coalesced while
+      the recorded execution runs (it is re-attached to the new claim),
+    - every stage calls check_superseded() first and returns immediately
+      when a newer push has taken over the PR.
+
+Before starting an execution the handler also conditionally writes
+`delivery#<X-GitHub-Delivery>` and `head#<repo>#<number>#<sha>` items, so
+webhook redeliveries and repeated events for a reviewed head start nothing.
+All items carry an `expires_at` TTL attribute.
+"""
+
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from lambda_startup import get_client, get_table
+
+REVIEW_COALESCING = os.environ.get('REVIEW_COALESCING', 'false').lower() == 'true'
+EVENTS_TABLE = os.environ.get('EVENTS_TABLE', 'github_events')
+EVENTS_TABLE_KEY = os.environ.get('EVENTS_TABLE_KEY', 'event_id')
+COALESCE_WINDOW_SECONDS = int(os.environ.get('COALESCE_WINDOW_SECONDS', '30'))
+WEBHOOK_DEDUP = os.environ.get('WEBHOOK_DEDUP', 'true').lower() == 'true'
+DEDUP_TTL_SECONDS = int(os.environ.get('DEDUP_TTL_SECONDS', str(7 * 24 * 3600)))
+REGION = 'ap-south-2'
+
+
+def pr_state_key(repo_name: str, pr_number: int) -> str:
+    return f"pr#{repo_name}#{pr_number}"
+
+
+def claim_head(repo_name: str, pr_number: int, head_sha: str) -> Tuple[bool, Dict[str, Any]]:
+    """
+    Record head_sha as the PR's newest head
+
+    Returns:
+        (claimed, previous_state). claimed is False when the same head SHA
+        was claimed within the coalescing window (the event is coalesced).
+    """
+    table = get_table(EVENTS_TABLE)
+    now = int(time.time())
+
+    try:
+        response = table.put_item(
+            Item={
+                EVENTS_TABLE_KEY: pr_state_key(repo_name, pr_number),
+                'head_sha': head_sha,
+                'claimed_at': now,
+                'expires_at': now + DEDUP_TTL_SECONDS
+            },
+            ConditionExpression='attribute_not_exists(head_sha) OR head_sha <> :sha OR claimed_at < :window_start',
+            ExpressionAttributeValues={':sha': head_sha, ':window_start': now - COALESCE_WINDOW_SECONDS},
+            ReturnValues='ALL_OLD'
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False, {}
+
+    return True, response.get('Attributes', {})
+
+
+def release_head(repo_name: str, pr_number: int, head_sha: str):
+    """Undo claim_head when the execution could not be started, so a retry is not coalesced"""
+    table = get_table(EVENTS_TABLE)
+    try:
+        table.delete_item(
+            Key={EVENTS_TABLE_KEY: pr_state_key(repo_name, pr_number)},
+            ConditionExpression='head_sha = :sha AND attribute_not_exists(execution_arn)',
+            ExpressionAttributeValues={':sha': head_sha}
+        )
+    except Exception as e:
+        print(f"⚠️  Could not release head {head_sha[:7]}: {str(e)}")
+
+
+def delivery_key(delivery_id: str) -> str:
+    return f"delivery#{delivery_id}"
+
+
+def head_key(repo_name: str, pr_number: int, head_sha: str) -> str:
+    return f"head#{repo_name}#{pr_number}#{head_sha}"
+
+
+def claim_event(key: str, **attributes) -> bool:
+    """
+    Conditionally record an event key
+
+    Returns False when the key is already recorded and not yet expired
+    (TTL deletion can lag, so expiry is checked in the condition too).
+    """
+    table = get_table(EVENTS_TABLE)
+    now = int(time.time())
+
+    try:
+        table.put_item(
+            Item={
+                EVENTS_TABLE_KEY: key,
+                'created_at': now,
+                'expires_at': now + DEDUP_TTL_SECONDS,
+                **attributes
+            },
+            ConditionExpression='attribute_not_exists(#key) OR expires_at < :now',
+            ExpressionAttributeNames={'#key': EVENTS_TABLE_KEY},
+            ExpressionAttributeValues={':now': now}
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def release_events(keys: List[str]):
+    """Forget claimed keys (the execution did not start, so a redelivery may retry)"""
+    table = get_table(EVENTS_TABLE)
+    for key in keys:
+        try:
+            table.delete_item(Key={EVENTS_TABLE_KEY: key})
+        except Exception as e:
+            print(f"⚠️  Could not release {key}: {str(e)}")
+
+
+def claim_delivery(delivery_id: str, repo_name: str, pr_number: int, head_sha: str,
+                   check_head: bool = True) -> Tuple[Optional[str], List[str]]:
+    """
+    Idempotency check before starting a review
+
+    Returns:
+        (duplicate, claimed_keys) where duplicate is 'delivery' or 'head'
+        for repeated events and None otherwise. Storage errors never block
+        a review.
+    """
+    checks = []
+    if delivery_id:
+        checks.append(('delivery', delivery_key(delivery_id)))
+    if check_head and head_sha:
+        checks.append(('head', head_key(repo_name, pr_number, head_sha)))
+
+    claimed = []
+    for kind, key in checks:
+        try:
+            if not claim_event(key, repo_name=repo_name, pr_number=pr_number, head_sha=head_sha):
+                return kind, claimed
+            claimed.append(key)
+        except Exception as e:
+            print(f"⚠️  Dedup check failed for {key}, continuing: {str(e)}")
+
+    return None, claimed
+
+
+def record_execution(repo_name: str, pr_number: int, head_sha: str, execution_arn: str) -> bool:
+    """Attach the execution to the PR state; False if a newer head claimed the PR meanwhile"""
+    table = get_table(EVENTS_TABLE)
+    try:
+        table.update_item(
+            Key={EVENTS_TABLE_KEY: pr_state_key(repo_name, pr_number)},
+            UpdateExpression='SET execution_arn = :arn',
+            ConditionExpression='head_sha = :sha',
+            ExpressionAttributeValues={':arn': execution_arn, ':sha': head_sha}
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def stop_superseded(execution_arn: str, cause: str):
+    """Stop an in-flight execution reviewing an older head SHA"""
+    stepfunctions = get_client('stepfunctions', region_name=REGION)
+    try:
+        stepfunctions.stop_execution(
+            executionArn=execution_arn,
+            error='Superseded',
+            cause=cause
+        )
+        print(f"🛑 Stopped superseded execution: {execution_arn}")
+    except Exception as e:
+        # Already finished executions cannot be stopped
+        print(f"⚠️  Could not stop {execution_arn}: {str(e)}")
+
+
+def execution_running(execution_arn: str) -> bool:
+    """True while the execution is still RUNNING (lookup failures count as finished)"""
+    stepfunctions = get_client('stepfunctions', region_name=REGION)
+    try:
+        return stepfunctions.describe_execution(executionArn=execution_arn)['status'] == 'RUNNING'
+    except Exception as e:
+        print(f"⚠️  Could not describe {execution_arn}: {str(e)}")
+        return False
+
+
+def is_superseded(repo_name: str, pr_number: int, head_sha: str) -> bool:
+    """True when a newer head SHA has claimed the PR"""
+    response = get_table(EVENTS_TABLE).get_item(
+        Key={EVENTS_TABLE_KEY: pr_state_key(repo_name, pr_number)},
+        ProjectionExpression='head_sha',
+        ConsistentRead=True
+    )
+    current = response.get('Item', {}).get('head_sha')
+    return current is not None and current != head_sha
+
+
+def check_superseded(event: Dict[str, Any], stage: str) -> Optional[Dict[str, Any]]:
+    """
+    Stage guard: the response to return when this execution is stale, else None
+
+    Lookup failures never block a review.
+    """
+    head_sha = event.get('head_sha')
+    if not REVIEW_COALESCING or not head_sha:
+        return None
+
+    try:
+        superseded = is_superseded(event.get('repo_name'), event.get('pr_number'), head_sha)
+    except Exception as e:
+        print(f"⚠️  Supersede check failed, continuing: {str(e)}")
+        return None
+
+    if not superseded:
+        return None
+
+    print(f"⏭️  {stage}: head {head_sha[:7]} superseded by a newer push, skipping")
+    return {
+        "statusCode": 200,
+        "superseded": True,
+        "stage": stage,
+        "head_sha": head_sha
+    }
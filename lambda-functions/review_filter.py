@@ -0,0 +1,226 @@
+"""
+Per-repo path and size filtering of review input
+
+Repos can commit `.github/code-review.json` (REVIEW_CONFIG_PATH) on their
+default branch:
+
+    {
+        "enabled": true,
+        "include": ["src/**/*.py"],
+        "exclude": ["**/migrations/**", "**/*_pb2.py"],
+        "max_file_bytes": 200000,
+        "max_changed_lines": 5000,
+        "generated_markers": ["@generated", "DO NOT EDIT"]
+    }
+
+The config is read from the default branch, not the PR head, so a PR cannot
+switch its own review off. It is cached per container and revalidated with
+If-None-Match (304s are cheap and do not count against the rate limit).
+
+prefilter() runs before start_execution and decides from the PR file list
+alone whether anything is reviewable; CodeDownloader applies the same rules
+per file, plus the size and generated-file checks that need the content.
+"""
+
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from lambda_startup import lazy_import
+
+REVIEW_FILTER = os.environ.get('REVIEW_FILTER', 'false').lower() == 'true'
+REVIEW_CONFIG_PATH = os.environ.get('REVIEW_CONFIG_PATH', '.github/code-review.json')
+REVIEW_CONFIG_TTL_SECONDS = int(os.environ.get('REVIEW_CONFIG_TTL_SECONDS', '300'))
+GITHUB_API = 'https://api.github.com'
+GENERATED_MARKER_BYTES = 2048
+
+# Behaviour without REVIEW_FILTER: every changed Python file
+BASELINE_CONFIG = {
+    'enabled': True,
+    'include': ['**/*.py'],
+    'exclude': [],
+    'max_file_bytes': 0,
+    'max_changed_lines': 0,
+    'generated_markers': []
+}
+
+DEFAULT_CONFIG = dict(
+    BASELINE_CONFIG,
+    exclude=['**/migrations/**', '**/*_pb2.py', '**/*_pb2_grpc.py', '**/vendor/**', '**/node_modules/**'],
+    max_file_bytes=200000,
+    max_changed_lines=5000,
+    generated_markers=['@generated', 'DO NOT EDIT', 'Generated by the protocol buffer compiler']
+)
+
+HEADERS = {
+    'Accept': 'application/vnd.github.v3+json',
+    'User-Agent': 'AI-Code-Review-Platform'
+}
+
+# repo_name -> {'etag', 'config', 'checked_at'}
+_config_cache = {}
+_pattern_cache = {}
+_http = None
+
+
+def _get_http():
+    global _http
+    if _http is None:
+        _http = lazy_import('urllib3').PoolManager()
+    return _http
+
+
+def glob_to_regex(pattern: str):
+    """Compile a path glob: `**` spans directories, `*` and `?` do not"""
+    compiled = _pattern_cache.get(pattern)
+    if compiled is not None:
+        return compiled
+
+    regex, i = '', 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+
+    compiled = _pattern_cache[pattern] = re.compile(regex + r'\Z')
+    return compiled
+
+
+def matches_any(path: str, patterns: List[str]) -> bool:
+    return any(glob_to_regex(pattern).match(path) for pattern in patterns)
+
+
+def normalize_config(raw: Dict[str, Any], base: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Repo config merged over the defaults; unknown keys are ignored"""
+    config = dict(base or DEFAULT_CONFIG)
+    for key in config:
+        if key in (raw or {}):
+            config[key] = raw[key]
+    return config
+
+
+def load_repo_config(repo_name: str) -> Dict[str, Any]:
+    """Repo review config (DEFAULT_CONFIG when the file is missing or unreadable)"""
+    cached = _config_cache.get(repo_name)
+    now = time.time()
+    if cached and now - cached['checked_at'] < REVIEW_CONFIG_TTL_SECONDS:
+        return cached['config']
+
+    headers = dict(HEADERS, Accept='application/vnd.github.raw')
+    if cached and cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+
+    try:
+        response = _get_http().request(
+            'GET', f"{GITHUB_API}/repos/{repo_name}/contents/{REVIEW_CONFIG_PATH}",
+            headers=headers, timeout=5.0
+        )
+    except Exception as e:
+        print(f"⚠️  Could not fetch review config for {repo_name}: {str(e)}")
+        return cached['config'] if cached else DEFAULT_CONFIG
+
+    if response.status == 304 and cached:
+        cached['checked_at'] = now
+        return cached['config']
+
+    if response.status == 200:
+        try:
+            config = normalize_config(json.loads(response.data.decode('utf-8')))
+            print(f"⚙️  Loaded {REVIEW_CONFIG_PATH} for {repo_name}")
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️  Ignoring invalid {REVIEW_CONFIG_PATH} in {repo_name}: {str(e)}")
+            config = DEFAULT_CONFIG
+    else:
+        config = DEFAULT_CONFIG
+
+    _config_cache[repo_name] = {
+        'etag': response.headers.get('ETag'),
+        'config': config,
+        'checked_at': now
+    }
+    return config
+
+
+def get_review_config(repo_name: str) -> Dict[str, Any]:
+    """Config in effect for a repo (BASELINE_CONFIG when filtering is off)"""
+    return load_repo_config(repo_name) if REVIEW_FILTER else BASELINE_CONFIG
+
+
+def file_skip_reason(file_info: Dict[str, Any], config: Dict[str, Any]) -> Optional[str]:
+    """Why a PR file entry is not reviewed, from its metadata alone (None = review it)"""
+    filename = file_info.get('filename', '')
+    if file_info.get('status') == 'removed':
+        return 'removed'
+    if not matches_any(filename, config['include']):
+        return 'not included'
+    if matches_any(filename, config['exclude']):
+        return 'excluded'
+    if config['max_changed_lines'] and file_info.get('changes', 0) > config['max_changed_lines']:
+        return f"{file_info.get('changes')} changed lines > {config['max_changed_lines']}"
+    return None
+
+
+def content_skip_reason(content: str, config: Dict[str, Any]) -> Optional[str]:
+    """Size and generated-file checks on downloaded content (None = review it)"""
+    if config['max_file_bytes'] and len(content.encode('utf-8')) > config['max_file_bytes']:
+        return f"larger than {config['max_file_bytes']} bytes"
+    head = content[:GENERATED_MARKER_BYTES]
+    for marker in config['generated_markers']:
+        if marker in head:
+            return f"generated ({marker})"
+    return None
+
+
+def filter_files(files: List[Dict[str, Any]], config: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split PR file entries into (kept, skipped) where skipped entries carry a reason"""
+    kept, skipped = [], []
+    for file_info in files:
+        reason = file_skip_reason(file_info, config)
+        if reason:
+            skipped.append({'filename': file_info.get('filename'), 'reason': reason})
+        else:
+            kept.append(file_info)
+    return kept, skipped
+
+
+def prefilter(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decide before any fan-out whether a PR has reviewable files
+
+    Returns {'review': bool, 'reason': str, 'kept': int}. Anything that
+    cannot be decided from one page of the PR file list is reviewed.
+    """
+    config = load_repo_config(job['repo_name'])
+    if not config['enabled']:
+        return {'review': False, 'reason': f"disabled in {REVIEW_CONFIG_PATH}", 'kept': 0}
+    if not job.get('pr_url'):
+        return {'review': True, 'reason': 'no PR URL', 'kept': 0}
+
+    try:
+        response = _get_http().request('GET', f"{job['pr_url']}/files?per_page=100", headers=HEADERS, timeout=5.0)
+    except Exception as e:
+        return {'review': True, 'reason': f"file list unavailable: {str(e)}", 'kept': 0}
+    if response.status != 200:
+        return {'review': True, 'reason': f"file list unavailable ({response.status})", 'kept': 0}
+
+    files = json.loads(response.data.decode('utf-8'))
+    kept, _ = filter_files(files, config)
+
+    if kept:
+        return {'review': True, 'reason': f"{len(kept)} reviewable files", 'kept': len(kept)}
+    if len(files) >= 100 and job.get('changed_files', 0) > len(files):
+        return {'review': True, 'reason': 'more files than one page', 'kept': 0}
+    return {'review': False, 'reason': f"none of {len(files)} changed files match the review config", 'kept': 0}
@@ -0,0 +1,232 @@
+"""
+Fair multi-repo scheduling of review jobs
+
+Start-time fair queueing over per-repo FIFO queues. Each job costs its
+changed-file count (capped), so a repo submitting a 300-file refactor is
+charged for it and other repos' jobs are interleaved ahead of its next
+ones. Small PRs get a fixed boost, and each tenant (repo owner) has its own
+concurrency limit on top of the global one.
+
+Virtual time outlives one dispatcher invocation: the per-repo finish tags
+of dispatched jobs and the virtual time are kept in the github_events table
+(`fair#<repo>` and `fair#` items, only ever moved forward), so a repo that
+just had a large PR started is still charged for it in the next SQS batch.
+
+The clock is injectable; SimulatedClock lets tests drive waits
+deterministically:
+
+    clock = SimulatedClock()
+    scheduler = FairScheduler(max_running=2, clock=clock)
+    scheduler.submit(job)
+    clock.advance(5)
+    scheduler.next_job()
+"""
+
+import json
+import os
+import time
+from collections import deque
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from lambda_startup import get_resource, get_table
+from review_coalescing import DEDUP_TTL_SECONDS, EVENTS_TABLE, EVENTS_TABLE_KEY
+
+MAX_REVIEWS_PER_TENANT = int(os.environ.get('MAX_REVIEWS_PER_TENANT', '2'))
+SMALL_PR_FILES = int(os.environ.get('SMALL_PR_FILES', '3'))
+SMALL_PR_BOOST = float(os.environ.get('SMALL_PR_BOOST', '10'))
+MAX_JOB_COST = 100
+FAIR_STATE_PREFIX = 'fair#'
+BATCH_GET_LIMIT = 100
+BATCH_GET_ATTEMPTS = 3
+
+
+class SimulatedClock:
+    """Manually advanced clock for deterministic scheduling tests"""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def tenant_of(repo_name: str) -> str:
+    return repo_name.split('/', 1)[0]
+
+
+def job_cost(job: Dict[str, Any]) -> float:
+    return float(min(max(int(job.get('changed_files') or 1), 1), MAX_JOB_COST))
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+class FairScheduler:
+    """Per-repo fair queues with small-PR boost and per-tenant concurrency limits"""
+
+    def __init__(self, max_running: int, tenant_limit: int = None,
+                 clock: Callable[[], float] = time.time):
+        self.max_running = max_running
+        self.tenant_limit = tenant_limit or MAX_REVIEWS_PER_TENANT
+        self.clock = clock
+        self.queues = {}
+        self.finish_tags = {}
+        self.virtual_time = 0.0
+        self.running = {}
+        self.waits = {}
+        # repo -> finish tag of its last dispatched job (what is persisted)
+        self.dispatched_tags = {}
+        self._sequence = 0
+
+    def restore(self, virtual_time: float = 0.0, finish_tags: Dict[str, float] = None):
+        """Continue from the virtual time and finish tags of earlier invocations"""
+        self.virtual_time = max(self.virtual_time, virtual_time)
+        for repo, tag in (finish_tags or {}).items():
+            self.finish_tags[repo] = max(self.finish_tags.get(repo, 0.0), tag)
+
+    def seed_running(self, running_by_tenant: Dict[str, int]):
+        """Account for reviews already running (e.g. from previous invocations)"""
+        for tenant, count in running_by_tenant.items():
+            self.running[tenant] = self.running.get(tenant, 0) + count
+
+    def submit(self, job: Dict[str, Any], item: Any = None):
+        """
+        Queue a job ({'repo_name', 'changed_files', ...})
+
+        `item` is what next_job() hands back (defaults to the job itself);
+        the wait is measured from job['received_at'] when present.
+        """
+        repo = job['repo_name']
+        start = max(self.virtual_time, self.finish_tags.get(repo, 0.0))
+        self.finish_tags[repo] = start + job_cost(job)
+        self._sequence += 1
+        self.queues.setdefault(repo, deque()).append({
+            'job': job,
+            'item': job if item is None else item,
+            'start_tag': start,
+            'sequence': self._sequence,
+            'enqueued_at': job.get('received_at', self.clock())
+        })
+
+    def total_running(self) -> int:
+        return sum(self.running.values())
+
+    def _priority(self, entry: Dict[str, Any]):
+        boost = SMALL_PR_BOOST if int(entry['job'].get('changed_files') or 0) <= SMALL_PR_FILES else 0.0
+        return (entry['start_tag'] - boost, entry['sequence'])
+
+    def next_job(self) -> Optional[Any]:
+        """Dispatch the next job, or None when empty or at a concurrency limit"""
+        if self.total_running() >= self.max_running:
+            return None
+
+        candidates = [
+            queue[0] for repo, queue in self.queues.items()
+            if queue and self.running.get(tenant_of(repo), 0) < self.tenant_limit
+        ]
+        if not candidates:
+            return None
+
+        entry = min(candidates, key=self._priority)
+        repo = entry['job']['repo_name']
+        self.queues[repo].popleft()
+
+        tenant = tenant_of(repo)
+        self.running[tenant] = self.running.get(tenant, 0) + 1
+        self.virtual_time = max(self.virtual_time, entry['start_tag'])
+        self.dispatched_tags[repo] = max(self.dispatched_tags.get(repo, 0.0),
+                                         entry['start_tag'] + job_cost(entry['job']))
+        self.waits.setdefault(repo, []).append(max(0.0, self.clock() - entry['enqueued_at']))
+        return entry['item']
+
+    def complete(self, job: Dict[str, Any]):
+        """Release the concurrency slot of a dispatched (or failed) job"""
+        tenant = tenant_of(job['repo_name'])
+        if self.running.get(tenant, 0) > 0:
+            self.running[tenant] -= 1
+
+    def pending(self) -> List[Any]:
+        return [entry['item'] for queue in self.queues.values() for entry in queue]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue-wait statistics (seconds) per repo plus queue depth"""
+        all_waits = [w for waits in self.waits.values() for w in waits]
+        return {
+            'queued': sum(len(q) for q in self.queues.values()),
+            'running': self.total_running(),
+            'dispatched': len(all_waits),
+            'wait_p50': round(_percentile(all_waits, 50), 3),
+            'wait_p95': round(_percentile(all_waits, 95), 3),
+            'wait_max': round(max(all_waits, default=0.0), 3),
+            'per_repo': {
+                repo: {
+                    'dispatched': len(waits),
+                    'queued': len(self.queues.get(repo, ())),
+                    'wait_p95': round(_percentile(waits, 95), 3)
+                }
+                for repo, waits in self.waits.items()
+            }
+        }
+
+    def log_metrics(self):
+        print(json.dumps({"level": "INFO", "message": "review queue wait", **self.metrics()}))
+
+
+# -- persisted virtual time -------------------------------------------------------
+
+def fair_state_key(repo_name: str = '') -> str:
+    """State item of a repo's finish tag (no repo: the shared virtual time)"""
+    return f"{FAIR_STATE_PREFIX}{repo_name}"
+
+
+def load_fair_state(repo_names: Iterable[str]) -> Dict[str, Any]:
+    """Virtual time and finish tags of these repos, as left by earlier invocations"""
+    keys = [fair_state_key()] + [fair_state_key(repo) for repo in dict.fromkeys(repo_names)]
+    dynamodb = get_resource('dynamodb')
+    state = {'virtual_time': 0.0, 'finish_tags': {}}
+
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {EVENTS_TABLE: {'Keys': [{EVENTS_TABLE_KEY: key} for key in keys[start:start + BATCH_GET_LIMIT]]}}
+        for _ in range(BATCH_GET_ATTEMPTS):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(EVENTS_TABLE, []):
+                if 'virtual_time' in item:
+                    state['virtual_time'] = float(item['virtual_time'])
+                elif 'finish_tag' in item:
+                    state['finish_tags'][item[EVENTS_TABLE_KEY][len(FAIR_STATE_PREFIX):]] = float(item['finish_tag'])
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                break
+
+    return state
+
+
+def _advance(table, key: str, attribute: str, value: float, expires_at: int):
+    """Move a persisted tag forward; a concurrent dispatcher may already have moved it further"""
+    try:
+        table.update_item(
+            Key={EVENTS_TABLE_KEY: key},
+            UpdateExpression='SET #attr = :value, expires_at = :expires',
+            ConditionExpression='attribute_not_exists(#attr) OR #attr < :value',
+            ExpressionAttributeNames={'#attr': attribute},
+            ExpressionAttributeValues={':value': Decimal(str(round(value, 3))), ':expires': expires_at}
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+
+
+def save_fair_state(scheduler: FairScheduler):
+    """Persist the virtual time and the finish tags of the repos dispatched in this invocation"""
+    table = get_table(EVENTS_TABLE)
+    expires_at = int(time.time()) + DEDUP_TTL_SECONDS
+    if scheduler.dispatched_tags:
+        _advance(table, fair_state_key(), 'virtual_time', scheduler.virtual_time, expires_at)
+    for repo, tag in scheduler.dispatched_tags.items():
+        _advance(table, fair_state_key(repo), 'finish_tag', tag, expires_at)
@@ -0,0 +1,318 @@
+"""
+Review storage: bodies in S3, metadata and history in DynamoDB
+
+The combined review markdown grows with the PR, while `code_reviews` items
+are capped at 400 KB and billed per KB written. ReviewAggregator therefore
+writes the body gzip-compressed to S3:
+
+    reviews/<repo>/pr-<number>/<review_id>/review.md.gz
+
+and the item keeps only a `review_body` pointer:
+    {'s3_key', 'encoding', 'sha256', 'bytes', 'stored_bytes'}
+
+`sha256` is over the uncompressed text, so readers can verify what they
+load. ReviewBody defers the S3 read and decompression until the text is
+used; items written before this change (inline `combined_review`) read the
+same way.
+
+History layout: every review item carries `review_key` =
+`pr#<zero-padded number>#<timestamp>#<review_id>`. With
+REVIEWS_TABLE_LAYOUT=keyed (the default, as created by docs/setup-guide.md)
+the table itself is keyed (repo_name, review_key); with `legacy`
+(review_id hash key) the same pair is the REVIEWS_REPO_INDEX GSI. A layout
+that does not match the table fails with ReviewTableLayoutError. Either way a PR's reviews are one begins_with range in time order, so
+the latest review is a single-item query. REVIEWS_TIME_INDEX (repo_name,
+timestamp) lists a repo's reviews across PRs, and a per-repo `stats` item is
+updated with atomic counters on every write. Reads go through a small
+in-container TTL cache.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from lambda_startup import get_client, get_table, lazy_import
+
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
+REVIEWS_TABLE = os.environ.get('REVIEWS_TABLE', 'CodeReviews')
+# 's3' (compressed object + pointer) or 'inline' (whole body in the item, as before)
+REVIEW_BODY_STORAGE = os.environ.get('REVIEW_BODY_STORAGE', 's3').lower()
+REVIEW_BODY_COMPRESSION = int(os.environ.get('REVIEW_BODY_COMPRESSION', '6'))
+# 'keyed' (repo_name / review_key primary key) or 'legacy' (review_id primary key + REVIEWS_REPO_INDEX)
+REVIEWS_TABLE_LAYOUT = os.environ.get('REVIEWS_TABLE_LAYOUT', 'keyed').lower()
+REVIEWS_TABLE_LAYOUTS = ('keyed', 'legacy')
+REVIEWS_REPO_INDEX = os.environ.get('REVIEWS_REPO_INDEX', 'repo-review-index')
+REVIEWS_TIME_INDEX = os.environ.get('REVIEWS_TIME_INDEX', 'repo-timestamp-index')
+REVIEW_HISTORY_CACHE_SECONDS = int(os.environ.get('REVIEW_HISTORY_CACHE_SECONDS', '30'))
+REVIEW_HISTORY_MAX_PAGE = 100
+CACHE_ITEMS = 256
+
+# Attributes returned by history reads (bodies stay in S3)
+SUMMARY_ATTRIBUTES = ('review_id', 'repo_name', 'pr_number', 'timestamp', 'review_key', 'totals',
+                      'findings_summary', 'incremental', 'routing_summary', 'statistics', 'review_body',
+                      'file_results_key')
+SEVERITIES = ('critical', 'high', 'medium', 'low')
+
+# (action, args) -> (expires_at, value)
+_cache = OrderedDict()
+
+
+class ReviewTableLayoutError(ValueError):
+    """REVIEWS_TABLE_LAYOUT does not describe the reviews table"""
+
+
+def check_layout():
+    if REVIEWS_TABLE_LAYOUT not in REVIEWS_TABLE_LAYOUTS:
+        raise ReviewTableLayoutError(
+            f"REVIEWS_TABLE_LAYOUT={REVIEWS_TABLE_LAYOUT!r}; expected one of {', '.join(REVIEWS_TABLE_LAYOUTS)}"
+        )
+
+
+def _layout_error(error: Exception) -> ReviewTableLayoutError:
+    return ReviewTableLayoutError(
+        f"{REVIEWS_TABLE} does not match REVIEWS_TABLE_LAYOUT={REVIEWS_TABLE_LAYOUT} "
+        f"(keyed: repo_name/review_key primary key; legacy: review_id primary key + {REVIEWS_REPO_INDEX}): {error}"
+    )
+
+
+def _is_validation_error(error: Exception) -> bool:
+    return getattr(error, 'response', {}).get('Error', {}).get('Code') == 'ValidationException'
+
+
+def review_body_key(repo_name: str, pr_number: int, review_id: str) -> str:
+    return f"reviews/{repo_name}/pr-{pr_number}/{review_id}/review.md.gz"
+
+
+def store_review_body(repo_name: str, pr_number: int, review_id: str, text: str) -> Dict[str, Any]:
+    """Upload the compressed body; returns the pointer to keep on the review item"""
+    data = text.encode('utf-8')
+    compressed = gzip.compress(data, compresslevel=REVIEW_BODY_COMPRESSION, mtime=0)
+    s3_key = review_body_key(repo_name, pr_number, review_id)
+
+    get_client('s3').put_object(
+        Bucket=BUCKET_NAME,
+        Key=s3_key,
+        Body=compressed,
+        ContentType='text/markdown; charset=utf-8',
+        ContentEncoding='gzip'
+    )
+    return {
+        's3_key': s3_key,
+        'encoding': 'gzip',
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'bytes': len(data),
+        'stored_bytes': len(compressed)
+    }
+
+
+def load_review_body(pointer: Dict[str, Any]) -> str:
+    """Download, decompress and verify a stored body"""
+    response = get_client('s3').get_object(Bucket=BUCKET_NAME, Key=pointer['s3_key'])
+    data = response['Body'].read()
+    if pointer.get('encoding') == 'gzip':
+        data = gzip.decompress(data)
+    if pointer.get('sha256') and hashlib.sha256(data).hexdigest() != pointer['sha256']:
+        raise ValueError(f"Review body {pointer['s3_key']} does not match its sha256")
+    return data.decode('utf-8')
+
+
+class ReviewBody:
+    """Review text that is only fetched from S3 when first read"""
+
+    def __init__(self, pointer: Optional[Dict[str, Any]] = None, text: Optional[str] = None):
+        self.pointer = pointer
+        self._text = text
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> 'ReviewBody':
+        """Body of a review item (or aggregator result): S3 pointer or legacy inline text"""
+        return cls(pointer=item.get('review_body'), text=item.get('combined_review'))
+
+    @property
+    def loaded(self) -> bool:
+        return self._text is not None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = load_review_body(self.pointer) if self.pointer else ''
+        return self._text
+
+    def __bool__(self) -> bool:
+        return bool(self._text or self.pointer)
+
+
+# -- history layout ---------------------------------------------------------------
+
+def pr_prefix(pr_number: int) -> str:
+    return f"pr#{int(pr_number):010d}#"
+
+
+def review_key(pr_number: int, timestamp: str, review_id: str) -> str:
+    """Sort key: a PR's reviews are contiguous and in time order"""
+    return f"{pr_prefix(pr_number)}{timestamp}#{review_id}"
+
+
+def stats_key(repo_name: str) -> Dict[str, str]:
+    check_layout()
+    if REVIEWS_TABLE_LAYOUT == 'keyed':
+        return {'repo_name': repo_name, 'review_key': 'stats'}
+    return {'review_id': f"stats#{repo_name}"}
+
+
+def record_review_stats(repo_name: str, pr_number: int, timestamp: str, totals: Dict[str, Any],
+                        findings_summary: Optional[Dict[str, Any]] = None):
+    """Atomic per-repo counters (one small write instead of aggregating at read time)"""
+    by_severity = (findings_summary or {}).get('by_severity', {})
+    counters = {'reviews': 1, 'tokens': int(totals.get('tokens', 0)),
+                **{f"findings_{severity}": int(by_severity.get(severity, 0)) for severity in SEVERITIES}}
+
+    names = {f"#{name}": name for name in counters}
+    values = {f":{name}": value for name, value in counters.items()}
+    names.update({'#last_at': 'last_review_at', '#last_pr': 'last_pr_number', '#repo': 'repo_name'})
+    values.update({':last_at': timestamp, ':last_pr': pr_number, ':repo': repo_name})
+
+    get_table(REVIEWS_TABLE).update_item(
+        Key=stats_key(repo_name),
+        UpdateExpression="ADD " + ", ".join(f"#{name} :{name}" for name in counters)
+        + " SET #last_at = :last_at, #last_pr = :last_pr, #repo = :repo",
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+
+# -- cache ----------------------------------------------------------------------
+
+def _cached(key: tuple, compute):
+    now = time.time()
+    entry = _cache.get(key)
+    if entry and entry[0] > now:
+        _cache.move_to_end(key)
+        return entry[1]
+    value = compute()
+    _cache[key] = (now + REVIEW_HISTORY_CACHE_SECONDS, value)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_ITEMS:
+        _cache.popitem(last=False)
+    return value
+
+
+def clear_cache():
+    _cache.clear()
+
+
+# -- reads ------------------------------------------------------------------------
+
+def _plain(value):
+    """DynamoDB Decimals as int/float"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def encode_cursor(last_key: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not last_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(_plain(last_key)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not cursor:
+        return None
+    return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+
+
+def _projection() -> Dict[str, Any]:
+    names = {f"#a{i}": name for i, name in enumerate(SUMMARY_ATTRIBUTES)}
+    return {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+
+
+def _query_reviews(repo_name: str, pr_number: Optional[int], limit: int, cursor: Optional[str],
+                   newest_first: bool = True, filter_expression=None) -> Dict[str, Any]:
+    """One page of a repo's reviews, optionally for one PR"""
+    Key = lazy_import('boto3.dynamodb.conditions').Key
+    kwargs = dict(_projection(), Limit=max(1, min(limit, REVIEW_HISTORY_MAX_PAGE)), ScanIndexForward=not newest_first)
+
+    if pr_number is not None:
+        kwargs['KeyConditionExpression'] = Key('repo_name').eq(repo_name) & Key('review_key').begins_with(pr_prefix(pr_number))
+        if REVIEWS_TABLE_LAYOUT != 'keyed':
+            kwargs['IndexName'] = REVIEWS_REPO_INDEX
+    else:
+        kwargs['KeyConditionExpression'] = Key('repo_name').eq(repo_name)
+        kwargs['IndexName'] = REVIEWS_TIME_INDEX
+    if filter_expression is not None:
+        kwargs['FilterExpression'] = filter_expression
+    start = decode_cursor(cursor)
+    if start:
+        kwargs['ExclusiveStartKey'] = start
+
+    check_layout()
+    try:
+        response = get_table(REVIEWS_TABLE).query(**kwargs)
+    except Exception as e:
+        # Wrong key schema or missing index for the configured layout
+        if _is_validation_error(e):
+            raise _layout_error(e) from e
+        raise
+    return {
+        'reviews': [_plain(item) for item in response.get('Items', [])],
+        'cursor': encode_cursor(response.get('LastEvaluatedKey'))
+    }
+
+
+def review_history(repo_name: str, pr_number: Optional[int] = None, limit: int = 20,
+                   cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Newest-first page of review summaries; pass the returned cursor for the next page"""
+    return _cached(('history', repo_name, pr_number, limit, cursor),
+                   lambda: _query_reviews(repo_name, pr_number, limit, cursor))
+
+
+def latest_review(repo_name: str, pr_number: int, require: Optional[str] = None,
+                  use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Newest review summary of a PR, or None
+
+    Args:
+        require: only consider reviews that have this attribute set (e.g.
+            file_results_key); NULL values written by older versions do not count
+    """
+    def compute():
+        Attr = lazy_import('boto3.dynamodb.conditions').Attr
+        filter_expression = (Attr(require).exists() & ~Attr(require).attribute_type('NULL')) if require else None
+        # Limit counts items before the filter, so keep paging until one passes
+        cursor = None
+        while True:
+            page = _query_reviews(repo_name, pr_number, 1 if not require else 10, cursor,
+                                  filter_expression=filter_expression)
+            if page['reviews']:
+                return page['reviews'][0]
+            if not page['cursor']:
+                return None
+            cursor = page['cursor']
+
+    if not use_cache:
+        return compute()
+    return _cached(('latest', repo_name, pr_number, require), compute)
+
+
+def repo_stats(repo_name: str) -> Optional[Dict[str, Any]]:
+    """Per-repo counters maintained by record_review_stats()"""
+    def compute():
+        try:
+            item = get_table(REVIEWS_TABLE).get_item(Key=stats_key(repo_name)).get('Item')
+        except Exception as e:
+            if _is_validation_error(e):
+                raise _layout_error(e) from e
+            raise
+        return _plain(item) if item else None
+
+    return _cached(('stats', repo_name), compute)
@@ -3,12 +3,8 @@ Secrets Manager helper with optimized caching
 """
 
 import json
-import boto3
-from botocore.exceptions import ClientError
 from datetime import datetime, timedelta
-
-# Initialize client OUTSIDE handler for connection reuse
-secrets_client = boto3.client('secretsmanager', region_name='ap-south-2')
+from lambda_startup import get_client
 
 # Cache with expiration
 _secrets_cache = {}
@@ -39,6 +35,9 @@ def get_secret(secret_name: str, force_refresh: bool = False) -> dict:
             }))
             return _secrets_cache[secret_name]
     
+    # Client is created on first use and reused for the container lifetime
+    secrets_client = get_client('secretsmanager', region_name='ap-south-2')
+    
     try:
         response = secrets_client.get_secret_value(SecretId=secret_name)
         
@@ -60,7 +59,7 @@ def get_secret(secret_name: str, force_refresh: bool = False) -> dict:
         
         return secret_dict
         
-    except ClientError as e:
+    except secrets_client.exceptions.ClientError as e:
         error_code = e.response['Error']['Code']
         
         print(json.dumps({
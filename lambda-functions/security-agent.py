@@ -1,17 +1,44 @@
 import json
 import os
-import boto3
-import google.generativeai as genai
 from secrets_helper import get_gemini_api_key
+from lambda_startup import get_client, get_genai, log_startup, pre_init
+from review_coalescing import check_superseded
+from context_cache import generate_from_cache, get_live_handle, is_cache_miss
+from work_items import load_work_item, store_item_result
+from findings import FINDINGS_GENERATION_CONFIG, FINDINGS_OUTPUT_FORMAT, parse_model_review
+from request_policy import REQUEST_TIMEOUT_SECONDS, call_with_policy, summarize_reports
+from model_router import override_route, route_file, static_review, summarize_routing
+from static_security import analyze_source, format_findings
+import blob_cache
 
-# Initialize clients
-s3_client = boto3.client('s3')
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
+# Clean files (no static findings) below this risk score skip the model
+PRESCREEN_MAX_RISK = float(os.environ.get('SECURITY_PRESCREEN_MAX_RISK', '1.0'))
+
+SECURITY_ROLE = "You are a security expert conducting a thorough security review of Python code."
+
+SECURITY_TASK = """**Your task:**
+1. Identify ALL security vulnerabilities (SQL injection, XSS, hardcoded secrets, etc.)
+2. Classify by severity: critical, high, medium, low
+3. Provide specific code examples showing the vulnerability
+4. Suggest secure alternatives with code examples
+5. Reference OWASP Top 10 or CWE numbers where applicable
+
+""" + FINDINGS_OUTPUT_FORMAT
 
 def lambda_handler(event, context):
     """Security-focused code review agent powered by Gemini"""
     
     lambda_name = "SecurityAgent"
+    log_startup(lambda_name)
+    
+    # Map mode sends a pointer to the work item stored in S3
+    event = load_work_item(event)
+    
+    # A newer push to the PR makes this execution stale
+    superseded = check_superseded(event, lambda_name)
+    if superseded:
+        return superseded
     
     try:
         print("=" * 60)
@@ -29,6 +56,8 @@ def lambda_handler(event, context):
         
         uploaded_files = event.get('uploaded_files', [])
         parsed_files = event.get('parsed_files', [])
+        context_caches = event.get('context_caches', {})
+        context_map = event.get('context_map', {})
         
         print(f"📁 Analyzing {len(uploaded_files)} files for security")
         
@@ -43,8 +72,9 @@ def lambda_handler(event, context):
                     "lambda": lambda_name
                 }
             
+            genai = get_genai()
             genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-2.5-flash')
+            models = {}
             
             print("✅ Gemini API key retrieved from Secrets Manager")
             
@@ -58,6 +88,8 @@ def lambda_handler(event, context):
             }
         
         all_reviews = []
+        routing = []
+        findings = []
         total_tokens = 0
         
         # Analyze each file
@@ -65,11 +97,15 @@ def lambda_handler(event, context):
             filename = file_info.get('filename', 'unknown')
             s3_key = file_info.get('s3_key')
             
+            if file_info.get('carried_forward'):
+                print(f"♻️  Unchanged since last review, skipping: {filename}")
+                continue
+            
             print(f"📄 Processing: {filename}")
             
             try:
                 # Download from S3
-                response = s3_client.get_object(Bucket=BUCKET_NAME, Key=s3_key)
+                response = get_client('s3').get_object(Bucket=BUCKET_NAME, Key=s3_key)
                 code = response['Body'].read().decode('utf-8')
                 
             except Exception as e:
@@ -83,18 +119,78 @@ def lambda_handler(event, context):
             
             # Get parsed metadata
             parsed_meta = next((p for p in parsed_files if p.get('filename') == filename), {})
+            file_context = context_map.get(filename)
+            
+            # Local pre-screen for dangerous sinks (microseconds vs seconds for the model)
+            static_findings, _ = blob_cache.get_or_compute(
+                'security', file_info.get('sha') or blob_cache.git_blob_sha(code), lambda: analyze_source(code)
+            )
+            findings.extend({"file": filename, "agent": "security", "source": "static", **f} for f in static_findings)
+            static_section = ""
+            if static_findings:
+                static_section = f"\n\n### 🔎 Static Analysis Findings\n\n{format_findings(static_findings)}"
+            
+            # Route by risk: static-only checks, fast tier or full model
+            route = route_file('security', filename, parsed_meta, file_context)
+            if static_findings and route['tier'] != 'deep':
+                route = override_route(route, 'deep', f"{len(static_findings)} static security findings")
+            elif not static_findings and file_context and route['risk_score'] < PRESCREEN_MAX_RISK:
+                route = override_route(route, 'static', "no dangerous sinks found by static pre-screen")
+            routing.append(route)
+            
+            if route['tier'] == 'static':
+                print(f"⏭️  Static-only review for {filename}: {route['reason']}")
+                all_reviews.append({
+                    "file": filename,
+                    "review": static_review('security', route, file_context) + static_section,
+                    "tokens": 0
+                })
+                continue
+            
+            if route['model'] not in models:
+                models[route['model']] = genai.GenerativeModel(
+                    route['model'], generation_config=FINDINGS_GENERATION_CONFIG
+                )
+            model = models[route['model']]
             
             # Analyze with Gemini
             try:
-                prompt = create_security_prompt(code, filename, parsed_meta)
-                response = model.generate_content(prompt)
+                cache_handle = get_live_handle(context_caches, filename)
+                if cache_handle and cache_handle['model'] != route['model']:
+                    cache_handle = None  # caches are bound to the model they were created for
+                request_options = {'timeout': REQUEST_TIMEOUT_SECONDS}
+                if cache_handle:
+                    # File source already uploaded once as a shared prefix
+                    prompt = create_security_instruction(filename, static_findings)
+                    try:
+                        response, request_report = call_with_policy(
+                            lambda prompt=prompt: generate_from_cache(
+                                cache_handle, prompt, model, request_options, FINDINGS_GENERATION_CONFIG
+                            )
+                        )
+                    except Exception as e:
+                        # Expired or deleted cache: send the whole file instead (other errors were already retried)
+                        if not is_cache_miss(e):
+                            raise
+                        print(f"⚠️  Cached context failed for {filename}, using the full prompt: {str(e)}")
+                        cache_handle = None
+                if not cache_handle:
+                    prompt = create_security_prompt(code, filename, parsed_meta, static_findings)
+                    response, request_report = call_with_policy(
+                        lambda prompt=prompt: model.generate_content(prompt, request_options=request_options)
+                    )
                 review_text = response.text
                 tokens_used = len(prompt.split()) + len(review_text.split())
                 
+                # Issues go to the structured findings, the review keeps the summary
+                summary, model_findings = parse_model_review(review_text, filename, "security")
+                findings.extend(model_findings)
+                
                 all_reviews.append({
                     "file": filename,
-                    "review": review_text,
-                    "tokens": tokens_used
+                    "review": summary + static_section,
+                    "tokens": tokens_used,
+                    "request": request_report
                 })
                 
                 total_tokens += tokens_used
@@ -103,26 +199,28 @@ def lambda_handler(event, context):
                 print(f"❌ Error analyzing {filename}: {str(e)}")
                 all_reviews.append({
                     "file": filename,
-                    "review": f"Error analyzing file: {str(e)}",
-                    "tokens": 0
+                    "review": f"Error analyzing file: {str(e)}" + static_section,
+                    "tokens": 0,
+                    "request": getattr(e, 'policy_report', None)
                 })
         
-        # Combine reviews
-        combined_review = "\n\n".join([f"## File: {r['file']}\n\n{r['review']}" for r in all_reviews])
-        
         print("=" * 60)
         print("✅ Security Agent Complete")
         print(f"📊 Total tokens: {total_tokens}")
         print(f"💰 Total cost: $0.0000 (FREE with Gemini!)")
         print("=" * 60)
         
-        return {
+        return store_item_result(event, {
             "statusCode": 200,
             "agent": "security",
-            "review": f"# 🔒 SECURITY ANALYSIS\n\n{combined_review}",
             "tokens": total_tokens,
-            "cost": 0.0
-        }
+            "cost": 0.0,
+            "request_stats": summarize_reports([r.get('request') for r in all_reviews]),
+            "routing": routing,
+            "routing_summary": summarize_routing(routing),
+            "file_reviews": [{"file": r['file'], "review": r['review']} for r in all_reviews],
+            "findings": findings
+        })
         
     except Exception as e:
         print(f"❌ CRITICAL ERROR in {lambda_name}: {str(e)}")
@@ -136,7 +234,18 @@ def lambda_handler(event, context):
             "lambda": lambda_name
         }
 
-def create_security_prompt(code, filename, parsed_meta):
+def format_static_anchors(static_findings):
+    """Prompt block pointing the model at statically verified sinks"""
+    if not static_findings:
+        return ""
+    return f"""
+**Static analysis findings (verified line numbers):**
+{format_findings(static_findings)}
+
+Confirm or dismiss each finding above using these exact line numbers, then look for issues static rules cannot see.
+"""
+
+def create_security_prompt(code, filename, parsed_meta, static_findings=None):
     """Create security analysis prompt"""
     context = ""
     if parsed_meta:
@@ -147,7 +256,7 @@ def create_security_prompt(code, filename, parsed_meta):
 - Complexity: {parsed_meta.get('complexity', 'N/A')}
 """
     
-    prompt = f"""You are a security expert conducting a thorough security review of Python code.
+    prompt = f"""{SECURITY_ROLE}
 
 {context}
 
@@ -155,25 +264,17 @@ def create_security_prompt(code, filename, parsed_meta):
 ```python
 {code}
 ```
+{format_static_anchors(static_findings)}
+{SECURITY_TASK}"""
+    return prompt
 
-**Your task:**
-1. Identify ALL security vulnerabilities (SQL injection, XSS, hardcoded secrets, etc.)
-2. Classify by severity: 🔴 CRITICAL, 🟠 HIGH, 🟡 MEDIUM, 🟢 LOW
-3. Provide specific code examples showing the vulnerability
-4. Suggest secure alternatives with code examples
-5. Reference OWASP Top 10 or CWE numbers where applicable
-
-**Output format:**
-## 🔴 CRITICAL Security Issues
-[List with code examples]
+def create_security_instruction(filename, static_findings=None):
+    """Create security instruction sent against the cached file context"""
+    return f"""{SECURITY_ROLE}
 
-## 🟠 HIGH Security Issues
-[List with code examples]
+Review the file `{filename}` provided in the cached context above.
+{format_static_anchors(static_findings)}
+{SECURITY_TASK}"""
 
-## 🟡 MEDIUM Security Issues
-[List with code examples]
 
-## ✅ Security Summary
-[Brief summary and prioritized recommendations]
-"""
-    return prompt
\ No newline at end of file
+pre_init(lambda: get_client('s3'), get_genai)
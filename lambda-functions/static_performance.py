@@ -0,0 +1,261 @@
+"""
+AST-based performance anti-pattern detector
+
+Reports, per function and with line numbers:
+    nested-loop-same-iterable  nested loops over the same iterable (O(n²))
+    list-membership-in-loop    `x in some_list` inside a loop (O(n) per test)
+    string-concat-in-loop      `s += "..."` string building inside a loop
+    append-to-comprehension    loop whose only job is `.append()` to a fresh list
+    io-in-loop                 queries / HTTP / file / S3 / DynamoDB calls in a loop (N+1)
+
+CodeParser attaches the results to each parsed file, so ContextEnhancer can
+score them and PerformanceAgent can report them directly and send only the
+flagged functions to the model.
+"""
+
+import ast
+from typing import Any, Dict, List, Optional
+
+LOOP_TYPES = (ast.For, ast.AsyncFor, ast.While)
+COMPREHENSION_TYPES = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+IO_METHODS = {
+    'execute', 'executemany', 'fetchone', 'fetchall', 'query', 'scan', 'raw', 'read_sql',
+    'get_item', 'put_item', 'update_item', 'delete_item', 'get_object', 'put_object',
+    'invoke', 'send_message', 'urlopen', 'request', 'urlretrieve'
+}
+HTTP_RECEIVERS = {'requests', 'session', 'http', 'httpx', 'client', 's3', 'table', 'urllib3'}
+HTTP_VERBS = {'get', 'post', 'put', 'patch', 'delete', 'head'}
+ORM_METHODS = {'get', 'filter', 'exclude', 'all', 'first', 'count'}
+
+
+def _finding(rule: str, severity: str, node: ast.AST, message: str) -> Dict[str, Any]:
+    return {
+        "rule": rule,
+        "severity": severity,
+        "line": node.lineno,
+        "end_line": getattr(node, 'end_lineno', None) or node.lineno,
+        "message": message
+    }
+
+
+def _receiver_name(node: ast.AST) -> str:
+    while isinstance(node, (ast.Attribute, ast.Call)):
+        node = node.value if isinstance(node, ast.Attribute) else node.func
+    return node.id if isinstance(node, ast.Name) else ""
+
+
+def _iter_key(loop: ast.AST) -> Optional[str]:
+    """Normalized iterable of a for-loop (range(len(x)) counts as x)"""
+    if not isinstance(loop, (ast.For, ast.AsyncFor)):
+        return None
+    target = loop.iter
+    if isinstance(target, ast.Call) and isinstance(target.func, ast.Name) and target.func.id in ('range', 'enumerate'):
+        args = target.args
+        if args and isinstance(args[-1], ast.Call) and isinstance(args[-1].func, ast.Name) and args[-1].func.id == 'len':
+            target = args[-1].args[0] if args[-1].args else target
+        elif target.func.id == 'enumerate' and args:
+            target = args[0]
+    return ast.dump(target)
+
+
+def _is_io_call(call: ast.Call) -> Optional[str]:
+    func = call.func
+    if isinstance(func, ast.Name):
+        return func.id if func.id in ('open', 'urlopen') else None
+    if not isinstance(func, ast.Attribute):
+        return None
+    receiver = _receiver_name(func.value).lower()
+    if func.attr in IO_METHODS:
+        return f"{receiver}.{func.attr}" if receiver else func.attr
+    if func.attr in HTTP_VERBS and receiver in HTTP_RECEIVERS:
+        return f"{receiver}.{func.attr}"
+    if func.attr in ORM_METHODS and isinstance(func.value, ast.Attribute) and func.value.attr == 'objects':
+        return f"{_receiver_name(func.value)}.objects.{func.attr}"
+    return None
+
+
+class _FunctionScanner(ast.NodeVisitor):
+    """Walks one function body tracking loop nesting and local list/str variables"""
+
+    def __init__(self):
+        self.findings = []
+        self.loops = []
+        self.list_vars = set()
+        self.str_vars = set()
+        self.empty_lists = {}
+
+    def scan(self, body: List[ast.stmt]):
+        for statement in body:
+            self.visit(statement)
+        return self.findings
+
+    # Nested functions/classes are reported separately
+    def visit_FunctionDef(self, node):
+        pass
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+
+    def visit_Assign(self, node):
+        for target in node.targets:
+            if not isinstance(target, ast.Name):
+                continue
+            value = node.value
+            if isinstance(value, (ast.List, ast.ListComp)) or (
+                    isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id == 'list'):
+                self.list_vars.add(target.id)
+                if isinstance(value, ast.List) and not value.elts:
+                    self.empty_lists[target.id] = node.lineno
+            else:
+                self.list_vars.discard(target.id)
+            if isinstance(value, (ast.JoinedStr,)) or (isinstance(value, ast.Constant) and isinstance(value.value, str)):
+                self.str_vars.add(target.id)
+        self.generic_visit(node)
+
+    def _visit_loop(self, node):
+        key = _iter_key(node)
+        if key is not None and any(_iter_key(outer) == key for outer in self.loops):
+            self.findings.append(_finding(
+                'nested-loop-same-iterable', 'high', node,
+                "Nested loop over the same iterable is O(n²); index it in a dict/set or sort once"
+            ))
+
+        if isinstance(node, (ast.For, ast.AsyncFor)):
+            self._check_append_loop(node)
+
+        self.loops.append(node)
+        for child in node.body + node.orelse:
+            self.visit(child)
+        self.loops.pop()
+
+        # The loop header itself is evaluated once per iteration for while-loops
+        if isinstance(node, ast.While):
+            self.loops.append(node)
+            self.visit(node.test)
+            self.loops.pop()
+        else:
+            self.visit(node.iter)
+
+    visit_For = _visit_loop
+    visit_AsyncFor = _visit_loop
+    visit_While = _visit_loop
+
+    def _check_append_loop(self, node):
+        body = node.body
+        if len(body) == 1 and isinstance(body[0], ast.If) and not body[0].orelse:
+            body = body[0].body
+        if len(body) != 1 or not isinstance(body[0], ast.Expr) or not isinstance(body[0].value, ast.Call):
+            return
+        call = body[0].value
+        if isinstance(call.func, ast.Attribute) and call.func.attr == 'append' and \
+                isinstance(call.func.value, ast.Name) and call.func.value.id in self.empty_lists and not node.orelse:
+            self.findings.append(_finding(
+                'append-to-comprehension', 'low', node,
+                f"Loop only appends to '{call.func.value.id}'; a list comprehension is faster and clearer"
+            ))
+
+    def visit_Compare(self, node):
+        if self.loops:
+            for op, comparator in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.In, ast.NotIn)) and (
+                        isinstance(comparator, (ast.List, ast.ListComp)) or
+                        (isinstance(comparator, ast.Name) and comparator.id in self.list_vars)):
+                    self.findings.append(_finding(
+                        'list-membership-in-loop', 'medium', node,
+                        "Membership test against a list inside a loop is O(n) each time; use a set"
+                    ))
+                    break
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        if self.loops and isinstance(node.op, ast.Add) and isinstance(node.target, ast.Name):
+            value = node.value
+            is_str_value = isinstance(value, ast.JoinedStr) or (
+                isinstance(value, ast.Constant) and isinstance(value.value, str))
+            if node.target.id in self.str_vars or is_str_value:
+                self.findings.append(_finding(
+                    'string-concat-in-loop', 'medium', node,
+                    f"String '{node.target.id}' built with += in a loop; collect parts and ''.join() them"
+                ))
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        if self.loops:
+            io_call = _is_io_call(node)
+            if io_call:
+                self.findings.append(_finding(
+                    'io-in-loop', 'high', node,
+                    f"{io_call}() issued inside a loop (N+1); batch the requests or fetch once outside the loop"
+                ))
+        self.generic_visit(node)
+
+    def _visit_comprehension(self, node):
+        # Comprehensions are loops too
+        self.loops.append(node)
+        self.generic_visit(node)
+        self.loops.pop()
+
+    visit_ListComp = _visit_comprehension
+    visit_SetComp = _visit_comprehension
+    visit_DictComp = _visit_comprehension
+    visit_GeneratorExp = _visit_comprehension
+
+
+def analyze_tree(tree: ast.AST) -> List[Dict[str, Any]]:
+    """
+    Analyze a parsed module
+
+    Returns:
+        [{'function', 'line', 'end_line', 'findings': [...]}] for functions
+        with at least one finding ('<module>' for top-level code)
+    """
+    results = []
+
+    def add(name, node, body):
+        findings = _FunctionScanner().scan(body)
+        if findings:
+            results.append({
+                "function": name,
+                "line": getattr(node, 'lineno', 1),
+                "end_line": getattr(node, 'end_lineno', None) or getattr(node, 'lineno', 1),
+                "findings": sorted(findings, key=lambda f: f['line'])
+            })
+
+    add('<module>', tree, tree.body)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef):
+            for child in node.body:
+                if isinstance(child, FUNCTION_TYPES):
+                    child._qualname = f"{node.name}.{child.name}"
+    for node in ast.walk(tree):
+        if isinstance(node, FUNCTION_TYPES):
+            add(getattr(node, '_qualname', node.name), node, node.body)
+
+    return sorted(results, key=lambda r: r['line'])
+
+
+def analyze_source(code: str) -> List[Dict[str, Any]]:
+    """Parse and analyze source; files that do not parse yield no findings"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    return analyze_tree(tree)
+
+
+def flatten(function_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per-function results as a flat list of findings tagged with their function"""
+    return [dict(f, function=r['function']) for r in function_results for f in r['findings']]
+
+
+def format_function_findings(function_results: List[Dict[str, Any]]) -> str:
+    """Markdown grouped by function with line anchors"""
+    lines = []
+    for result in function_results:
+        lines.append(f"- `{result['function']}` (L{result['line']}-{result['end_line']})")
+        for f in result['findings']:
+            lines.append(f"  - **L{f['line']}** [{f['severity'].upper()}] `{f['rule']}`: {f['message']}")
+    return "\n".join(lines)
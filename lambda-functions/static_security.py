@@ -0,0 +1,248 @@
+"""
+Deterministic AST-based security rule pack
+
+Runs on the same ast tree CodeParser builds and reports dangerous sinks with
+exact line numbers:
+    eval-exec             eval()/exec() calls
+    pickle-loads          pickle/cPickle/dill load(s)
+    subprocess-shell      subprocess.* with shell=True (and os.system/popen)
+    sql-string-format     SQL built with f-strings, %, + or .format()
+    hardcoded-credential  credential-looking names assigned string literals
+    yaml-unsafe-load      yaml.load() without a safe Loader
+
+Pre-screening a file takes microseconds, so SecurityAgent uses it to skip the
+model for clean low-risk files and to anchor the model on risky lines.
+"""
+
+import ast
+import re
+from typing import Any, Dict, List
+
+SEVERITY_ORDER = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+# Statement structure, not just a leading verb ("Update your profile: %s" is not SQL).
+# Formatted parts are missing from the literal, so identifiers and column lists are optional.
+SQL_IDENT = r'[\w.*()"`\[\]]+'
+SQL_COLUMN = SQL_IDENT + r'(\s+AS\s+\w+)?'
+SQL_PATTERN = re.compile(rf'''^\s*(
+    SELECT\s+(DISTINCT\s+)?({SQL_COLUMN})?(\s*,\s*({SQL_COLUMN})?)*\s*FROM\b
+  | (INSERT|REPLACE)\s+(OR\s+\w+\s+)?INTO\b
+  | UPDATE\s+({SQL_IDENT})?\s*SET\b
+  | DELETE\s+FROM\b
+  | (CREATE|DROP|ALTER|TRUNCATE)\s+((TEMP|TEMPORARY|UNIQUE)\s+)?(TABLE|INDEX|VIEW|DATABASE|SCHEMA|SEQUENCE|TRIGGER)\b
+  | MERGE\s+INTO\b
+  | WITH\s+(RECURSIVE\s+)?({SQL_IDENT})?\s*AS\s*\(
+)''', re.IGNORECASE | re.VERBOSE)
+SQL_EXECUTE_METHODS = {'execute', 'executemany', 'executescript', 'raw', 'read_sql', 'read_sql_query'}
+CREDENTIAL_NAME = re.compile(r'(passw(or)?d|passwd|pwd|secret|api_?key|access_?key|private_?key|auth_?token|token|credential)', re.IGNORECASE)
+CREDENTIAL_VALUE = re.compile(r'(AKIA[0-9A-Z]{16}|gh[pousr]_[A-Za-z0-9]{36}|AIza[0-9A-Za-z_\-]{35}|xox[baprs]-[A-Za-z0-9-]{10,}|-----BEGIN [A-Z ]*PRIVATE KEY-----)')
+NON_SECRET_NAME = re.compile(r'(_url|_uri|_path|_file|_name|_type|_header|_field|_env|_key_id|_length|_prefix)$', re.IGNORECASE)
+PLACEHOLDER_VALUES = {'', 'changeme', 'your-api-key', 'xxx', 'none', 'null', 'todo', '<secret>', 'dummy', 'test'}
+
+SUBPROCESS_FUNCTIONS = {'call', 'run', 'Popen', 'check_call', 'check_output', 'getoutput', 'getstatusoutput'}
+PICKLE_MODULES = {'pickle', 'cPickle', '_pickle', 'dill', 'shelve'}
+SAFE_YAML_LOADERS = {'SafeLoader', 'CSafeLoader', 'BaseLoader'}
+
+
+def _finding(rule: str, severity: str, node: ast.AST, message: str, cwe: str) -> Dict[str, Any]:
+    return {
+        "rule": rule,
+        "severity": severity,
+        "line": node.lineno,
+        "end_line": getattr(node, 'end_lineno', None) or node.lineno,
+        "message": message,
+        "cwe": cwe
+    }
+
+
+def _import_aliases(tree: ast.AST) -> Dict[str, str]:
+    """Map local names to fully-qualified names (import x as y / from x import y)"""
+    aliases = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                aliases[alias.asname or alias.name.split('.')[0]] = alias.name if alias.asname else alias.name.split('.')[0]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            for alias in node.names:
+                aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return aliases
+
+
+def _qualified_name(func: ast.AST, aliases: Dict[str, str]) -> str:
+    """Resolve a call target like `sp.run` to `subprocess.run`"""
+    parts = []
+    while isinstance(func, ast.Attribute):
+        parts.append(func.attr)
+        func = func.value
+    if not isinstance(func, ast.Name):
+        return ".".join(reversed(parts))
+    parts.append(aliases.get(func.id, func.id))
+    return ".".join(reversed(parts))
+
+
+def _keyword(call: ast.Call, name: str):
+    return next((kw.value for kw in call.keywords if kw.arg == name), None)
+
+
+def _is_formatted_string(node: ast.AST) -> bool:
+    """f-string, '...' % x, '...' + x or '...'.format(x)"""
+    if isinstance(node, ast.JoinedStr):
+        return any(isinstance(v, ast.FormattedValue) for v in node.values)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Mod, ast.Add)):
+        return _string_literal(node.left) is not None or _string_literal(node.right) is not None or \
+            _is_formatted_string(node.left)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'format':
+        return _string_literal(node.func.value) is not None
+    return False
+
+
+def _string_literal(node: ast.AST):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        return "".join(v.value for v in node.values if isinstance(v, ast.Constant) and isinstance(v.value, str))
+    if isinstance(node, ast.BinOp):
+        return _string_literal(node.left)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'format':
+        return _string_literal(node.func.value)
+    return None
+
+
+def _check_call(node: ast.Call, aliases: Dict[str, str], findings: List[Dict[str, Any]], sql_args: set):
+    name = _qualified_name(node.func, aliases)
+    module, _, function = name.rpartition('.')
+
+    if name in ('eval', 'exec', 'builtins.eval', 'builtins.exec'):
+        findings.append(_finding(
+            'eval-exec', 'critical', node,
+            f"{function or name}() executes dynamic code; never pass untrusted input", 'CWE-95'
+        ))
+
+    elif module in PICKLE_MODULES and function in ('loads', 'load', 'Unpickler', 'open'):
+        findings.append(_finding(
+            'pickle-loads', 'high', node,
+            f"{name}() deserializes arbitrary objects and can execute code on untrusted data", 'CWE-502'
+        ))
+
+    elif module == 'subprocess' and function in SUBPROCESS_FUNCTIONS:
+        shell = _keyword(node, 'shell')
+        if function in ('getoutput', 'getstatusoutput') or (isinstance(shell, ast.Constant) and shell.value is True):
+            findings.append(_finding(
+                'subprocess-shell', 'high', node,
+                f"{name}() runs through the shell; pass an argument list with shell=False", 'CWE-78'
+            ))
+
+    elif name in ('os.system', 'os.popen'):
+        findings.append(_finding(
+            'subprocess-shell', 'high', node,
+            f"{name}() runs a shell command; use subprocess with an argument list", 'CWE-78'
+        ))
+
+    elif module == 'yaml' and function in ('load', 'load_all', 'unsafe_load', 'full_load'):
+        loader = _keyword(node, 'Loader')
+        if loader is None and len(node.args) > 1:
+            loader = node.args[1]
+        loader_name = _qualified_name(loader, aliases).rpartition('.')[2] if loader is not None else None
+        if function == 'unsafe_load' or loader_name not in SAFE_YAML_LOADERS:
+            findings.append(_finding(
+                'yaml-unsafe-load', 'high', node,
+                f"{name}() without SafeLoader can construct arbitrary objects; use yaml.safe_load()", 'CWE-502'
+            ))
+
+    if function in SQL_EXECUTE_METHODS and node.args and _is_formatted_string(node.args[0]):
+        # Every part of the argument, so a multi-line concatenation is not reported again below
+        sql_args.update(id(part) for part in ast.walk(node.args[0]))
+        findings.append(_finding(
+            'sql-string-format', 'critical', node,
+            f"SQL passed to {function}() is built by string formatting; use parameterized queries", 'CWE-89'
+        ))
+
+
+def _check_credential(target: ast.AST, value: ast.AST, node: ast.AST, findings: List[Dict[str, Any]]):
+    if isinstance(target, ast.Name):
+        name = target.id
+    elif isinstance(target, ast.Attribute):
+        name = target.attr
+    elif isinstance(target, ast.Constant) and isinstance(target.value, str):
+        name = target.value
+    else:
+        return
+
+    literal = value.value if isinstance(value, ast.Constant) and isinstance(value.value, str) else None
+    if literal is None or literal.strip().lower() in PLACEHOLDER_VALUES:
+        return
+
+    if CREDENTIAL_VALUE.search(literal):
+        looks_like_secret = True
+    else:
+        looks_like_secret = (
+            CREDENTIAL_NAME.search(name) is not None
+            and NON_SECRET_NAME.search(name) is None
+            and len(literal) >= 6
+            and not re.search(r'\s|^https?://', literal)
+        )
+
+    if looks_like_secret:
+        findings.append(_finding(
+            'hardcoded-credential', 'critical', node,
+            f"Hard-coded credential assigned to '{name}'; load it from Secrets Manager or the environment", 'CWE-798'
+        ))
+
+
+def analyze_tree(tree: ast.AST) -> List[Dict[str, Any]]:
+    """Run every rule over a parsed module; findings sorted by line"""
+    aliases = _import_aliases(tree)
+    findings = []
+    sql_args = set()
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            _check_call(node, aliases, findings, sql_args)
+
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                _check_credential(target, node.value, node, findings)
+
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            _check_credential(node.target, node.value, node, findings)
+
+        elif isinstance(node, ast.keyword) and node.arg:
+            _check_credential(ast.Name(id=node.arg), node.value, node.value, findings)
+
+        elif isinstance(node, ast.Dict):
+            for key, value in zip(node.keys, node.values):
+                if key is not None:
+                    _check_credential(key, value, value, findings)
+
+    # SQL assembled by formatting before being passed to execute()
+    reported = {(f['rule'], f['line']) for f in findings}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.JoinedStr, ast.BinOp, ast.Call)) and id(node) not in sql_args \
+                and _is_formatted_string(node):
+            literal = _string_literal(node) or ""
+            if SQL_PATTERN.match(literal) and ('sql-string-format', node.lineno) not in reported:
+                findings.append(_finding(
+                    'sql-string-format', 'high', node,
+                    "SQL statement built by string formatting; use parameterized queries", 'CWE-89'
+                ))
+                reported.add(('sql-string-format', node.lineno))
+
+    return sorted(findings, key=lambda f: (f['line'], SEVERITY_ORDER[f['severity']]))
+
+
+def analyze_source(code: str) -> List[Dict[str, Any]]:
+    """Parse and analyze source; files that do not parse yield no findings"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    return analyze_tree(tree)
+
+
+def format_findings(findings: List[Dict[str, Any]]) -> str:
+    """Markdown list of findings with exact line anchors"""
+    lines = []
+    for f in findings:
+        span = f"L{f['line']}" if f['end_line'] == f['line'] else f"L{f['line']}-{f['end_line']}"
+        lines.append(f"- **{span}** [{f['severity'].upper()}] `{f['rule']}` ({f['cwe']}): {f['message']}")
+    return "\n".join(lines)
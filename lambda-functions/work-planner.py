@@ -0,0 +1,38 @@
+from lambda_startup import log_startup
+from review_coalescing import check_superseded
+from work_items import MAP_MAX_CONCURRENCY, plan_work_items, store_work_items
+
+def lambda_handler(event, context):
+    """Split the review into (file chunk x agent) work items for the Map state"""
+    
+    print("=" * 60)
+    print("🗂️  WORK PLANNER")
+    print("=" * 60)
+    log_startup("WorkPlanner")
+    
+    # A newer push to the PR makes this execution stale
+    superseded = check_superseded(event, "WorkPlanner")
+    if superseded:
+        return dict(superseded, work_items=[], max_concurrency=1)
+    
+    try:
+        # Items are stored in S3; the Map state only sees pointers
+        work_items = store_work_items(plan_work_items(event))
+        
+        print(f"📋 {len(work_items)} work items, max concurrency {MAP_MAX_CONCURRENCY}")
+        
+        return {
+            "statusCode": 200,
+            "work_items": work_items,
+            "max_concurrency": MAP_MAX_CONCURRENCY
+        }
+        
+    except Exception as e:
+        print(f"❌ CRITICAL ERROR in WorkPlanner: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        
+        return {
+            "statusCode": 500,
+            "error": str(e)
+        }
@@ -0,0 +1,41 @@
+from lambda_startup import log_startup
+from work_items import load_item_results, reduce_results
+
+def lambda_handler(event, context):
+    """Fold Map item results back into per-agent results for ReviewAggregator"""
+    
+    print("=" * 60)
+    print("🧮 WORK REDUCER")
+    print("=" * 60)
+    log_startup("WorkReducer")
+    
+    try:
+        work_items = event.get('work_items', [])
+        item_results = event.get('item_results', [])
+        
+        if len(work_items) != len(item_results):
+            return {
+                "statusCode": 400,
+                "error": f"{len(item_results)} results for {len(work_items)} work items"
+            }
+        
+        # Map items return pointers; their results are read back from S3
+        reduced = reduce_results(work_items, load_item_results(work_items, item_results))
+        
+        for agent, result in reduced.items():
+            print(f"✅ {agent}: {result['work_items']} items, {result['failed_items']} failed, {result['tokens']} tokens")
+        
+        return {
+            "statusCode": 200,
+            **reduced
+        }
+        
+    except Exception as e:
+        print(f"❌ CRITICAL ERROR in WorkReducer: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        
+        return {
+            "statusCode": 500,
+            "error": str(e)
+        }
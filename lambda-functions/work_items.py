@@ -0,0 +1,241 @@
+"""
+Per-file fan-out of agent work for the Map orchestration mode
+
+Instead of one Lambda per agent walking every file, WorkPlanner emits one
+work item per (file chunk x agent). Each item is a complete agent event
+holding only its own files' parse metadata, context and cache handles. A
+Step Functions Map state runs the items with MaxConcurrency, and WorkReducer
+folds the item results back into the per-agent shape ReviewAggregator
+expects.
+
+Items and their results do not travel through the state (256 KB limit): the
+planner stores each item under MAP_STATE_PREFIX and the Map iterates over
+small pointers. An agent given a pointer loads its item (load_work_item) and
+stores its result next to it (store_item_result), returning a pointer with
+counts. WorkReducer reads the results back (load_item_results).
+
+LocalExecutor implements the same plan -> map -> reduce contract in-process
+for tests and local runs, with or without a state prefix.
+"""
+
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+from agent_results import AGENTS
+from model_router import summarize_routing
+from object_store import read_object, write_object
+
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'code-review-storage-sanya-2025')
+MAP_STATE_PREFIX = os.environ.get('MAP_STATE_PREFIX', f"s3://{BUCKET_NAME}/map-state")
+MAP_MAX_CONCURRENCY = int(os.environ.get('MAP_MAX_CONCURRENCY', '10'))
+MAP_FILES_PER_ITEM = int(os.environ.get('MAP_FILES_PER_ITEM', '1'))
+
+# Fields copied unchanged into every item
+SHARED_FIELDS = ('repo_name', 'pr_number', 'head_sha', 'action')
+
+STAT_SUMS = ('calls', 'attempts', 'retries', 'hedges', 'hedge_wins', 'hedges_skipped', 'timeouts', 'total_call_ms')
+
+
+def chunk_files(files: List[Dict[str, Any]], size: int) -> List[List[Dict[str, Any]]]:
+    size = max(1, size)
+    return [files[i:i + size] for i in range(0, len(files), size)]
+
+
+def plan_work_items(event: Dict[str, Any], agents=AGENTS, files_per_item: int = None) -> List[Dict[str, Any]]:
+    """
+    Build one agent event per (file chunk, agent)
+
+    Args:
+        event: state after EnhanceContext (uploaded_files, parsed_files,
+            context_map, context_caches, repo_name, pr_number, ...)
+    """
+    files = [f for f in event.get('uploaded_files', []) if not f.get('carried_forward')]
+    parsed_by_file = {p.get('filename'): p for p in event.get('parsed_files', [])}
+    context_map = event.get('context_map', {})
+    context_caches = event.get('context_caches', {})
+
+    items = []
+    for index, chunk in enumerate(chunk_files(files, files_per_item or MAP_FILES_PER_ITEM)):
+        names = [f.get('filename') for f in chunk]
+        for agent in agents:
+            item = {field: event[field] for field in SHARED_FIELDS if field in event}
+            item.update({
+                'item_id': f"{agent}-{index}",
+                'agent': agent,
+                'chunk': index,
+                'files': names,
+                'uploaded_files': chunk,
+                'parsed_files': [parsed_by_file[n] for n in names if n in parsed_by_file],
+                'context_map': {n: context_map[n] for n in names if n in context_map},
+                'context_caches': {n: context_caches[n] for n in names if n in context_caches}
+            })
+            items.append(item)
+    return items
+
+
+def store_work_items(items: List[Dict[str, Any]], prefix: str = None, run_id: str = None) -> List[Dict[str, Any]]:
+    """
+    Store each item under <prefix>/<run_id>/items/ and return the Map's pointers
+
+    Pointers keep the shared fields (so stages can check for a newer push),
+    the agent and the file names; everything else stays in the object store.
+    """
+    prefix = prefix or MAP_STATE_PREFIX
+    if run_id is None:
+        first = items[0] if items else {}
+        run_id = f"{first.get('repo_name', 'local')}/pr-{first.get('pr_number', 0)}/{uuid.uuid4().hex[:12]}"
+
+    pointers = []
+    for item in items:
+        name = f"{run_id}/items/{item['item_id']}.json"
+        write_object(prefix, name, json.dumps(item).encode('utf-8'), 'application/json')
+        pointer = {field: item[field] for field in SHARED_FIELDS if field in item}
+        pointer.update({
+            'item_id': item['item_id'],
+            'agent': item['agent'],
+            'chunk': item['chunk'],
+            'files': item['files'],
+            'state_prefix': prefix,
+            'work_item': name,
+            'result_key': f"{run_id}/results/{item['item_id']}.json"
+        })
+        pointers.append(pointer)
+    return pointers
+
+
+def load_work_item(event: Dict[str, Any]) -> Dict[str, Any]:
+    """The full agent event behind a Map pointer (other events are returned as they are)"""
+    if 'work_item' not in event:
+        return event
+    item = json.loads(read_object(event['state_prefix'], event['work_item']))
+    item.update(state_prefix=event['state_prefix'], result_key=event['result_key'])
+    return item
+
+
+def store_item_result(event: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store an agent result of a Map item and return a pointer with counts
+
+    Results of events that did not come from a pointer are returned as they are.
+    """
+    if 'result_key' not in event:
+        return result
+    write_object(event['state_prefix'], event['result_key'], json.dumps(result).encode('utf-8'), 'application/json')
+    return {
+        "statusCode": result.get('statusCode', 200),
+        "agent": result.get('agent', event.get('agent')),
+        "item_id": event.get('item_id'),
+        "result_key": event['result_key'],
+        "file_reviews": len(result.get('file_reviews', [])),
+        "findings": len(result.get('findings', [])),
+        "tokens": result.get('tokens', 0)
+    }
+
+
+def load_item_results(items: List[Dict[str, Any]], item_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Full agent results for the Map output (in plan order)
+
+    Pointers are read from the item's state prefix; inline results (errors
+    caught by the Map state, superseded items) are kept.
+    """
+    results = []
+    for item, result in zip(items, item_results):
+        if result and result.get('result_key') and not result.get('error'):
+            result = json.loads(read_object(item.get('state_prefix') or MAP_STATE_PREFIX, result['result_key']))
+        results.append(result)
+    return results
+
+
+def merge_request_stats(stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine per-item request_policy summaries"""
+    merged = {key: 0 for key in STAT_SUMS}
+    merged['max_call_ms'] = 0
+    for item in stats:
+        for key in STAT_SUMS:
+            merged[key] += item.get(key, 0)
+        merged['max_call_ms'] = max(merged['max_call_ms'], item.get('max_call_ms', 0))
+    merged['total_call_ms'] = round(merged['total_call_ms'], 1)
+    return merged
+
+
+def reduce_results(items: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fold item results (in plan order) into one result per agent
+
+    An item that failed contributes an error section for its files; an agent
+    is only marked as errored when every one of its items failed.
+    """
+    reduced = {}
+    for agent in AGENTS:
+        pairs = [(item, result or {}) for item, result in zip(items, results) if item['agent'] == agent]
+        file_reviews, routing, findings, stats = [], [], [], []
+        tokens, cost, failed = 0, 0.0, 0
+
+        for item, result in pairs:
+            if result.get('error') or result.get('statusCode', 200) != 200:
+                failed += 1
+                message = result.get('message') or 'Unknown error'
+                file_reviews.extend({'file': name, 'review': f"Error analyzing file: {message}"}
+                                    for name in item['files'])
+                continue
+            file_reviews.extend(result.get('file_reviews', []))
+            routing.extend(result.get('routing', []))
+            findings.extend(result.get('findings', []))
+            stats.append(result.get('request_stats', {}))
+            tokens += result.get('tokens', 0)
+            cost += result.get('cost', 0)
+
+        reduced[agent] = {
+            "statusCode": 200,
+            "agent": agent,
+            "tokens": tokens,
+            "cost": cost,
+            "request_stats": merge_request_stats(stats),
+            "routing": routing,
+            "routing_summary": summarize_routing(routing),
+            "file_reviews": file_reviews,
+            "findings": findings,
+            "work_items": len(pairs),
+            "failed_items": failed
+        }
+        if pairs and failed == len(pairs):
+            reduced[agent]["error"] = True
+    return reduced
+
+
+class LocalExecutor:
+    """
+    In-process stand-in for the Map state
+
+    handlers maps agent name -> lambda_handler(event, context); items run on
+    a thread pool bounded like MaxConcurrency and results keep plan order.
+    With state_prefix set, items and results go through the object store as
+    they do in the Map state.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable], max_concurrency: int = None, state_prefix: str = None):
+        self.handlers = handlers
+        self.max_concurrency = max_concurrency or MAP_MAX_CONCURRENCY
+        self.state_prefix = state_prefix
+
+    def _run_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self.handlers[item['agent']](item, None)
+        except Exception as e:
+            # Mirrors the Map state's Catch on an item
+            return {"statusCode": 500, "error": True, "message": str(e)}
+
+    def map(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with ThreadPoolExecutor(max_workers=max(1, self.max_concurrency)) as pool:
+            return list(pool.map(self._run_item, items))
+
+    def run(self, event: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """plan -> map -> reduce; returns {'security', 'performance', 'best_practices'}"""
+        items = plan_work_items(event)
+        if not self.state_prefix:
+            return reduce_results(items, self.map(items))
+        pointers = store_work_items(items, self.state_prefix)
+        return reduce_results(pointers, load_item_results(pointers, self.map(pointers)))
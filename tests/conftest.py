@@ -0,0 +1,7 @@
+import os
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda-functions')
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tools')
+sys.path.insert(0, LAMBDA_DIR)
+sys.path.insert(0, TOOLS_DIR)
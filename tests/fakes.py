@@ -0,0 +1,43 @@
+"""In-memory stand-ins for the DynamoDB pieces the handlers use"""
+
+
+class DuplicateKeyError(Exception):
+    pass
+
+
+class FakeBatchWriter:
+    """Mimics boto3's batch_writer: duplicate keys in one batch are rejected unless overwrite_by_pkeys is set"""
+
+    def __init__(self, table, overwrite_by_pkeys):
+        self.table = table
+        self.keys = overwrite_by_pkeys
+        self.pending = []
+
+    def put_item(self, Item):
+        if self.keys:
+            key = tuple(Item[k] for k in self.keys)
+            self.pending = [item for item in self.pending if tuple(item[k] for k in self.keys) != key]
+        self.pending.append(Item)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        keys = [item[self.table.key] for item in self.pending]
+        if len(keys) != len(set(keys)):
+            raise DuplicateKeyError("Provided list of item keys contains duplicates")
+        for item in self.pending:
+            self.table.items[item[self.table.key]] = item
+        return False
+
+
+class FakeTable:
+    def __init__(self, key='id'):
+        self.key = key
+        self.items = {}
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return FakeBatchWriter(self, overwrite_by_pkeys)
+
+    def put_item(self, Item, **kwargs):
+        self.items[Item[self.key]] = Item
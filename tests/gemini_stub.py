@@ -0,0 +1,75 @@
+"""Local stand-in for the Gemini REST API (stdlib http.server on a free port)"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GeminiStub:
+    """
+    Scripted responses per path suffix (e.g. ':generateContent'): each
+    request pops the next (status, body) pair; the last pair repeats.
+    """
+
+    def __init__(self):
+        self.scripts = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                stub.requests.append({'method': self.command, 'path': self.path, 'body': body,
+                                      'api_key': self.headers.get('x-goog-api-key')})
+                action = self.path.split('?')[0].rpartition(':')[2] if ':' in self.path else self.command
+                script = stub.scripts.get(action, [(404, {'error': 'not scripted'})])
+                status, payload = script.pop(0) if len(script) > 1 else script[0]
+                if callable(payload):
+                    payload = payload(body)
+
+                if isinstance(payload, list):
+                    # Server-sent events, one chunk per event
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for event in payload:
+                        data = f"data: {json.dumps(event)}\r\n\r\n".encode('utf-8')
+                        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_POST = _handle
+            do_DELETE = _handle
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1beta"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def script(self, action: str, *responses):
+        self.scripts[action] = list(responses)
+
+    def calls(self, action: str):
+        return [r for r in self.requests if r['path'].split('?')[0].endswith(f":{action}")]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
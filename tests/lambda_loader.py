@@ -0,0 +1,14 @@
+"""Import a Lambda handler file (hyphenated names are not importable directly)"""
+
+import importlib.util
+import os
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda-functions')
+
+
+def load_handler(filename: str):
+    name = filename.replace('-', '_').replace('.py', '') + '_handler'
+    spec = importlib.util.spec_from_file_location(name, os.path.join(LAMBDA_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,133 @@
+import io
+import json
+import time
+
+import pytest
+
+import gemini_client
+import request_policy
+from context_cache import is_cache_miss
+from gemini_stub import GeminiStub
+from lambda_loader import load_handler
+
+SOURCE = "def load(cur, uid):\n    cur.execute(\"SELECT * FROM users WHERE id = \" + uid)\n" * 3
+
+AGENTS = ['security-agent.py', 'performance-agent.py', 'best-practices-agent.py']
+
+
+class FakeS3:
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(SOURCE.encode('utf-8'))}
+
+
+def reply(text):
+    return {'candidates': [{'content': {'parts': [{'text': text}]}}]}
+
+
+def review_event(cache_name):
+    return {
+        'repo_name': 'acme/api',
+        'pr_number': 3,
+        'uploaded_files': [{'filename': 'app/db.py', 's3_key': 'code/app/db.py'}],
+        'parsed_files': [],
+        'context_caches': {'app/db.py': {'name': cache_name, 'backend': 'gemini', 'model': 'gemini-2.5-flash',
+                                         'expires_at': int(time.time()) + 600, 'cached_tokens': 2000}}
+    }
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    with GeminiStub() as stub:
+        monkeypatch.setattr(gemini_client, 'API_BASE', stub.url)
+        gemini_client.configure(api_key='test-key')
+        yield stub
+        gemini_client.configure(api_key=None)
+
+
+def load_agent(filename, monkeypatch):
+    agent = load_handler(filename)
+    monkeypatch.setattr(agent, 'get_gemini_api_key', lambda: 'test-key')
+    monkeypatch.setattr(agent, 'get_genai', lambda: gemini_client)
+    monkeypatch.setattr(agent, 'get_client', lambda service, **kwargs: FakeS3())
+    return agent
+
+
+@pytest.mark.parametrize('filename', AGENTS)
+def test_expired_cache_falls_back_to_the_full_prompt(filename, gemini, monkeypatch):
+    agent = load_agent(filename, monkeypatch)
+    gemini.script('generateContent', (404, {'error': {'message': 'CachedContent not found'}}),
+                  (200, reply("Looks risky")))
+
+    result = agent.lambda_handler(review_event('cachedContents/expired'), None)
+
+    assert result['statusCode'] == 200
+    review = result['file_reviews'][0]['review']
+    assert review.startswith("Looks risky") and "Error analyzing file" not in review
+    cached, full = gemini.calls('generateContent')
+    assert cached['body']['cachedContent'] == 'cachedContents/expired'
+    assert 'cachedContent' not in full['body']
+    assert 'SELECT * FROM users' in full['body']['contents'][0]['parts'][0]['text']
+
+
+@pytest.mark.parametrize('filename', AGENTS)
+def test_throttled_cached_call_is_not_repeated_with_the_full_prompt(filename, gemini, monkeypatch):
+    agent = load_agent(filename, monkeypatch)
+    monkeypatch.setattr(request_policy, 'MAX_ATTEMPTS', 1)
+    gemini.script('generateContent', (429, {'error': {'status': 'RESOURCE_EXHAUSTED'}}))
+
+    result = agent.lambda_handler(review_event('cachedContents/live'), None)
+
+    assert "Error analyzing file" in result['file_reviews'][0]['review']
+    (call,) = gemini.calls('generateContent')
+    assert call['body']['cachedContent'] == 'cachedContents/live'
+
+
+def test_cache_misses_are_told_apart_from_other_errors():
+    assert is_cache_miss(KeyError('cachedContents/local-1'))
+    assert is_cache_miss(gemini_client.GeminiAPIError(404, 'CachedContent not found'))
+    assert is_cache_miss(gemini_client.GeminiAPIError(403, 'CachedContent not found (or permission denied)'))
+    assert not is_cache_miss(gemini_client.GeminiAPIError(429, 'RESOURCE_EXHAUSTED'))
+    assert not is_cache_miss(request_policy.RequestTimeout('No response within 60s'))
+
+
+def test_live_cache_sends_only_the_instruction(gemini, monkeypatch):
+    agent = load_agent('security-agent.py', monkeypatch)
+    gemini.script('generateContent', (200, reply("Cached review")))
+
+    result = agent.lambda_handler(review_event('cachedContents/live'), None)
+
+    assert result['file_reviews'][0]['review'].startswith("Cached review")
+    (call,) = gemini.calls('generateContent')
+    assert call['body']['cachedContent'] == 'cachedContents/live'
+    assert 'SELECT * FROM users' not in call['body']['contents'][0]['parts'][0]['text']
+
+
+def test_static_security_findings_move_fast_routes_to_the_deep_model(gemini, monkeypatch):
+    agent = load_agent('security-agent.py', monkeypatch)
+    fast = {'file': 'app/db.py', 'tier': 'fast', 'model': agent.override_route({}, 'fast', '')['model'],
+            'risk_score': 0.5, 'reason': 'low risk'}
+    monkeypatch.setattr(agent, 'route_file', lambda *args: dict(fast))
+    gemini.script('generateContent', (200, reply("Injection confirmed")))
+
+    result = agent.lambda_handler(dict(review_event('cachedContents/live'), context_caches={}), None)
+
+    assert result['routing'][0]['tier'] == 'deep'
+    (call,) = gemini.calls('generateContent')
+    assert call['path'].split(':')[0].endswith(result['routing'][0]['model'])
+
+
+@pytest.mark.parametrize('filename', AGENTS)
+def test_every_agent_returns_structured_model_findings(filename, gemini, monkeypatch):
+    agent = load_agent(filename, monkeypatch)
+    gemini.script('generateContent', (200, reply(json.dumps({'summary': "One issue.", 'findings': [
+        {'line': 2, 'end_line': 2, 'severity': 'high', 'issue_type': 'sql-string-format',
+         'title': "Query built by concatenation", 'detail': "Pass `uid` as a parameter."}]}))))
+
+    result = agent.lambda_handler(dict(review_event('cachedContents/live'), context_caches={}), None)
+
+    model = [f for f in result['findings'] if f['source'] == 'model']
+    assert [(f['file'], f['agent'], f['rule'], f['line']) for f in model] == \
+        [('app/db.py', result['agent'], 'sql-string-format', 2)]
+    assert result['file_reviews'][0]['review'].startswith("One issue.")
+    (call,) = gemini.calls('generateContent')
+    assert call['body']['generationConfig'] == {'response_mime_type': 'application/json'}
@@ -0,0 +1,72 @@
+import subprocess
+
+import pytest
+
+from backfill import SeenLog, changed_blobs, commit_blobs, list_commits
+
+
+def git(repo, *args):
+    return subprocess.run(['git', '-C', str(repo), *args], check=True, capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, 'init', '-q', '-b', 'main')
+    git(tmp_path, 'config', 'user.email', 'dev@example.com')
+    git(tmp_path, 'config', 'user.name', 'dev')
+
+    def commit(files, message, remove=()):
+        for name, content in files.items():
+            path = tmp_path / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+            git(tmp_path, 'add', name)
+        for name in remove:
+            git(tmp_path, 'rm', '-q', name)
+        git(tmp_path, 'commit', '-q', '-m', message)
+
+    commit({'app/models.py': 'class A:\n    pass\n', 'README.md': '# app\n'}, 'init')
+    commit({'app/views.py': 'def index():\n    return 1\n'}, 'views')
+    git(tmp_path, 'checkout', '-q', '-b', 'feature')
+    commit({'app/forms.py': 'def form():\n    return 2\n'}, 'forms')
+    git(tmp_path, 'checkout', '-q', 'main')
+    commit({'app/models.py': 'class A:\n    name = 1\n'}, 'models', remove=['app/views.py'])
+    git(tmp_path, 'merge', '-q', '--no-ff', '-m', 'merge feature', 'feature')
+    return tmp_path
+
+
+def test_changed_blobs_cover_every_tree_in_the_history(repo):
+    commits = list_commits(str(repo), 'HEAD')
+    walked = list(changed_blobs(str(repo), None, commits[-1]))
+
+    assert [commit for commit, _ in walked] == commits
+    seen = set()
+    for commit, blobs in walked:
+        seen.update(blobs)
+        assert set(commit_blobs(str(repo), commit)) <= seen
+    assert all(path.endswith('.py') for _, path in seen)
+    # The merge contributes the feature branch's file, the deletion nothing
+    assert [path for _, path in walked[-1][1]] == ['app/forms.py']
+    assert walked[2][1] == [(git(repo, 'rev-parse', f"{commits[2]}:app/models.py").strip(), 'app/models.py')]
+
+
+def test_changed_blobs_resume_after_a_commit(repo):
+    commits = list_commits(str(repo), 'HEAD')
+    assert [commit for commit, _ in changed_blobs(str(repo), commits[1], commits[-1])] == commits[2:]
+
+
+def test_seen_log_appends_and_drops_entries_after_the_checkpoint(tmp_path):
+    path = str(tmp_path / 'state' / 'backfill.json.seen')
+    log = SeenLog(path)
+    offset = log.append(['a' * 40, 'b' * 40], ['snippet-1'])
+    size = len(open(path).read())
+    assert offset == size
+
+    # Entries appended after the last checkpoint are not trusted
+    assert log.append(['c' * 40], ['snippet-1', 'snippet-2']) > offset
+    resumed = SeenLog(path, offset)
+    assert resumed.blobs == {'a' * 40, 'b' * 40} and resumed.snippets == {'snippet-1'}
+
+    # Already-seen entries are not written again
+    assert resumed.append(['a' * 40], ['snippet-1']) == offset
+    assert SeenLog(path, 0).blobs == set()
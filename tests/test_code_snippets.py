@@ -0,0 +1,80 @@
+from code_analysis import parse_python_file
+from code_snippets import chunk_function, estimate_tokens, normalize_source, source_snippets
+from embedding_batch import snippet_embedding_id
+
+
+def long_function(statements):
+    body = "\n".join(f"    total_{i} = compute(values[{i}], weights[{i}], offset={i})" for i in range(statements))
+    return f"def score(values, weights):\n    \"\"\"Weighted score\"\"\"\n{body}\n    return total_0\n"
+
+
+def test_chunks_split_between_statements_and_keep_the_signature():
+    source = long_function(40)
+    chunks = chunk_function(source, max_tokens=120)
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith("def score(values, weights):\n") for chunk in chunks)
+    assert all(estimate_tokens(chunk) <= 120 + estimate_tokens("def score(values, weights):") for chunk in chunks)
+    # Every body statement appears exactly once, whole
+    body = [line for chunk in chunks for line in chunk.split("\n")[1:]]
+    assert body == source.rstrip("\n").split("\n")[1:]
+
+
+def test_comment_and_indentation_changes_keep_the_embedding_id():
+    original = "def load(path):\n    with open(path) as f:\n        return f.read()\n"
+    reformatted = ("    def load(path):\n        # read the whole file\n\n"
+                   "        with open(path) as f:   \n            return f.read()  # text\n")
+    assert normalize_source(reformatted) == normalize_source(original)
+    assert snippet_embedding_id(normalize_source(reformatted)) == snippet_embedding_id(normalize_source(original))
+    assert snippet_embedding_id(normalize_source(original.replace("read()", "readline()"))) != \
+        snippet_embedding_id(normalize_source(original))
+
+
+def test_oversized_if_and_try_bodies_split_at_statement_boundaries():
+    branch = "\n".join(f"            row_{i} = fetch(cursor, {i}, retries=3)" for i in range(30))
+    source = ("def sync(cursor, enabled):\n"
+              "    if enabled:\n"
+              "        try:\n"
+              f"{branch}\n"
+              "        except TimeoutError:\n"
+              "            return None\n"
+              "        finally:\n"
+              "            cursor.close()\n"
+              "    return True\n")
+    chunks = chunk_function(source, max_tokens=150)
+
+    assert len(chunks) > 1
+    lines = [line for chunk in chunks for line in chunk.split("\n")[1:]]
+    # Headers, handlers and finally blocks survive as their own units; no statement is cut in half
+    assert lines == source.rstrip("\n").split("\n")[1:]
+    for chunk in chunks:
+        assert all(line.strip().startswith(("row_", "if ", "try:", "except", "return", "finally:", "cursor."))
+                   for line in chunk.split("\n")[1:])
+
+
+CODE = '''
+def outer(items):
+    def key(item):
+        return item.name
+
+    return sorted(items, key=key)
+
+
+class Store:
+    """Keeps things"""
+    limit = 10
+
+    def save(self, key, value):
+        self.items[key] = value
+'''
+
+
+def test_nested_functions_are_folded_into_their_parent():
+    snippets = source_snippets(parse_python_file(CODE, 'app/store.py'), CODE)
+    functions = [s for s in snippets if s['type'] == 'function']
+
+    assert sorted(s['name'] for s in functions) == ['outer', 'save']
+    outer = next(s for s in functions if s['name'] == 'outer')
+    assert "def key(item):" in outer['context'] and outer['parts'] == 1
+    (store,) = [s for s in snippets if s['type'] == 'class']
+    assert "limit = 10" in store['context'] and "def save" not in store['context']
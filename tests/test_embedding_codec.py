@@ -0,0 +1,42 @@
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.types import Binary
+
+from embedding_codec import decode_item, decode_vector, encode_vector, vector_attributes
+
+VECTOR = [0.5, -1.25, 3.0, 0.0, 1e-3]
+
+
+def test_float32_round_trip_is_exact_for_representable_values():
+    packed = encode_vector(VECTOR, 'float32')
+    assert len(packed) == 4 * len(VECTOR)
+    decoded = decode_vector(packed, 'float32')
+    # Zero-copy view over the packed bytes
+    assert isinstance(decoded, memoryview) and decoded.obj is not None
+    assert decoded.tolist()[:4] == VECTOR[:4] and decoded[4] == pytest.approx(1e-3, rel=1e-6)
+
+
+def test_float16_round_trip_halves_the_size():
+    packed = encode_vector(VECTOR, 'float16')
+    assert len(packed) == 2 * len(VECTOR)
+    assert decode_vector(packed, 'float16') == pytest.approx(VECTOR, abs=1e-3)
+
+
+def test_legacy_decimal_lists_are_still_read():
+    item = {'embedding_vector': [Decimal('0.5'), Decimal('-1.25'), Decimal('3')]}
+    assert decode_item(item) == [0.5, -1.25, 3.0]
+
+
+def test_boto3_binary_attributes_are_unwrapped():
+    attributes = vector_attributes(VECTOR, 'float16')
+    item = dict(attributes, embedding_vector=Binary(attributes['embedding_vector']))
+    assert decode_item(item) == pytest.approx(VECTOR, abs=1e-3)
+    assert list(decode_vector(Binary(encode_vector(VECTOR, 'float32')))) == pytest.approx(VECTOR)
+
+
+def test_unknown_dtype_is_rejected():
+    with pytest.raises(ValueError):
+        encode_vector(VECTOR, 'float64')
+    with pytest.raises(ValueError):
+        decode_vector(encode_vector(VECTOR, 'float32'), 'int8')
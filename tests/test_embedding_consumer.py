@@ -0,0 +1,44 @@
+import embedding_index
+from embedding_jobs import build_jobs
+from job_queue import LocalQueue
+from fakes import FakeTable
+from lambda_loader import load_handler
+
+
+class FakeGenai:
+    def embed_content(self, model, content, task_type):
+        return {'embedding': [[float(len(text)), 1.0, 0.5] for text in content]}
+
+
+def snippet(name, context):
+    return {'type': 'function', 'name': name, 'filename': 'models.py', 'context': context}
+
+
+ISSUES = {'vulnerabilities': [], 'performance_issues': [], 'quality_issues': []}
+
+
+def test_jobs_sharing_snippets_complete_without_dead_letters(monkeypatch):
+    consumer = load_handler('embedding-consumer.py')
+    table = FakeTable(key='embedding_id')
+    monkeypatch.setattr(embedding_index, 'get_table', lambda name: table)
+    monkeypatch.setattr(embedding_index, 'find_stored', lambda ids: set())
+    monkeypatch.setattr(consumer, 'get_configured_genai', lambda: FakeGenai())
+
+    shared = snippet('__str__', "def __str__(self):\n    return self.name")
+    queue = LocalQueue(max_receives=2)
+    # Two parts of one review share a snippet, and one part is delivered twice
+    part_a, part_b = build_jobs('review_1', [shared, snippet('a', "def a():\n    pass")], ISSUES) * 2
+    part_b = dict(part_b, snippets=[shared, snippet('b', "def b():\n    return 1")])
+    for job in (part_a, part_b, part_a):
+        queue.send(job)
+    queue.send(build_jobs('review_2', [shared], ISSUES)[0])
+
+    response = consumer.lambda_handler(queue.receive(), None)
+    queue.complete(response)
+
+    assert response == {'batchItemFailures': []}
+    assert len(queue) == 0 and queue.dead_letters == []
+    links = {key for key, item in table.items.items() if item['item_type'] == 'review_link'}
+    vectors = [item for item in table.items.values() if item['item_type'] == 'vector']
+    assert len(vectors) == 3
+    assert len(links) == 4
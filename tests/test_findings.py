@@ -0,0 +1,80 @@
+import json
+
+from findings import ReportWriter, dedupe_findings, parse_model_review, write_findings_section
+
+
+def finding(agent, line, rule, severity, message, end_line=None, **extra):
+    return dict({'file': 'app/db.py', 'agent': agent, 'source': 'static', 'line': line,
+                 'end_line': end_line or line, 'rule': rule, 'severity': severity, 'message': message}, **extra)
+
+
+def test_overlapping_static_findings_are_merged():
+    merged = dedupe_findings([
+        finding('security', 4, 'sql-string-format', 'high', "SQL statement built by string formatting", end_line=6),
+        finding('security', 5, 'sql-string-format', 'critical', "SQL passed to execute() is built by string formatting"),
+        finding('performance', 5, 'io-in-loop', 'medium', "Query inside a loop"),
+    ])
+    assert len(merged) == 2
+    sql = merged[0]
+    assert (sql['severity'], sql['line'], sql['end_line'], sql['duplicates']) == ('critical', 4, 6, 1)
+
+
+def test_distinct_and_fixed_findings_are_kept_apart():
+    merged = dedupe_findings([
+        finding('security', 4, 'eval-exec', 'critical', "eval() executes dynamic code"),
+        finding('security', 40, 'eval-exec', 'critical', "eval() executes dynamic code"),
+        finding('security', 4, 'pickle-loads', 'high', "pickle.loads() deserializes", status='fixed'),
+    ])
+    assert [f['line'] for f in merged] == [4, 40]
+
+
+def test_section_collapses_low_severity_findings_over_budget():
+    findings = [finding('performance', i, f'rule-{i}', 'low', "x" * 50) for i in range(1, 20, 2)]
+    writer = ReportWriter()
+    stats = write_findings_section(writer, dedupe_findings(findings), budget=200)
+    assert stats['listed'] + stats['collapsed'] == 10 and stats['collapsed'] > 0
+    assert "more lower-severity findings" in writer.getvalue()
+
+
+def test_model_review_is_split_into_summary_and_findings():
+    text = "```json\n" + json.dumps({'summary': "Mostly fine.", 'findings': [
+        {'line': 5, 'end_line': 6, 'severity': 'HIGH', 'issue_type': 'sql-string-format',
+         'title': "Query built with +", 'detail': "Use parameters."},
+        {'line': 9, 'severity': 'urgent', 'issue_type': 'made-up', 'title': "Odd"},
+        {'severity': 'low', 'issue_type': 'naming', 'title': "No line"},
+    ]}) + "\n```"
+    summary, findings = parse_model_review(text, 'app/db.py', 'best_practices')
+
+    assert summary == "Mostly fine."
+    assert [(f['rule'], f['severity'], f['line'], f['end_line']) for f in findings] == \
+        [('sql-string-format', 'high', 5, 6), ('other', 'medium', 9, 9)]
+    assert findings[0]['source'] == 'model' and findings[0]['agent'] == 'best_practices'
+
+
+def test_free_form_model_review_is_kept_as_the_summary():
+    assert parse_model_review("## Issues\n- none", 'app/db.py', 'security') == ("## Issues\n- none", [])
+
+
+def test_same_issue_from_different_agents_is_listed_once():
+    model = [finding(agent, 4, 'sql-string-format', severity, message, end_line=6, source='model', detail=detail)
+             for agent, severity, message, detail in [
+                 ('security', 'critical', "SQL injection via string concatenation", "Use placeholders."),
+                 ('performance', 'medium', "Query rebuilt on every call", ""),
+                 ('best_practices', 'low', "Build queries with parameters", "")]]
+    merged = dedupe_findings(model + [finding('security', 5, 'sql-string-format', 'high', "SQL built by +")])
+
+    assert len(merged) == 1
+    (sql,) = merged
+    assert sql['agents'] == ['security', 'performance', 'best_practices'] and sql['duplicates'] == 3
+    assert (sql['severity'], sql['detail']) == ('critical', "Use placeholders.")
+    writer = ReportWriter()
+    write_findings_section(writer, merged)
+    assert writer.getvalue().count("sql-string-format") == 1 and "  Use placeholders." in writer.getvalue()
+
+
+def test_unclassified_model_findings_merge_only_on_the_issue_text():
+    merged = dedupe_findings([
+        finding('security', 3, 'other', 'medium', "Unvalidated redirect", source='model'),
+        finding('best_practices', 3, 'other', 'low', "Function too long", source='model'),
+    ])
+    assert len(merged) == 2
@@ -0,0 +1,71 @@
+import pytest
+
+import gemini_client
+from gemini_client import GeminiAPIError, GenerativeModel
+from gemini_stub import GeminiStub
+
+
+def reply(text):
+    return {'candidates': [{'content': {'parts': [{'text': text}]}}], 'usageMetadata': {'totalTokenCount': 7}}
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    with GeminiStub() as stub:
+        monkeypatch.setattr(gemini_client, 'API_BASE', stub.url)
+        monkeypatch.setattr(gemini_client, 'MAX_RETRIES', 2)
+        gemini_client.configure(api_key='test-key')
+        yield stub
+        gemini_client.configure(api_key=None)
+
+
+def test_generate_content_retries_429_and_5xx(gemini):
+    gemini.script('generateContent', (429, {'error': 'quota'}), (503, {'error': 'busy'}), (200, reply('ok')))
+
+    response = GenerativeModel('gemini-2.5-flash').generate_content("review this")
+
+    assert response.text == 'ok'
+    calls = gemini.calls('generateContent')
+    assert len(calls) == 3
+    assert calls[0]['path'] == '/v1beta/models/gemini-2.5-flash:generateContent'
+    assert calls[0]['api_key'] == 'test-key'
+    assert calls[0]['body']['contents'][0]['parts'][0]['text'] == "review this"
+
+
+def test_persistent_errors_raise_after_retries(gemini):
+    gemini.script('generateContent', (500, {'error': 'down'}))
+    with pytest.raises(GeminiAPIError) as error:
+        GenerativeModel('gemini-2.5-flash').generate_content("x")
+    assert error.value.status == 500
+    assert len(gemini.calls('generateContent')) == 1 + gemini_client.MAX_RETRIES
+
+
+def test_client_errors_are_not_retried(gemini):
+    gemini.script('generateContent', (400, {'error': 'bad request'}))
+    with pytest.raises(GeminiAPIError) as error:
+        GenerativeModel('gemini-2.5-flash').generate_content("x")
+    assert error.value.status == 400 and len(gemini.calls('generateContent')) == 1
+
+
+def test_streaming_yields_each_server_sent_event(gemini):
+    gemini.script('streamGenerateContent', (200, [reply('## Security'), reply(' review'), reply(' done')]))
+
+    chunks = list(GenerativeModel('gemini-2.5-flash').generate_content("x", stream=True))
+
+    assert [c.text for c in chunks] == ['## Security', ' review', ' done']
+    assert gemini.calls('streamGenerateContent')[0]['path'].endswith('?alt=sse')
+
+
+def test_batch_embed_splits_at_the_request_limit(gemini):
+    def vectors(body):
+        return {'embeddings': [{'values': [float(r['content']['parts'][0]['text'])]} for r in body['requests']]}
+
+    gemini.script('batchEmbedContents', (200, vectors))
+    texts = [str(i) for i in range(gemini_client.BATCH_EMBED_LIMIT * 2 + 50)]
+
+    result = gemini_client.embed_content('models/text-embedding-004', texts, task_type='retrieval_document')
+
+    assert [v[0] for v in result['embedding']] == [float(t) for t in texts]
+    sizes = [len(c['body']['requests']) for c in gemini.calls('batchEmbedContents')]
+    assert sizes == [100, 100, 50]
+    assert gemini.calls('batchEmbedContents')[0]['body']['requests'][0]['taskType'] == 'RETRIEVAL_DOCUMENT'
@@ -0,0 +1,74 @@
+from lambda_loader import load_handler
+
+
+CARRIED = [{'filename': 'app/models.py', 'sha': 'a' * 40, 'carried_forward': True},
+           {'filename': 'app/views.py', 'sha': 'b' * 40, 'carried_forward': True}]
+
+
+def test_parser_returns_empty_result_when_every_file_is_carried_forward():
+    parser = load_handler('code-parser.py')
+    result = parser.lambda_handler({'uploaded_files': CARRIED}, None)
+    assert result['statusCode'] == 200
+    assert result['parsed_files'] == [] and result['statistics']['total_files'] == 0
+
+
+def test_parser_still_rejects_missing_files():
+    parser = load_handler('code-parser.py')
+    assert parser.lambda_handler({'uploaded_files': []}, None)['statusCode'] == 400
+
+
+def test_enhancer_returns_empty_result_when_every_file_is_carried_forward():
+    enhancer = load_handler('context-enhancer.py')
+    parsed = load_handler('code-parser.py').lambda_handler({'uploaded_files': CARRIED}, None)
+    result = enhancer.lambda_handler(dict(parsed, uploaded_files=CARRIED), None)
+    assert result['statusCode'] == 200
+    assert result['context_map'] == {} and result['context_caches'] == {}
+
+    result = enhancer.lambda_handler(dict(parsed, incremental={'changed': [], 'unchanged': ['a.py'], 'removed': []}), None)
+    assert result['statusCode'] == 200
+
+
+def test_enhancer_still_rejects_missing_parse_results():
+    enhancer = load_handler('context-enhancer.py')
+    assert enhancer.lambda_handler({'parsed_files': []}, None)['statusCode'] == 400
+
+
+def test_failed_reviews_are_not_carried_forward():
+    from incremental_review import build_file_results, plan_incremental
+
+    files = [{'filename': 'app/models.py', 'sha': 'a' * 40}, {'filename': 'app/views.py', 'sha': 'b' * 40}]
+    agent_results = {
+        'security': {'file_reviews': [{'file': 'app/models.py', 'review': 'Looks fine'},
+                                      {'file': 'app/views.py', 'review': 'Error analyzing file: 429 quota'}]},
+        'performance': {'file_reviews': [{'file': 'app/models.py', 'review': 'Fast'},
+                                         {'file': 'app/views.py', 'review': 'Fast'}]},
+        'best_practices': {'error': True, 'message': 'timeout'}
+    }
+    results = build_file_results(files, dict(agent_results, best_practices={
+        'file_reviews': [{'file': 'app/models.py', 'review': 'Tidy'}, {'file': 'app/views.py', 'review': 'Tidy'}]}),
+        [], {})
+    assert results['app/models.py']['sha'] == 'a' * 40
+    assert results['app/views.py'] == {'sha': None, 'reviews': {'performance': 'Fast', 'best_practices': 'Tidy'},
+                                       'findings': []}
+    assert plan_incremental(files, results)['changed'] == ['app/views.py']
+
+    # A whole agent failing leaves every file to be reviewed again
+    results = build_file_results(files, agent_results, [], {})
+    assert plan_incremental(files, results)['changed'] == ['app/models.py', 'app/views.py']
+
+    # files.json written before errors were left out
+    legacy = {'app/models.py': {'sha': 'a' * 40, 'reviews': {'security': 'Error analyzing file: 503'}}}
+    assert plan_incremental(files[:1], legacy)['changed'] == ['app/models.py']
+
+
+def test_aggregator_assembles_agent_sections_from_file_reviews():
+    aggregator = load_handler('review-aggregator.py')
+    security = {'file_reviews': [{'file': 'app/models.py', 'review': 'No issues'}]}
+    report, _ = aggregator.format_combined_review(
+        security, {'error': True, 'message': 'timed out'}, {}, {}, {}, 0, 0.0,
+        carried_sections={'security': "## File: app/views.py (unchanged since last review)\n\nOld review"})
+
+    assert "# 🔒 SECURITY ANALYSIS\n\n## File: app/models.py\n\nNo issues" in report
+    assert report.index('app/models.py') < report.index('app/views.py (unchanged since last review)')
+    assert "Performance analysis encountered an error: timed out" in report
+    assert "No best practices review available" in report
@@ -0,0 +1,43 @@
+import pytest
+
+import model_router
+from model_router import route_file
+from lambda_loader import load_handler
+
+
+@pytest.fixture(autouse=True)
+def routing_enabled(monkeypatch):
+    monkeypatch.setattr(model_router, 'MODEL_ROUTING_ENABLED', True)
+
+
+def context_for(parsed):
+    enhancer = load_handler('context-enhancer.py')
+    patterns = enhancer.identify_code_patterns(parsed)
+    return {'patterns': patterns, 'historical_issues': [], 'risk_score': enhancer.calculate_risk_score(patterns)}
+
+
+def parsed_file(functions, lines=120, complexity=4):
+    return {'filename': 'app/auth.py', 'functions': [{'name': name} for name in functions], 'classes': [],
+            'imports': [], 'metrics': {'lines_of_code': lines, 'complexity': complexity,
+                                       'function_count': len(functions), 'class_count': 0}}
+
+
+def test_one_security_pattern_routes_security_to_the_full_model():
+    parsed = parsed_file(['login_user', 'render'])
+    context = context_for(parsed)
+    assert context['risk_score'] < model_router.DEFAULT_ROUTING['security']['deep_at']
+
+    route = route_file('security', 'app/auth.py', parsed, context)
+    assert route['tier'] == 'deep'
+    assert 'security patterns' in route['reason']
+
+
+def test_security_patterns_do_not_force_other_agents_to_deep():
+    parsed = parsed_file(['login_user', 'render'])
+    assert route_file('best_practices', 'app/auth.py', parsed, context_for(parsed))['tier'] == 'fast'
+
+
+def test_low_risk_file_stays_on_the_fast_tier():
+    parsed = parsed_file(['render', 'paginate'])
+    context = dict(context_for(parsed), risk_score=1.0)
+    assert route_file('security', 'app/views.py', parsed, context)['tier'] == 'fast'
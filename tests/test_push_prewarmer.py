@@ -0,0 +1,44 @@
+from code_analysis import parse_python_file
+from rate_limiter import TokenBucket
+from review_scheduler import SimulatedClock
+from lambda_loader import load_handler
+
+
+class FakeGenai:
+    def configure(self, api_key):
+        pass
+
+    def embed_content(self, model, content, task_type):
+        return {'embedding': [[float(len(text)), 1.0] for text in content]}
+
+
+CODE = '''
+def load(path):
+    with open(path) as handle:
+        return handle.read()
+
+
+class Store:
+    def save(self, key, value):
+        self.items[key] = value
+'''
+
+
+def test_prewarm_embeddings_take_tokens_from_their_own_budget(monkeypatch):
+    prewarmer = load_handler('push-prewarmer.py')
+    clock = SimulatedClock()
+    limiter = TokenBucket.per_minute(prewarmer.PREWARM_EMBED_REQUESTS_PER_MINUTE, clock=clock, sleep=clock.advance)
+    monkeypatch.setattr(prewarmer, 'limiter', limiter)
+    monkeypatch.setattr(prewarmer, 'get_genai', lambda: FakeGenai())
+    monkeypatch.setattr(prewarmer, 'get_gemini_api_key', lambda: 'test-key')
+
+    embedded = prewarmer.embed_snippets(parse_python_file(CODE, 'store.py'), CODE)
+
+    assert embedded > 0
+    assert limiter.tokens < limiter.capacity
+
+
+def test_prewarm_budget_is_split_across_containers():
+    prewarmer = load_handler('push-prewarmer.py')
+    share = prewarmer.PREWARM_EMBED_REQUESTS_PER_MINUTE / prewarmer.PREWARM_CONCURRENCY
+    assert abs(prewarmer.limiter.rate - share / 60.0) < 1e-9
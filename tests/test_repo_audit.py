@@ -0,0 +1,171 @@
+import json
+
+import pytest
+
+import repo_audit
+import review_filter
+from lambda_loader import load_handler
+from repo_audit import (ManifestMismatch, format_report, build_manifest, load_results, pending_shards, plan_manifest, reduce_shards,
+                        run_shard)
+
+
+SOURCE = "def handler(event):\n    return event\n"
+
+
+def entries(count):
+    return [{'path': f"pkg/mod_{i:02d}.py", 'sha': f"{i:040x}", 'size': len(SOURCE)} for i in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def no_blob_cache(monkeypatch):
+    monkeypatch.setattr(repo_audit.blob_cache, 'get', lambda kind, sha: None)
+    monkeypatch.setattr(repo_audit.blob_cache, 'put', lambda kind, sha, value: None)
+    monkeypatch.setattr(repo_audit.blob_cache, 'get_or_compute', lambda kind, sha, compute: (compute(), False))
+
+
+def run_all(prefix, manifest):
+    for shard in manifest['shards']:
+        if shard['shard'] in pending_shards(prefix, manifest):
+            run_shard(prefix, manifest, shard, lambda entry: SOURCE)
+
+
+def test_rerun_with_same_plan_resumes(tmp_path):
+    prefix = str(tmp_path)
+    manifest = plan_manifest(prefix, build_manifest('o/r', 'c' * 40, entries(48), max_files=10))
+    run_shard(prefix, manifest, manifest['shards'][0], lambda entry: SOURCE)
+
+    again = plan_manifest(prefix, build_manifest('o/r', 'c' * 40, entries(48), max_files=10))
+    assert again == manifest
+    assert pending_shards(prefix, again) == [1, 2, 3, 4]
+    run_all(prefix, again)
+    assert sum(r['audited'] for r in load_results(prefix, again)) == 48
+
+
+def test_changed_limits_are_not_mixed_with_stored_shards(tmp_path):
+    prefix = str(tmp_path)
+    manifest = plan_manifest(prefix, build_manifest('o/r', 'c' * 40, entries(48), max_files=10))
+    run_all(prefix, manifest)
+
+    with pytest.raises(ManifestMismatch):
+        plan_manifest(prefix, build_manifest('o/r', 'c' * 40, entries(48), max_files=30))
+    # The stored plan and its results are untouched
+    assert sum(r['audited'] for r in load_results(prefix, repo_audit.read_manifest(prefix))) == 48
+
+
+def test_changed_plan_replaces_manifest_without_results(tmp_path):
+    prefix = str(tmp_path)
+    plan_manifest(prefix, build_manifest('o/r', 'c' * 40, entries(48), max_files=10))
+    manifest = plan_manifest(prefix, build_manifest('o/r', 'c' * 40, entries(48), max_files=30))
+    assert len(manifest['shards']) == 2
+    run_all(prefix, manifest)
+    assert sum(r['audited'] for r in load_results(prefix, manifest)) == 48
+
+
+def test_results_of_another_plan_are_rejected(tmp_path):
+    prefix = str(tmp_path)
+    manifest = plan_manifest(prefix, build_manifest('o/r', 'c' * 40, entries(48), max_files=10))
+    run_all(prefix, manifest)
+    other = build_manifest('o/r', 'c' * 40, entries(48), max_files=30)
+    with pytest.raises(ManifestMismatch):
+        run_shard(prefix, other, other['shards'][0], lambda entry: SOURCE)
+
+
+def test_failed_files_are_stored_as_partial_and_retried_alone(tmp_path):
+    prefix = str(tmp_path)
+    manifest = plan_manifest(prefix, build_manifest('o/r', 'c' * 40, entries(5)))
+    shard = manifest['shards'][0]
+
+    def flaky(entry):
+        if entry['path'] == 'pkg/mod_02.py':
+            raise RuntimeError("download failed: 502")
+        return SOURCE
+
+    first = run_shard(prefix, manifest, shard, flaky)
+    assert first['partial'] and first['audited'] == 4
+    assert pending_shards(prefix, manifest) == [0]
+    assert reduce_shards(manifest, load_results(prefix, manifest))['partial_shards'] == [0]
+
+    read = []
+    retried = run_shard(prefix, manifest, shard, lambda entry: read.append(entry['path']) or SOURCE)
+    assert read == ['pkg/mod_02.py']
+    assert (retried['partial'], retried['audited'], retried['errors']) == (False, 5, [])
+    assert pending_shards(prefix, manifest) == []
+    report = reduce_shards(manifest, load_results(prefix, manifest))
+    assert (report['audited'], report['partial_shards'], report['errors']) == (5, [], [])
+
+
+def test_failed_agent_run_audits_the_whole_shard_again(tmp_path):
+    prefix = str(tmp_path)
+    manifest = plan_manifest(prefix, build_manifest('o/r', 'c' * 40, entries(3)))
+    shard = manifest['shards'][0]
+
+    def failing_agents(results):
+        raise RuntimeError("security: throttled")
+
+    assert run_shard(prefix, manifest, shard, lambda entry: SOURCE, failing_agents)['partial']
+    result = run_shard(prefix, manifest, shard, lambda entry: SOURCE, lambda results: [])
+    assert (result['partial'], result['audited'], 'retried' in result) == (False, 3, False)
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.status = 200
+        self.data = json.dumps(body).encode('utf-8')
+
+
+class FakeTreeApi:
+    """Git trees API whose recursive listing of the root is truncated"""
+
+    def __init__(self, truncate_subtree=False):
+        self.trees = {
+            'root': [{'path': 'setup.py', 'type': 'blob', 'sha': 'b1', 'size': 10},
+                     {'path': 'pkg', 'type': 'tree', 'sha': 'pkg'}],
+            'pkg': [{'path': 'api.py', 'type': 'blob', 'sha': 'b2', 'size': 20},
+                    {'path': 'sub', 'type': 'tree', 'sha': 'sub'}],
+            'sub': [{'path': 'deep.py', 'type': 'blob', 'sha': 'b3', 'size': 30}]
+        }
+        self.truncated = {'root'} | ({'pkg'} if truncate_subtree else set())
+        # Directories too large even for a one-level listing
+        self.level_truncated = {'pkg'} if truncate_subtree else set()
+        self.urls = []
+
+    def listing(self, sha, path=''):
+        items = []
+        for item in self.trees[sha]:
+            items.append(dict(item, path=path + item['path']))
+            if item['type'] == 'tree':
+                items.extend(self.listing(item['sha'], f"{path}{item['path']}/"))
+        return items
+
+    def request(self, method, url, headers=None, timeout=None):
+        self.urls.append(url)
+        sha = url.split('/git/trees/')[1].split('?')[0]
+        if not url.endswith('?recursive=1'):
+            return FakeResponse({'tree': self.trees[sha], 'truncated': sha in self.level_truncated})
+        return FakeResponse({'tree': self.listing(sha)[:1] if sha in self.truncated else self.listing(sha),
+                             'truncated': sha in self.truncated})
+
+
+def tree_handler(monkeypatch, api):
+    handler = load_handler('repo-audit.py')
+    monkeypatch.setattr(handler, 'http', api)
+    monkeypatch.setattr(handler, 'get_review_config', lambda repo_name: review_filter.DEFAULT_CONFIG)
+    return handler
+
+
+def test_truncated_tree_listing_is_walked_by_subtree(monkeypatch):
+    api = FakeTreeApi()
+    entries, truncated = tree_handler(monkeypatch, api).list_tree('o/r', 'root')
+    assert sorted(e['path'] for e in entries) == ['pkg/api.py', 'pkg/sub/deep.py', 'setup.py']
+    assert not truncated
+    # Only the truncated root is listed level by level
+    assert sum('recursive' not in url for url in api.urls) == 1
+
+
+def test_listing_that_stays_truncated_is_flagged_in_the_report(monkeypatch):
+    entries, truncated = tree_handler(monkeypatch, FakeTreeApi(truncate_subtree=True)).list_tree('o/r', 'root')
+    assert truncated
+    manifest = build_manifest('o/r', 'c' * 40, entries, truncated=truncated)
+    report = reduce_shards(manifest, [])
+    assert manifest['truncated'] and report['truncated']
+    assert "truncated the tree listing" in format_report(report)
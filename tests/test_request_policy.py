@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+import gemini_client
+import request_policy
+from gemini_client import GeminiAPIError, GenerativeModel
+from gemini_stub import GeminiStub
+from request_policy import abandoned_requests, call_with_policy
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    with GeminiStub() as stub:
+        monkeypatch.setattr(gemini_client, 'API_BASE', stub.url)
+        gemini_client.configure(api_key='test-key')
+        yield stub
+        gemini_client.configure(api_key=None)
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(request_policy, 'BACKOFF_BASE_SECONDS', 0.01)
+
+
+def test_policy_owns_retries_of_rest_calls(gemini):
+    gemini.script('generateContent', (503, {'error': 'busy'}))
+    model = GenerativeModel('gemini-2.5-flash')
+
+    with pytest.raises(GeminiAPIError) as error:
+        call_with_policy(lambda: model.generate_content("x"), max_attempts=3, hedge=False)
+
+    # One HTTP request per policy attempt, no urllib3 retries underneath
+    assert len(gemini.calls('generateContent')) == 3
+    assert len(error.value.policy_report['attempts']) == 3
+
+
+def test_direct_rest_calls_keep_transport_retries(gemini, monkeypatch):
+    monkeypatch.setattr(gemini_client, 'MAX_RETRIES', 1)
+    gemini.script('generateContent', (503, {'error': 'busy'}), (200, {'candidates': [{'content': {'parts': [{'text': 'ok'}]}}]}))
+    assert GenerativeModel('gemini-2.5-flash').generate_content("x").text == 'ok'
+    assert len(gemini.calls('generateContent')) == 2
+
+
+def slow_then_fast(first_seconds):
+    calls = []
+    release = threading.Event()
+
+    def fn():
+        calls.append(time.perf_counter())
+        if len(calls) == 1:
+            release.wait(first_seconds)
+            return 'slow'
+        return 'fast'
+    return fn, calls, release
+
+
+def test_losing_hedge_is_tracked_until_it_finishes(monkeypatch):
+    monkeypatch.setattr(request_policy, 'hedge_delay', lambda: 0.05)
+    fn, calls, release = slow_then_fast(5)
+
+    result, report = call_with_policy(fn, timeout=2, hedge=True)
+
+    assert result == 'fast' and len(calls) == 2
+    assert [a['outcome'] for a in report['attempts']] == ['success', 'abandoned']
+    assert abandoned_requests() == 1
+    release.set()
+    for _ in range(100):
+        if abandoned_requests() == 0:
+            break
+        time.sleep(0.01)
+    assert abandoned_requests() == 0
+
+
+def test_no_hedge_while_abandoned_requests_hold_the_pool(monkeypatch):
+    monkeypatch.setattr(request_policy, 'hedge_delay', lambda: 0.05)
+    monkeypatch.setattr(request_policy, 'MAX_ABANDONED', 0)
+    fn, calls, release = slow_then_fast(0.2)
+
+    result, report = call_with_policy(fn, timeout=2, hedge=True)
+
+    assert result == 'slow' and len(calls) == 1
+    assert report['hedges_skipped'] == 1
+    assert request_policy.summarize_reports([report])['hedges_skipped'] == 1
@@ -0,0 +1,104 @@
+import pytest
+
+import job_queue
+import review_coalescing
+
+
+class ConditionalCheckFailedException(Exception):
+    pass
+
+
+class FakeStateTable:
+    """PR state items with the claim_head / record_execution conditions"""
+
+    class meta:
+        class client:
+            class exceptions:
+                ConditionalCheckFailedException = ConditionalCheckFailedException
+
+    def __init__(self):
+        self.items = {}
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeValues, ReturnValues=None):
+        key = Item[review_coalescing.EVENTS_TABLE_KEY]
+        old = self.items.get(key)
+        values = ExpressionAttributeValues
+        if old and old['head_sha'] == values[':sha'] and old['claimed_at'] >= values[':window_start']:
+            raise ConditionalCheckFailedException()
+        self.items[key] = dict(Item)
+        return {'Attributes': dict(old)} if old else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeValues):
+        item = self.items.get(Key[review_coalescing.EVENTS_TABLE_KEY])
+        if not item or item['head_sha'] != ExpressionAttributeValues[':sha']:
+            raise ConditionalCheckFailedException()
+        item['execution_arn'] = ExpressionAttributeValues[':arn']
+
+
+class FakeStepFunctions:
+    def __init__(self):
+        self.status = {}
+        self.stopped = []
+        self.started = 0
+
+    def start_execution(self, stateMachineArn, name, input):
+        self.started += 1
+        arn = f"arn:execution:{self.started}"
+        self.status[arn] = 'RUNNING'
+        return {'executionArn': arn}
+
+    def describe_execution(self, executionArn):
+        return {'status': self.status[executionArn]}
+
+    def stop_execution(self, executionArn, error, cause):
+        self.stopped.append(executionArn)
+        self.status[executionArn] = 'ABORTED'
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    table, stepfunctions = FakeStateTable(), FakeStepFunctions()
+    monkeypatch.setattr(review_coalescing, 'get_table', lambda name: table)
+    monkeypatch.setattr(review_coalescing, 'get_client', lambda *a, **kw: stepfunctions)
+    monkeypatch.setattr(job_queue, 'get_client', lambda *a, **kw: stepfunctions)
+    monkeypatch.setattr(job_queue, 'REVIEW_COALESCING', True)
+    monkeypatch.setattr(job_queue, 'REVIEW_FILTER', False)
+    return table, stepfunctions
+
+
+def review_job(head):
+    return {'repo_name': 'octo/app', 'pr_number': 7, 'action': 'synchronize', 'head_sha': head,
+            'pr_url': 'https://api.github.com/repos/octo/app/pulls/7', 'changed_files': 2}
+
+
+def expire_window(table):
+    for item in table.items.values():
+        item['claimed_at'] -= review_coalescing.COALESCE_WINDOW_SECONDS + 1
+
+
+def test_same_head_after_window_is_coalesced_while_running(aws):
+    table, stepfunctions = aws
+    assert job_queue.start_review(review_job('a' * 40))['status'] == 'started'
+    expire_window(table)
+
+    assert job_queue.start_review(review_job('a' * 40)) == {'status': 'coalesced'}
+    assert stepfunctions.started == 1 and stepfunctions.stopped == []
+    assert table.items['pr#octo/app#7']['execution_arn'] == 'arn:execution:1'
+
+
+def test_same_head_after_finished_execution_starts_again(aws):
+    table, stepfunctions = aws
+    job_queue.start_review(review_job('a' * 40))
+    stepfunctions.status['arn:execution:1'] = 'SUCCEEDED'
+    expire_window(table)
+
+    assert job_queue.start_review(review_job('a' * 40))['status'] == 'started'
+    assert stepfunctions.started == 2 and stepfunctions.stopped == []
+
+
+def test_new_head_stops_the_older_execution(aws):
+    table, stepfunctions = aws
+    job_queue.start_review(review_job('a' * 40))
+
+    assert job_queue.start_review(review_job('b' * 40))['status'] == 'started'
+    assert stepfunctions.stopped == ['arn:execution:1']
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import review_filter
+from review_filter import DEFAULT_CONFIG, file_skip_reason, glob_to_regex, prefilter
+
+
+def matches(pattern, path):
+    return bool(glob_to_regex(pattern).match(path))
+
+
+def test_double_star_slash_matches_at_the_root_and_mid_path():
+    assert matches('**/*.py', 'setup.py')
+    assert matches('**/*.py', 'src/pkg/app.py')
+    assert matches('src/**/models.py', 'src/models.py')
+    assert matches('src/**/models.py', 'src/a/b/models.py')
+    assert not matches('src/**/models.py', 'lib/src/models.py')
+    assert matches('**/migrations/**', 'app/migrations/0001_initial.py')
+    assert matches('**/migrations/**', 'migrations/0001_initial.py')
+
+
+def test_single_star_and_question_mark_stay_within_a_directory():
+    assert matches('src/*.py', 'src/app.py')
+    assert not matches('src/*.py', 'src/pkg/app.py')
+    assert matches('**/*_pb2.py', 'api/user_pb2.py')
+    assert not matches('**/*_pb2.py', 'api/user_pb2.pyi')
+    assert matches('mod_?.py', 'mod_1.py')
+    assert not matches('mod_?.py', 'mod_/.py')
+
+
+def test_exclude_takes_precedence_over_include():
+    config = dict(DEFAULT_CONFIG, include=['src/**/*.py'])
+    assert file_skip_reason({'filename': 'src/app.py'}, config) is None
+    assert file_skip_reason({'filename': 'src/migrations/0002.py'}, config) == 'excluded'
+    assert file_skip_reason({'filename': 'tools/run.py'}, config) == 'not included'
+    assert file_skip_reason({'filename': 'src/app.py', 'status': 'removed'}, config) == 'removed'
+
+
+def test_changed_lines_cutoff_is_exclusive():
+    config = dict(DEFAULT_CONFIG, max_changed_lines=100)
+    assert file_skip_reason({'filename': 'app.py', 'changes': 100}, config) is None
+    assert file_skip_reason({'filename': 'app.py', 'changes': 101}, config) == "101 changed lines > 100"
+    assert file_skip_reason({'filename': 'app.py', 'changes': 10 ** 6}, dict(config, max_changed_lines=0)) is None
+
+
+class FakeHttp:
+    def __init__(self, files):
+        self.files = files
+
+    def request(self, method, url, headers=None, timeout=None):
+        return type('Response', (), {'status': 200, 'data': json.dumps(self.files).encode('utf-8')})()
+
+
+@pytest.fixture
+def pr_files(monkeypatch):
+    monkeypatch.setattr(review_filter, 'load_repo_config', lambda repo_name: DEFAULT_CONFIG)
+
+    def serve(files):
+        monkeypatch.setattr(review_filter, '_get_http', lambda: FakeHttp(files))
+    return serve
+
+
+def job(changed_files):
+    return {'repo_name': 'octo/app', 'pr_url': 'https://api.github.com/repos/octo/app/pulls/7',
+            'changed_files': changed_files}
+
+
+def test_prefilter_reviews_when_the_first_page_is_not_the_whole_pr(pr_files):
+    pr_files([{'filename': f"app/migrations/{i:04d}.py", 'changes': 5} for i in range(100)])
+    assert prefilter(job(250)) == {'review': True, 'reason': 'more files than one page', 'kept': 0}
+
+
+def test_prefilter_skips_a_pr_without_reviewable_files(pr_files):
+    pr_files([{'filename': 'README.md', 'changes': 3}, {'filename': 'api/user_pb2.py', 'changes': 900}])
+    result = prefilter(job(2))
+    assert not result['review'] and result['reason'] == "none of 2 changed files match the review config"
+
+    pr_files([{'filename': 'README.md'}, {'filename': 'app/views.py', 'changes': 12}])
+    assert prefilter(job(2)) == {'review': True, 'reason': '1 reviewable files', 'kept': 1}
@@ -0,0 +1,156 @@
+import json
+
+import pytest
+
+import review_scheduler
+from review_scheduler import FairScheduler, SimulatedClock
+from job_queue import LocalQueue
+from lambda_loader import load_handler
+
+
+def job(repo, pr, files):
+    return {'repo_name': repo, 'pr_number': pr, 'changed_files': files}
+
+
+def drain(scheduler):
+    order = []
+    while True:
+        item = scheduler.next_job()
+        if item is None:
+            return order
+        order.append((item['repo_name'], item['pr_number']))
+        scheduler.complete(item)
+
+
+def test_large_pr_does_not_starve_other_repos():
+    scheduler = FairScheduler(max_running=10, tenant_limit=10, clock=SimulatedClock())
+    for pr in range(1, 4):
+        scheduler.submit(job('big/monorepo', pr, 60))
+    scheduler.submit(job('acme/api', 1, 20))
+    scheduler.submit(job('acme/web', 1, 20))
+
+    order = drain(scheduler)
+    assert order[0] == ('big/monorepo', 1)
+    assert order.index(('acme/api', 1)) < order.index(('big/monorepo', 2))
+    assert order.index(('acme/web', 1)) < order.index(('big/monorepo', 2))
+
+
+def test_small_prs_jump_ahead():
+    scheduler = FairScheduler(max_running=10, tenant_limit=10, clock=SimulatedClock())
+    scheduler.submit(job('acme/api', 1, 40))
+    scheduler.submit(job('acme/api', 2, 40))
+    scheduler.submit(job('other/lib', 1, 2))
+
+    assert drain(scheduler)[0] == ('other/lib', 1)
+
+
+def test_tenant_and_global_limits():
+    clock = SimulatedClock()
+    scheduler = FairScheduler(max_running=3, tenant_limit=1, clock=clock)
+    scheduler.seed_running({'acme': 1})
+    for pr in range(1, 3):
+        scheduler.submit(job('acme/api', pr, 5))
+        scheduler.submit(job('globex/app', pr, 5))
+        scheduler.submit(job('initech/tps', pr, 5))
+
+    clock.advance(4)
+    started = []
+    while (item := scheduler.next_job()) is not None:
+        started.append(item['repo_name'])
+    # acme is at its tenant limit; one slot is taken by its running review
+    assert sorted(started) == ['globex/app', 'initech/tps']
+    assert scheduler.metrics()['wait_max'] == 4
+
+    scheduler.complete({'repo_name': 'globex/app'})
+    assert scheduler.next_job()['repo_name'] == 'globex/app'
+    assert scheduler.next_job() is None
+
+
+class FakeEventsTable:
+    """github_events items with the monotonic update used for fair-queue state"""
+
+    class meta:
+        class client:
+            class exceptions:
+                class ConditionalCheckFailedException(Exception):
+                    pass
+
+    def __init__(self):
+        self.items = {}
+
+    def update_item(self, Key, ExpressionAttributeNames, ExpressionAttributeValues, **kwargs):
+        key = Key['event_id']
+        attribute = ExpressionAttributeNames['#attr']
+        item = self.items.setdefault(key, dict(Key))
+        if attribute in item and item[attribute] >= ExpressionAttributeValues[':value']:
+            raise self.meta.client.exceptions.ConditionalCheckFailedException()
+        item[attribute] = ExpressionAttributeValues[':value']
+
+    def batch_get_item(self, RequestItems):
+        keys = [k['event_id'] for k in RequestItems['github_events']['Keys']]
+        return {'Responses': {'github_events': [self.items[k] for k in keys if k in self.items]}}
+
+
+@pytest.fixture
+def dispatcher(monkeypatch):
+    handler = load_handler('review-dispatcher.py')
+    table = FakeEventsTable()
+    monkeypatch.setattr(review_scheduler, 'get_table', lambda name: table)
+    monkeypatch.setattr(review_scheduler, 'get_resource', lambda service: table)
+    monkeypatch.setattr(handler, 'MAX_CONCURRENT_REVIEWS', 1)
+    monkeypatch.setattr(handler, 'running_by_tenant', lambda: {})
+    started = []
+    monkeypatch.setattr(handler, 'start_review', lambda job: started.append(job) or {'status': 'started'})
+    handler.started = started
+    handler.queue = LocalQueue(max_receives=2)
+    monkeypatch.setattr(handler, 'get_queue', lambda: handler.queue)
+    return handler
+
+
+def test_virtual_time_carries_over_between_batches(dispatcher):
+    queue = dispatcher.queue
+    queue.send(job('big/monorepo', 1, 80))
+    queue.complete(dispatcher.lambda_handler(queue.receive(), None))
+
+    # Next batch: the monorepo's follow-up arrives before a small repo's PR
+    queue.send(job('big/monorepo', 2, 80))
+    queue.send(job('acme/api', 7, 10))
+    queue.complete(dispatcher.lambda_handler(queue.receive(), None))
+
+    assert [(j['repo_name'], j['pr_number']) for j in dispatcher.started] == [('big/monorepo', 1), ('acme/api', 7)]
+    assert [json.loads(body)['pr_number'] for _, body in queue.messages] == [2]
+
+
+def test_deferred_jobs_do_not_count_toward_the_dead_letter_queue(dispatcher, monkeypatch):
+    queue = dispatcher.queue
+    for pr in range(1, 4):
+        queue.send(job('acme/api', pr, 5))
+
+    # Only one review may run; the storm lasts longer than max_receives batches
+    for _ in range(4):
+        monkeypatch.setattr(dispatcher, 'running_by_tenant', lambda: {'acme': 1})
+        response = dispatcher.lambda_handler(queue.receive(), None)
+        assert response == {'batchItemFailures': []}
+        queue.complete(response)
+
+    assert queue.dead_letters == [] and len(queue) == 3
+    assert set(queue.delays.values()) == {dispatcher.DEFER_DELAY_SECONDS}
+
+    monkeypatch.setattr(dispatcher, 'running_by_tenant', lambda: {})
+    queue.complete(dispatcher.lambda_handler(queue.receive(), None))
+    assert [j['pr_number'] for j in dispatcher.started] == [1]
+
+
+def test_jobs_that_cannot_be_re_enqueued_stay_on_the_queue(dispatcher, monkeypatch):
+    queue = dispatcher.queue
+    queue.send(job('acme/api', 1, 5))
+    received = queue.receive()
+
+    def unavailable():
+        raise ValueError("REVIEW_QUEUE_URL is not set")
+
+    monkeypatch.setattr(dispatcher, 'running_by_tenant', lambda: {'acme': 1})
+    monkeypatch.setattr(dispatcher, 'get_queue', unavailable)
+    response = dispatcher.lambda_handler(received, None)
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': received['Records'][0]['messageId']}]}
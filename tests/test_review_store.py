@@ -0,0 +1,106 @@
+import gzip
+import io
+
+import pytest
+from botocore.exceptions import ClientError
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+
+import review_store
+
+
+class LayoutMismatchTable:
+    def __init__(self):
+        self.queries = []
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        raise ClientError({'Error': {'Code': 'ValidationException',
+                                     'Message': 'Query condition missed key schema element: review_id'}}, 'Query')
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    review_store.clear_cache()
+    yield
+    review_store.clear_cache()
+
+
+def test_default_layout_matches_the_setup_guide():
+    assert review_store.REVIEWS_TABLE_LAYOUT == 'keyed'
+    assert review_store.stats_key('octo/app') == {'repo_name': 'octo/app', 'review_key': 'stats'}
+
+
+def test_unknown_layout_is_rejected(monkeypatch):
+    monkeypatch.setattr(review_store, 'REVIEWS_TABLE_LAYOUT', 'keyd')
+    with pytest.raises(review_store.ReviewTableLayoutError, match='REVIEWS_TABLE_LAYOUT'):
+        review_store.stats_key('octo/app')
+
+
+def test_key_schema_mismatch_names_the_layout(monkeypatch):
+    table = LayoutMismatchTable()
+    monkeypatch.setattr(review_store, 'get_table', lambda name: table)
+    with pytest.raises(review_store.ReviewTableLayoutError, match='REVIEWS_TABLE_LAYOUT=keyed'):
+        review_store.latest_review('octo/app', 7, use_cache=False)
+    assert 'IndexName' not in table.queries[0]
+
+
+def test_required_attribute_must_not_be_null(monkeypatch):
+    table = LayoutMismatchTable()
+    monkeypatch.setattr(review_store, 'get_table', lambda name: table)
+    with pytest.raises(review_store.ReviewTableLayoutError):
+        review_store.latest_review('octo/app', 7, require='file_results_key', use_cache=False)
+
+    built = ConditionExpressionBuilder().build_expression(table.queries[0]['FilterExpression'])
+    assert 'attribute_exists' in built.condition_expression
+    assert 'NOT attribute_type' in built.condition_expression
+    assert 'NULL' in built.attribute_value_placeholders.values()
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.gets = 0
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = dict(kwargs, Body=Body)
+
+    def get_object(self, Bucket, Key):
+        self.gets += 1
+        return {'Body': io.BytesIO(self.objects[Key]['Body'])}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(review_store, 'get_client', lambda service, **kwargs: fake)
+    return fake
+
+
+BODY = "## 🎯 Code Analysis Summary\n\n" + "- finding on `app/db.py`\n" * 200
+
+
+def test_review_body_round_trips_through_gzip(s3):
+    pointer = review_store.store_review_body('octo/app', 7, 'rev-1', BODY)
+
+    stored = s3.objects[pointer['s3_key']]
+    assert pointer['s3_key'] == 'reviews/octo/app/pr-7/rev-1/review.md.gz'
+    assert stored['ContentEncoding'] == 'gzip' and gzip.decompress(stored['Body']).decode('utf-8') == BODY
+    assert pointer['bytes'] == len(BODY.encode('utf-8')) and pointer['stored_bytes'] < pointer['bytes']
+
+    body = review_store.ReviewBody.from_item({'review_body': pointer})
+    assert body and not body.loaded and s3.gets == 0
+    assert body.text == BODY and body.text == BODY and s3.gets == 1
+
+
+def test_review_body_with_a_wrong_sha256_is_rejected(s3):
+    pointer = review_store.store_review_body('octo/app', 7, 'rev-1', BODY)
+    s3.objects[pointer['s3_key']]['Body'] = gzip.compress(BODY.replace('db.py', 'io.py').encode('utf-8'))
+    with pytest.raises(ValueError, match='does not match its sha256'):
+        review_store.load_review_body(pointer)
+
+
+def test_inline_review_bodies_read_without_s3(s3):
+    body = review_store.ReviewBody.from_item({'combined_review': BODY})
+    assert body.loaded and body.text == BODY and s3.gets == 0
+    assert not review_store.ReviewBody.from_item({})
+    assert review_store.ReviewBody.from_item({}).text == ''
@@ -0,0 +1,40 @@
+from static_security import analyze_source
+
+
+def sql_findings(code):
+    return [f for f in analyze_source(code) if f['rule'] == 'sql-string-format']
+
+
+def test_messages_starting_with_sql_verbs_are_not_sql():
+    code = (
+        'def notify(name, count):\n'
+        '    subject = "Update your profile: %s" % name\n'
+        '    body = f"Select a file from the list ({count} left)"\n'
+        '    title = "Delete " + name + "?"\n'
+        '    return subject, body, title\n'
+    )
+    assert sql_findings(code) == []
+
+
+def test_formatted_sql_statements_are_reported():
+    code = (
+        'def queries(table, uid, col):\n'
+        '    a = f"SELECT {col} FROM {table} WHERE id = {uid}"\n'
+        '    b = "UPDATE users SET name = \'%s\'" % uid\n'
+        '    c = "DELETE FROM " + table\n'
+        '    return a, b, c\n'
+    )
+    assert [f['line'] for f in sql_findings(code)] == [2, 3, 4]
+
+
+def test_multiline_execute_argument_is_reported_once():
+    code = (
+        'def load(cur, uid, status):\n'
+        '    cur.execute(\n'
+        '        "SELECT * FROM users WHERE id = " + uid\n'
+        '        + " AND status = " + status\n'
+        '    )\n'
+    )
+    findings = sql_findings(code)
+    assert len(findings) == 1
+    assert findings[0]['severity'] == 'critical' and findings[0]['line'] == 2
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+
+import work_items
+from lambda_loader import load_handler
+from work_items import LocalExecutor, load_work_item, plan_work_items, store_item_result
+
+
+def review_event(count):
+    files = [{'filename': f"pkg/mod_{i}.py", 's3_key': f"k/{i}", 'sha': f"{i:040x}"} for i in range(count)]
+    files.append({'filename': 'pkg/unchanged.py', 'sha': 'f' * 40, 'carried_forward': True})
+    return {
+        'repo_name': 'acme/api',
+        'pr_number': 12,
+        'uploaded_files': files,
+        'parsed_files': [{'filename': f['filename']} for f in files],
+        'context_map': {f['filename']: {'risk_score': 1.0} for f in files},
+        'context_caches': {}
+    }
+
+
+def agent_handler(agent, delays=None, fail_on=None):
+    def handle(event, context):
+        names = [f['filename'] for f in event['uploaded_files']]
+        if fail_on and fail_on in names:
+            raise RuntimeError(f"{agent} crashed on {fail_on}")
+        # Later chunks finish first, so results arrive out of plan order
+        time.sleep((delays or {}).get(event['chunk'], 0))
+        return {
+            'statusCode': 200,
+            'file_reviews': [{'file': name, 'review': f"{agent} ok"} for name in names],
+            'tokens': 10 * len(names),
+            'cost': 0.5,
+            'findings': [{'file': name, 'agent': agent, 'line': 1, 'rule': 'r', 'severity': 'low'} for name in names],
+            'request_stats': {'calls': 1, 'total_call_ms': 5.0, 'max_call_ms': 5.0}
+        }
+    return handle
+
+
+def handlers(**kwargs):
+    return {agent: agent_handler(agent, **kwargs) for agent in work_items.AGENTS}
+
+
+def stored_handlers(**kwargs):
+    """Agents as deployed: load the item behind a pointer and store the result"""
+    def wrap(handle):
+        def run(event, context):
+            event = load_work_item(event)
+            return store_item_result(event, handle(event, context))
+        return run
+    return {agent: wrap(handle) for agent, handle in handlers(**kwargs).items()}
+
+
+def test_plan_map_reduce_keeps_file_order(monkeypatch):
+    monkeypatch.setattr(work_items, 'MAP_FILES_PER_ITEM', 1)
+    results = LocalExecutor(handlers(delays={0: 0.05, 1: 0.02}), max_concurrency=6).run(review_event(3))
+
+    assert set(results) == {'security', 'performance', 'best_practices'}
+    for agent, result in results.items():
+        assert [r['file'] for r in result['file_reviews']] == ['pkg/mod_0.py', 'pkg/mod_1.py', 'pkg/mod_2.py']
+        assert result['work_items'] == 3 and result['failed_items'] == 0
+        assert result['tokens'] == 30 and result['cost'] == 1.5
+        assert result['request_stats']['calls'] == 3
+        assert 'review' not in result
+        assert 'error' not in result
+
+
+def test_partial_failure_only_affects_its_files(monkeypatch):
+    monkeypatch.setattr(work_items, 'MAP_FILES_PER_ITEM', 1)
+    executor = LocalExecutor(handlers(fail_on='pkg/mod_1.py'))
+    security = executor.run(review_event(3))['security']
+
+    assert security['failed_items'] == 1 and 'error' not in security
+    reviews = {r['file']: r['review'] for r in security['file_reviews']}
+    assert reviews['pkg/mod_0.py'] == 'security ok'
+    assert reviews['pkg/mod_1.py'].startswith('Error analyzing file: security crashed')
+    assert [f['file'] for f in security['findings']] == ['pkg/mod_0.py', 'pkg/mod_2.py']
+
+
+def test_agent_errors_when_every_item_fails(monkeypatch):
+    monkeypatch.setattr(work_items, 'MAP_FILES_PER_ITEM', 5)
+    results = LocalExecutor(handlers(fail_on='pkg/mod_0.py')).run(review_event(2))
+    assert all(result['error'] for result in results.values())
+
+
+def test_chunking_by_files_per_item():
+    items = plan_work_items(review_event(5), files_per_item=2)
+    assert len(items) == 3 * 3
+    security = [i for i in items if i['agent'] == 'security']
+    assert [[f['filename'] for f in i['uploaded_files']] for i in security] == [
+        ['pkg/mod_0.py', 'pkg/mod_1.py'], ['pkg/mod_2.py', 'pkg/mod_3.py'], ['pkg/mod_4.py']]
+    assert [sorted(i['context_map']) for i in security][2] == ['pkg/mod_4.py']
+    assert all(i['repo_name'] == 'acme/api' and i['pr_number'] == 12 for i in items)
+
+
+def test_map_is_bounded_by_max_concurrency():
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def handle(event, context):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return {'statusCode': 200, 'file_reviews': []}
+
+    executor = LocalExecutor({agent: handle for agent in work_items.AGENTS}, max_concurrency=2)
+    executor.map(plan_work_items(review_event(4), files_per_item=1))
+    assert peak[0] == 2
+
+
+def test_map_state_carries_pointers_and_results_go_through_the_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(work_items, 'MAP_STATE_PREFIX', str(tmp_path))
+    planner, reducer = load_handler('work-planner.py'), load_handler('work-reducer.py')
+    event = review_event(3)
+    event['parsed_files'] = [dict(p, functions=[{'name': 'f' * 200}] * 50) for p in event['parsed_files']]
+
+    plan = planner.lambda_handler(event, None)
+    pointers = plan['work_items']
+    assert len(pointers) == 9 and all('uploaded_files' not in p and 'parsed_files' not in p for p in pointers)
+    assert len(json.dumps(pointers)) < len(json.dumps(event)) / 2
+
+    item_results = LocalExecutor(stored_handlers(fail_on='pkg/mod_1.py')).map(pointers)
+    assert all('file_reviews' not in r or isinstance(r['file_reviews'], int) for r in item_results)
+
+    reduced = reducer.lambda_handler({'work_items': pointers, 'item_results': item_results}, None)
+    security = reduced['security']
+    assert [r['file'] for r in security['file_reviews']] == ['pkg/mod_0.py', 'pkg/mod_1.py', 'pkg/mod_2.py']
+    assert security['file_reviews'][1]['review'].startswith('Error analyzing file: security crashed')
+    assert security['tokens'] == 20 and security['failed_items'] == 1
+
+
+def test_local_executor_with_a_state_prefix_matches_the_inline_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(work_items, 'MAP_FILES_PER_ITEM', 2)
+    inline = LocalExecutor(handlers()).run(review_event(3))
+    stored = LocalExecutor(stored_handlers(), state_prefix=str(tmp_path)).run(review_event(3))
+    assert stored == inline
+    assert len(list(tmp_path.rglob('results/*.json'))) == 6
@@ -0,0 +1,156 @@
+"""
+Run a full-repository audit locally
+
+Same sharding contract as the RepoAudit Lambda (lambda-functions/repo_audit.py):
+the commit's tree is split into shards by bytes and file count, shards run
+in a pool of worker processes, each shard result is stored under the audit
+prefix and the results are reduced into report.json / report.md. Rerunning
+the same commit skips shards that already have a complete result and
+retries only the failed files of partial ones; a rerun with other
+shard limits or review config is refused instead of mixing shard plans
+(use a new --out).
+
+Files are filtered like the Lambda's plan: BASELINE_CONFIG unless
+REVIEW_FILTER=true, then the clone's REVIEW_CONFIG_PATH from the default
+branch (origin/HEAD, else the audited commit).
+
+    python tools/audit_local.py --repo-path ../my-repo --repo-name owner/my-repo --out ./audits
+
+    python tools/audit_local.py --repo-path ../my-repo --repo-name owner/my-repo \\
+        --out s3://code-review-storage-sanya-2025/audits --workers 16
+
+Only the static checks run locally; model agents are added by the Lambda
+(AUDIT_AGENTS).
+"""
+
+import argparse
+import json
+import multiprocessing
+import subprocess
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda-functions')
+sys.path.insert(0, LAMBDA_DIR)
+
+from backfill import BlobReader, git  # noqa: E402
+from repo_audit import (AUDIT_SHARD_BYTES, AUDIT_SHARD_FILES, ManifestMismatch, audit_prefix,  # noqa: E402
+                        build_manifest, load_results, pending_shards, plan_manifest, reduce_shards, run_shard,
+                        store_report)
+from review_filter import (BASELINE_CONFIG, DEFAULT_CONFIG, REVIEW_CONFIG_PATH, REVIEW_FILTER,  # noqa: E402
+                           file_skip_reason, normalize_config)
+
+
+def review_config(repo_path: str, commit: str) -> dict:
+    """Same config the RepoAudit plan would use for this repo"""
+    if not REVIEW_FILTER:
+        return BASELINE_CONFIG
+    for ref in ('origin/HEAD', commit):
+        try:
+            raw = git(repo_path, 'show', f"{ref}:{REVIEW_CONFIG_PATH}")
+        except subprocess.CalledProcessError:
+            continue
+        try:
+            return normalize_config(json.loads(raw))
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️  Ignoring invalid {REVIEW_CONFIG_PATH} at {ref}: {str(e)}")
+            return DEFAULT_CONFIG
+    return DEFAULT_CONFIG
+
+
+def tree_entries(repo_path: str, commit: str, config: dict) -> list:
+    """{'path', 'sha', 'size'} of the reviewable Python blobs in a commit"""
+    entries = []
+    for line in git(repo_path, 'ls-tree', '-r', '-l', '--full-tree', commit).splitlines():
+        meta, _, path = line.partition('\t')
+        _, kind, sha, size = meta.split()
+        if kind != 'blob' or file_skip_reason({'filename': path}, config):
+            continue
+        if config['max_file_bytes'] and int(size) > config['max_file_bytes']:
+            continue
+        entries.append({'path': path, 'sha': sha, 'size': int(size)})
+    return entries
+
+
+# -- worker processes ---------------------------------------------------------
+
+_reader = None
+
+
+def init_worker(repo_path: str):
+    global _reader
+    _reader = BlobReader(repo_path)
+
+
+def read_content(entry: dict) -> str:
+    return _reader.read(entry['sha']).decode('utf-8')
+
+
+def audit_one(task):
+    prefix, manifest, shard = task
+    return run_shard(prefix, manifest, shard, read_content)
+
+
+# -----------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repo-path', required=True, help='local clone to audit')
+    parser.add_argument('--repo-name', required=True, help='owner/repo (names the audit prefix)')
+    parser.add_argument('--out', required=True, help='audit prefix base: directory or s3://bucket/prefix')
+    parser.add_argument('--ref', default='HEAD')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--shard-bytes', type=int, default=AUDIT_SHARD_BYTES)
+    parser.add_argument('--shard-files', type=int, default=AUDIT_SHARD_FILES)
+    args = parser.parse_args()
+
+    commit = git(args.repo_path, 'rev-parse', args.ref).strip()
+    prefix = audit_prefix(args.repo_name, commit, args.out)
+    manifest = build_manifest(args.repo_name, commit,
+                              tree_entries(args.repo_path, commit, review_config(args.repo_path, commit)),
+                              max_bytes=args.shard_bytes, max_files=args.shard_files)
+    try:
+        manifest = plan_manifest(prefix, manifest)
+    except ManifestMismatch as e:
+        sys.exit(f"❌ {str(e)}")
+
+    pending = set(pending_shards(prefix, manifest))
+    print(f"📋 {args.repo_name}@{commit[:12]}: {manifest['files']} files, {manifest['bytes']} bytes, "
+          f"{len(manifest['shards'])} shards ({len(pending)} pending) -> {prefix}")
+
+    started = time.perf_counter()
+    audited = 0
+    # spawn: forked workers would share the parent's file descriptors
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(args.repo_path,)) as pool:
+        futures = [pool.submit(audit_one, (prefix, manifest, shard)) for shard in manifest['shards']
+                   if shard['shard'] in pending]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ Shard failed: {str(e)} (rerun to resume)")
+                continue
+            audited += result['audited']
+            print(f"  ✅ Shard {result['shard']}: {result['audited']}/{result['files']} files, "
+                  f"{len(result['findings'])} findings in {result['seconds']}s"
+                  + (f", {len(result['errors'])} errors (partial)" if result.get('partial') else ""))
+
+    elapsed = time.perf_counter() - started
+    report = reduce_shards(manifest, load_results(prefix, manifest))
+    store_report(prefix, report)
+
+    print(f"\n✅ {report['audited']}/{report['files']} files, {len(report['findings'])} findings "
+          f"{report['by_severity']}, {len(report['errors'])} errors")
+    if report['missing_shards']:
+        print(f"⚠️  Missing shards: {report['missing_shards']} (rerun to resume)")
+    if report['partial_shards']:
+        print(f"⚠️  Partial shards: {report['partial_shards']} (rerun to retry their failed files)")
+    print(f"⏱️  This run: {audited} files in {elapsed:.1f}s ({audited / max(elapsed, 1e-9):.1f} files/s), "
+          f"report at {prefix}/report.md")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+"""
+Backfill the embedding index from a repository's history
+
+Walks a local clone's first-parent history (or a source archive), keeps
+each Python blob once by its git blob SHA, parses new blobs in parallel and
+embeds their snippets in large batches under the embedding rate limit.
+History is read as one `git log --raw` stream of the blobs each commit
+changes, so the walk costs O(changes) rather than a tree listing per commit.
+Vectors are written as index segments (lambda-functions/index_segments.py)
+instead of one DynamoDB item each.
+
+Progress is checkpointed after every segment, so an interrupted run
+resumes where it stopped. Seen blob SHAs and snippet ids are appended to
+`<checkpoint>.seen`; the checkpoint records how much of that file it covers,
+so each save only writes the batch's new entries:
+
+    python tools/backfill.py --repo-path ../my-repo --repo-name owner/my-repo \\
+        --out s3://code-review-storage-sanya-2025/index/owner/my-repo \\
+        --checkpoint backfill-my-repo.json
+
+    python tools/backfill.py --archive my-repo.tar.gz --repo-name owner/my-repo --out ./index --no-embed
+
+Embedding needs GEMINI_API_KEY; --no-embed only parses (useful to measure
+parse throughput or to check the file selection).
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda-functions')
+sys.path.insert(0, LAMBDA_DIR)
+
+from blob_cache import EMBEDDING_MODEL, git_blob_sha  # noqa: E402
+from code_analysis import extract_code_snippets, parse_python_file  # noqa: E402
+from embedding_batch import embed_texts, snippet_embedding_id  # noqa: E402
+from index_segments import write_segment  # noqa: E402
+from rate_limiter import TokenBucket  # noqa: E402
+from review_filter import DEFAULT_CONFIG, file_skip_reason  # noqa: E402
+
+
+# -- sources ---------------------------------------------------------------
+
+def git(repo_path: str, *args: str) -> str:
+    return subprocess.run(['git', '-C', repo_path, *args], check=True, capture_output=True, text=True).stdout
+
+
+def list_commits(repo_path: str, ref: str, max_commits: int = None) -> list:
+    """Commits oldest first, so history is indexed in order"""
+    args = ['rev-list', '--reverse', '--first-parent', ref]
+    commits = git(repo_path, *args).split()
+    return commits[-max_commits:] if max_commits else commits
+
+
+def commit_blobs(repo_path: str, commit: str) -> list:
+    """(blob sha, path) of the reviewable Python files in a commit's full tree"""
+    blobs = []
+    for line in git(repo_path, 'ls-tree', '-r', '--full-tree', commit).splitlines():
+        meta, _, path = line.partition('\t')
+        _, kind, sha = meta.split()
+        if kind == 'blob' and not file_skip_reason({'filename': path}, DEFAULT_CONFIG):
+            blobs.append((sha, path))
+    return blobs
+
+
+def changed_blobs(repo_path: str, since: str, until: str):
+    """
+    (commit, [(blob sha, path)]) for each first-parent commit after `since`
+    (from the root when None) up to `until`, oldest first
+
+    Lists the reviewable Python blobs each commit adds or modifies relative
+    to its first parent (merges included), streamed from a single git log.
+    """
+    revision = f"{since}..{until}" if since else until
+    process = subprocess.Popen(
+        ['git', '-C', repo_path, 'log', '--raw', '--no-renames', '--no-abbrev', '--first-parent', '-m',
+         '--reverse', '--format=%x00%H', revision],
+        stdout=subprocess.PIPE, text=True, errors='replace'
+    )
+    commit, blobs = None, []
+    try:
+        for line in process.stdout:
+            line = line.rstrip('\n')
+            if line.startswith('\0'):
+                if commit:
+                    yield commit, blobs
+                commit, blobs = line[1:], []
+            elif line.startswith(':'):
+                meta, _, path = line.partition('\t')
+                _, new_mode, _, sha, status = meta.split()
+                # Deletions have no new blob; 160000 entries are submodules
+                if status != 'D' and new_mode != '160000' and not file_skip_reason({'filename': path}, DEFAULT_CONFIG):
+                    blobs.append((sha, path))
+        if commit:
+            yield commit, blobs
+        if process.wait():
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+    finally:
+        # Stopped early: do not leave git writing into a closed pipe
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+
+
+class BlobReader:
+    """Streams blob contents through one `git cat-file --batch` process"""
+
+    def __init__(self, repo_path: str):
+        self.process = subprocess.Popen(['git', '-C', repo_path, 'cat-file', '--batch'],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, sha: str) -> bytes:
+        self.process.stdin.write(f"{sha}\n".encode())
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        if len(header) < 3:
+            raise KeyError(sha)
+        data = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)  # trailing newline
+        return data
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+def archive_files(archive: str):
+    """(blob sha, path, content) of the reviewable Python files in a .tar(.gz) or .zip"""
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zf:
+            entries = [(info.filename, lambda info=info: zf.read(info)) for info in zf.infolist() if not info.is_dir()]
+            yield from _archive_entries(entries)
+    else:
+        with tarfile.open(archive) as tf:
+            entries = [(member.name, lambda member=member: tf.extractfile(member).read())
+                       for member in tf.getmembers() if member.isfile()]
+            yield from _archive_entries(entries)
+
+
+def _archive_entries(entries):
+    # GitHub archives wrap everything in a single <repo>-<ref>/ directory
+    roots = {name.split('/', 1)[0] for name, _ in entries}
+    strip = len(roots) == 1 and all('/' in name for name, _ in entries)
+    for name, read in entries:
+        path = name.split('/', 1)[1] if strip else name
+        if file_skip_reason({'filename': path}, DEFAULT_CONFIG):
+            continue
+        content = read().decode('utf-8', errors='replace')
+        yield git_blob_sha(content), path, content
+
+
+# -- parsing (worker processes) ---------------------------------------------
+
+def parse_blob(task):
+    """(sha, path, snippets) for one blob; runs in a worker process"""
+    sha, path, content = task
+    parsed = parse_python_file(content, path)
+    if not parsed:
+        return sha, path, []
+    return sha, path, extract_code_snippets(parsed, content)
+
+
+# -- checkpoint ---------------------------------------------------------------
+
+def load_checkpoint(path: str, repo_name: str) -> dict:
+    state = {'repo_name': repo_name, 'commits_done': 0, 'last_commit': None, 'archive_done': False,
+             'seen_offset': 0, 'next_segment': 0,
+             'totals': {'files': 0, 'snippets': 0, 'embedded': 0, 'failed': 0, 'requests': 0, 'seconds': 0.0}}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            saved = json.load(f)
+        if saved.get('repo_name') != repo_name:
+            raise SystemExit(f"Checkpoint {path} belongs to {saved.get('repo_name')}, not {repo_name}")
+        state.update(saved)
+        print(f"↩️  Resuming: {state['commits_done']} commits, {state['next_segment']} segments done")
+    return state
+
+
+class SeenLog:
+    """
+    Append-only record of seen blob SHAs (`b <sha>`) and snippet ids (`s <id>`)
+
+    Entries past `offset` were written after the last checkpoint and are
+    dropped on open, so the sets always match the checkpointed segments.
+    """
+
+    def __init__(self, path: str, offset: int = 0):
+        self.path = path
+        self.blobs, self.snippets = set(), set()
+        self.offset = 0
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'a+b') as f:
+            f.truncate(offset)
+            f.seek(0)
+            for line in f:
+                kind, value = line.decode('ascii').split()
+                (self.blobs if kind == 'b' else self.snippets).add(value)
+            self.offset = f.tell()
+
+    def append(self, blobs, snippets) -> int:
+        """Record new entries; returns the offset to store in the checkpoint"""
+        blobs, snippets = set(blobs) - self.blobs, set(snippets) - self.snippets
+        self.blobs.update(blobs)
+        self.snippets.update(snippets)
+        if self.path and (blobs or snippets):
+            lines = [f"b {sha}\n" for sha in sorted(blobs)] + [f"s {key}\n" for key in sorted(snippets)]
+            with open(self.path, 'ab') as f:
+                f.write(''.join(lines).encode('ascii'))
+                f.flush()
+                os.fsync(f.fileno())
+                self.offset = f.tell()
+        return self.offset
+
+
+def save_checkpoint(path: str, state: dict):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+# -- backfill -----------------------------------------------------------------
+
+class Backfill:
+    def __init__(self, args, state):
+        self.args = args
+        self.state = state
+        self.seen = SeenLog(args.checkpoint and args.checkpoint + '.seen', state['seen_offset'])
+        if self.seen.blobs:
+            print(f"↩️  {len(self.seen.blobs)} blobs and {len(self.seen.snippets)} snippets already seen")
+        # spawn: forked workers would inherit the cat-file pipe and keep it from closing
+        self.pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'))
+        self.limiter = TokenBucket.per_minute(args.requests_per_minute)
+        self.genai = None
+        if not args.no_embed:
+            from lambda_startup import get_genai
+            self.genai = get_genai()
+            self.genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
+        self.started = time.perf_counter()
+        self.run_files = 0
+
+    def process(self, tasks: list, origins: dict = None, commits_done: int = None, last_commit: str = None):
+        """Parse, embed and write one batch of new blobs, then checkpoint"""
+        batch_start = time.perf_counter()
+        records, texts, batch_ids, embedded_ids = [], [], set(), []
+
+        for sha, path, snippets in self.pool.map(parse_blob, tasks, chunksize=16):
+            for snippet in snippets:
+                embedding_id = snippet_embedding_id(snippet['context'])
+                if embedding_id in self.seen.snippets or embedding_id in batch_ids:
+                    continue
+                batch_ids.add(embedding_id)
+                records.append({
+                    'embedding_id': embedding_id,
+                    'repo_name': self.args.repo_name,
+                    'blob_sha': sha,
+                    'filename': path,
+                    'snippet_type': snippet['type'],
+                    'snippet_name': snippet['name'],
+                    'line': snippet.get('line'),
+                    'commit': (origins or {}).get(sha),
+                    'context': snippet['context']
+                })
+                texts.append(snippet['context'])
+
+        totals = self.state['totals']
+        if self.genai is not None and texts:
+            vectors, stats = embed_texts(self.genai, texts, limiter=self.limiter)
+            kept = [(record, vector) for record, vector in zip(records, vectors) if vector]
+            # Failed snippets stay unseen, so a later blob with the same snippet embeds them again
+            embedded_ids = [record['embedding_id'] for record, _ in kept]
+            totals['embedded'] += stats['embedded'] + stats['cached']
+            totals['failed'] += stats['failed']
+            totals['requests'] += stats['requests']
+            if kept:
+                write_segment(self.args.out, self.state['next_segment'],
+                              [record for record, _ in kept], [vector for _, vector in kept], EMBEDDING_MODEL)
+                self.state['next_segment'] += 1
+
+        totals['files'] += len(tasks)
+        totals['snippets'] += len(records)
+        totals['seconds'] += time.perf_counter() - batch_start
+        self.run_files += len(tasks)
+
+        if commits_done is not None:
+            self.state['commits_done'] = commits_done
+            self.state['last_commit'] = last_commit
+        self.state['seen_offset'] = self.seen.append((sha for sha, _, _ in tasks), embedded_ids)
+        save_checkpoint(self.args.checkpoint, self.state)
+
+        elapsed = time.perf_counter() - batch_start
+        print(f"📦 {len(tasks)} files, {len(records)} new snippets in {elapsed:.1f}s "
+              f"({len(tasks) / max(elapsed, 1e-9):.1f} files/s); "
+              f"segments {self.state['next_segment']}, run {self.files_per_second():.1f} files/s")
+
+    def files_per_second(self) -> float:
+        return self.run_files / max(time.perf_counter() - self.started, 1e-9)
+
+    def run_git(self):
+        commits = list_commits(self.args.repo_path, self.args.ref, self.args.max_commits)
+        done = self.state['commits_done']
+        if done and (done > len(commits) or commits[done - 1] != self.state['last_commit']):
+            raise SystemExit("Checkpoint does not match this history (different --ref or --max-commits?)")
+
+        print(f"📜 {len(commits)} commits, {len(commits) - done} to go")
+        if done == len(commits):
+            return
+        if not done and self.args.max_commits:
+            # A --max-commits window starts from the full tree of its first commit
+            log = changed_blobs(self.args.repo_path, commits[0], commits[-1])
+            changes = itertools.chain([(commits[0], commit_blobs(self.args.repo_path, commits[0]))], log)
+        else:
+            log = changes = changed_blobs(self.args.repo_path, commits[done - 1] if done else None, commits[-1])
+
+        reader = BlobReader(self.args.repo_path)
+        tasks, origins = [], {}
+        try:
+            for position, (commit, blobs) in enumerate(changes, start=done):
+                if position >= len(commits) or commit != commits[position]:
+                    raise SystemExit(f"History changed during the walk at {commit}")
+                for sha, path in blobs:
+                    if sha in self.seen.blobs or sha in origins:
+                        continue
+                    origins[sha] = commit
+                    tasks.append((sha, path, reader.read(sha).decode('utf-8', errors='replace')))
+
+                if len(tasks) >= self.args.batch_files or position == len(commits) - 1:
+                    self.process(tasks, origins, commits_done=position + 1, last_commit=commit)
+                    tasks, origins = [], {}
+        finally:
+            log.close()
+            reader.close()
+
+    def run_archive(self):
+        if self.state['archive_done']:
+            print("✅ Archive already backfilled")
+            return
+        tasks, queued = [], set()
+        for sha, path, content in archive_files(self.args.archive):
+            if sha in self.seen.blobs or sha in queued:
+                continue
+            queued.add(sha)
+            tasks.append((sha, path, content))
+            if len(tasks) >= self.args.batch_files:
+                self.process(tasks)
+                tasks, queued = [], set()
+        self.state['archive_done'] = True
+        self.process(tasks)
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--repo-path', help='local clone to walk')
+    source.add_argument('--archive', help='.tar.gz / .zip snapshot of the repo')
+    parser.add_argument('--repo-name', required=True, help='owner/repo recorded with every snippet')
+    parser.add_argument('--out', required=True, help='segment prefix: directory or s3://bucket/prefix')
+    parser.add_argument('--checkpoint', help='resume state file (written after every segment)')
+    parser.add_argument('--ref', default='HEAD')
+    parser.add_argument('--max-commits', type=int, help='only the most recent N commits of --ref')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-files', type=int, default=500, help='new blobs per segment/checkpoint')
+    parser.add_argument('--requests-per-minute', type=float,
+                        default=float(os.environ.get('EMBED_REQUESTS_PER_MINUTE', '1000')))
+    parser.add_argument('--no-embed', action='store_true', help='parse only, write no segments')
+    args = parser.parse_args()
+
+    state = load_checkpoint(args.checkpoint, args.repo_name)
+    backfill = Backfill(args, state)
+    try:
+        if args.repo_path:
+            backfill.run_git()
+        else:
+            backfill.run_archive()
+    finally:
+        backfill.close()
+
+    totals = state['totals']
+    print(f"\n✅ {totals['files']} files, {totals['snippets']} snippets, {totals['embedded']} embedded "
+          f"({totals['failed']} failed) in {totals['requests']} requests, {state['next_segment']} segments")
+    print(f"⏱️  This run: {backfill.run_files} files, {backfill.files_per_second():.1f} files/s")
+
+
+if __name__ == '__main__':
+    main()
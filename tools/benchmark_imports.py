@@ -0,0 +1,71 @@
+"""
+Import-time benchmark for the Gemini client options
+
+Spawns a fresh interpreter per run (like a Lambda cold start) and measures
+how long it takes to import each client module.
+
+Usage:
+    python tools/benchmark_imports.py [--runs 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda-functions')
+
+CANDIDATES = {
+    'sdk (google.generativeai)': 'import google.generativeai',
+    'rest (gemini_client)': 'import gemini_client',
+}
+
+TIMER = (
+    "import time; _start = time.perf_counter(); {statement}; "
+    "print((time.perf_counter() - _start) * 1000)"
+)
+
+
+def time_import(statement: str, runs: int) -> list:
+    """Return import times in milliseconds, one fresh interpreter per run"""
+    timings = []
+    env = dict(os.environ, PYTHONPATH=LAMBDA_DIR, PYTHONDONTWRITEBYTECODE='1')
+
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', TIMER.format(statement=statement)],
+            capture_output=True, text=True, env=env
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        timings.append(float(result.stdout.strip()))
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'client':<28}{'median ms':>12}{'p90 ms':>12}")
+    medians = {}
+
+    for label, statement in CANDIDATES.items():
+        try:
+            timings = sorted(time_import(statement, args.runs))
+        except RuntimeError as e:
+            print(f"{label:<28}{'n/a':>12}  ({e})")
+            continue
+        medians[label] = statistics.median(timings)
+        p90 = timings[min(len(timings) - 1, int(len(timings) * 0.9))]
+        print(f"{label:<28}{medians[label]:>12.1f}{p90:>12.1f}")
+
+    if len(medians) == 2:
+        sdk, rest = medians.values()
+        print(f"\nCold-start import reduction: {sdk - rest:.1f} ms ({(1 - rest / sdk) * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()